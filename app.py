@@ -24,6 +24,7 @@ from models.device import Device
 from models.camera import Camera
 from models.camera_stream import CameraStream
 from models.actions import Action
+from models.action_schedule import ActionScheduleState
 
 # Import Blueprints
 from middleware.auth import auth_bp
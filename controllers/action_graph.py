@@ -0,0 +1,195 @@
+"""
+Static dependency graph of the enabled Actions.
+
+An edge A → B exists when a command topic A publishes (THEN or a
+success / error branch) is the IF topic of B.  The graph is built from
+the DB once per process and afterwards patched one Action at a time by
+the CRUD controller, so saving a rule only touches that rule's edges.
+
+`analyse()` walks the sub-graph reachable from one Action (bounded by the
+runtime hop limit) and reports cycles, fan-out hot spots and the
+estimated number of messages a single external trigger produces.
+"""
+
+import os
+import threading
+from typing import Optional
+
+from models.actions import Action as ActionModel
+from models.device import Device
+from controllers.action_guard import MAX_HOPS
+from controllers.action_templates import PLACEHOLDER
+
+
+FANOUT_WARN = int(os.getenv("ACTIONS_FANOUT_WARN", 5))
+AMPLIFY_WARN = int(os.getenv("ACTIONS_AMPLIFY_WARN", 20))
+
+
+def _full_topic(node: dict, topic_key: str = "topic") -> Optional[str]:
+    rel = node.get(topic_key)
+    if not rel or node.get("device_id") == PLACEHOLDER:
+        return None     # device-group templates are resolved per member at runtime
+    dev = Device.query.get(node.get("device_id"))
+    if not dev or not dev.topic_prefix or not dev.mqtt_client_id:
+        return None
+    return f"{dev.topic_prefix}/{dev.mqtt_client_id}/{rel}"
+
+
+def _chain_topics(chain: list):
+    """Return ``(if_topic, emitted_topics)`` for an Action chain."""
+    if_node = next((n for n in chain if n.get("source") == "io"), None)
+    if_topic = _full_topic(if_node) if if_node else None
+
+    emits = set()
+    for node in chain[1:]:
+        topic = _full_topic(node)
+        if topic:
+            emits.add(topic)
+    return if_topic, emits
+
+
+class ActionGraph:
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._names: dict[int, str]      = {}
+        self._if:    dict[int, str]      = {}   # action → IF topic
+        self._emits: dict[int, set]      = {}   # action → published topics
+        self._by_if: dict[str, set]      = {}   # IF topic → actions
+        self._branches: dict[int, bool]  = {}   # action has evaluate branches
+
+    # ------------------------------------------------------------------
+    # incremental maintenance
+    # ------------------------------------------------------------------
+    def load(self):
+        """Full build – only used once, before the first update."""
+        for m in ActionModel.query.filter_by(enabled=True).all():
+            self.update(m)
+
+    def update(self, model: ActionModel):
+        """Re-index a single Action; disabled Actions are removed."""
+        if not model.enabled:
+            self.remove(model.id)
+            return
+        if_topic, emits = _chain_topics(model.chain or [])
+        with self._lock:
+            self._unlink(model.id)
+            self._names[model.id]    = model.name
+            self._emits[model.id]    = emits
+            self._branches[model.id] = any(n.get("branch") for n in model.chain or [])
+            if if_topic:
+                self._if[model.id] = if_topic
+                self._by_if.setdefault(if_topic, set()).add(model.id)
+
+    def remove(self, action_id: int):
+        with self._lock:
+            self._unlink(action_id)
+
+    def _unlink(self, aid: int):
+        old = self._if.pop(aid, None)
+        if old:
+            ids = self._by_if.get(old, set())
+            ids.discard(aid)
+            if not ids:
+                self._by_if.pop(old, None)
+        self._emits.pop(aid, None)
+        self._names.pop(aid, None)
+        self._branches.pop(aid, None)
+
+    def successors(self, aid: int) -> set:
+        out = set()
+        for topic in self._emits.get(aid, ()):
+            out |= self._by_if.get(topic, set())
+        return out
+
+    # ------------------------------------------------------------------
+    # analysis
+    # ------------------------------------------------------------------
+    def analyse(self, aid: int) -> dict:
+        """
+        Report for one Action.  Only the part of the graph reachable
+        within `MAX_HOPS` firings is visited.
+        """
+        with self._lock:
+            if aid not in self._names:
+                return {"cycles": [], "fan_out": 0, "hot_spots": [],
+                        "firings": 0, "messages": 0, "warnings": []}
+
+            cycles = self._cycles_through(aid)
+
+            # count firings per hop level (walks, not distinct nodes, so
+            # a cycle keeps amplifying until the runtime hop limit)
+            level   = {aid: 1}
+            firings = 0
+            msgs    = 0
+            seen    = set()
+            for _ in range(MAX_HOPS):
+                if not level:
+                    break
+                nxt = {}
+                for node, n in level.items():
+                    seen.add(node)
+                    firings += n
+                    # THEN plus at most one evaluate branch per firing
+                    msgs += n * (2 if self._branches.get(node) else 1)
+                    for succ in self.successors(node):
+                        nxt[succ] = nxt.get(succ, 0) + n
+                level = nxt
+
+            hot = sorted(
+                (
+                    {"id": n, "name": self._names.get(n), "fan_out": len(self.successors(n))}
+                    for n in seen if len(self.successors(n)) >= FANOUT_WARN
+                ),
+                key=lambda h: -h["fan_out"],
+            )
+            fan_out = len(self.successors(aid))
+
+        warnings = []
+        for cyc in cycles:
+            names = " → ".join(self._names.get(c, f"#{c}") for c in cyc + [cyc[0]])
+            warnings.append(f"Cycle detected: {names}")
+        for h in hot:
+            warnings.append(f"Action “{h['name']}” triggers {h['fan_out']} other actions")
+        if msgs >= AMPLIFY_WARN:
+            warnings.append(
+                f"One trigger may publish up to {msgs} commands "
+                f"(limited to {MAX_HOPS} hops at runtime)"
+            )
+
+        return {
+            "cycles":    cycles,
+            "fan_out":   fan_out,
+            "hot_spots": hot,
+            "firings":   firings,
+            "messages":  msgs,
+            "warnings":  warnings,
+        }
+
+    def _cycles_through(self, aid: int, limit: int = 5) -> list:
+        """Simple paths aid → … → aid, at most `MAX_HOPS` long."""
+        found = []
+        stack = [(aid, [aid])]
+        while stack and len(found) < limit:
+            node, path = stack.pop()
+            for succ in self.successors(node):
+                if succ == aid:
+                    found.append(path)
+                elif succ not in path and len(path) < MAX_HOPS:
+                    stack.append((succ, path + [succ]))
+        return found
+
+
+# ───────────────────────── singleton helpers ──────────────────────────
+_graph: Optional[ActionGraph] = None
+_graph_lock = threading.Lock()
+
+
+def get_action_graph() -> ActionGraph:
+    """Lazily built graph; call inside an app context."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            g = ActionGraph()
+            g.load()
+            _graph = g
+    return _graph
@@ -0,0 +1,164 @@
+"""
+Runtime loop / amplification guard for the ActionManager.
+
+Every THEN / branch command an Action emits is looped back into the
+queues *and* echoed by the broker, so a THEN topic that is also an IF
+topic (or two Actions pointing at each other) would re-trigger forever.
+
+The guard keeps a causal *lineage* for every emitted command:
+
+    origin : id of the first, externally caused trigger of the chain
+    hops   : how many Action firings separate this message from origin
+
+A triggered Action inherits the lineage of the message that fired it,
+so ping-pong chains are cut once `ACTIONS_MAX_HOPS` is reached.  On top
+of that each causal chain and each Action has a firing-rate ceiling;
+an Action that breaks any limit is suspended for `ACTIONS_SUSPEND_SEC`
+and an alert is published on `actions/<id>/alert`.
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import deque
+
+
+MAX_HOPS       = int(os.getenv("ACTIONS_MAX_HOPS",        8))
+LINEAGE_TTL    = float(os.getenv("ACTIONS_LINEAGE_TTL",   5.0))    # sec
+CHAIN_MAX      = int(os.getenv("ACTIONS_CHAIN_MAX_FIRES", 50))
+CHAIN_WINDOW   = float(os.getenv("ACTIONS_CHAIN_WINDOW",  10.0))   # sec
+ACTION_MAX     = int(os.getenv("ACTIONS_RATE_MAX",        30))
+ACTION_WINDOW  = float(os.getenv("ACTIONS_RATE_WINDOW",   10.0))   # sec
+SUSPEND_SEC    = float(os.getenv("ACTIONS_SUSPEND_SEC",   300.0))
+
+
+def new_lineage() -> dict:
+    """Fresh lineage for a trigger that did not come from an Action."""
+    return {"origin": uuid.uuid4().hex[:12], "hops": 0}
+
+
+class LoopGuard:
+    """
+    Thread-safe bookkeeping shared by all ActionManager workers.
+
+    `mark()` is called for every command an Action publishes,
+    `lineage()` when a trigger message arrives and `admit()` right
+    before an Action is allowed to fire.
+    """
+
+    def __init__(self):
+        self._lock      = threading.Lock()
+        self._emitted:   dict[tuple, tuple] = {}   # (topic, payload) → (lineage, expires)
+        self._chains:    dict[str, deque]   = {}   # origin → firing timestamps
+        self._fires:     dict               = {}   # action key → firing timestamps
+        self._suspended: dict               = {}   # action key → suspended until
+
+    # ------------------------------------------------------------------
+    # lineage tracking
+    # ------------------------------------------------------------------
+    def mark(self, topic: str, payload: str, lineage: dict) -> None:
+        """Remember that *payload* on *topic* was caused by *lineage*."""
+        now = time.time()
+        with self._lock:
+            self._emitted[(topic, payload)] = (lineage, now + LINEAGE_TTL)
+            if len(self._emitted) > 1_000:
+                self._expire(now)
+
+    def lineage(self, topic: str, payload: str) -> dict:
+        """
+        Lineage of an incoming message.  Loop-back copy and broker echo
+        of the same command both resolve to the emitting chain; anything
+        else starts a new chain.
+        """
+        now = time.time()
+        with self._lock:
+            hit = self._emitted.get((topic, payload))
+            if hit and hit[1] >= now:
+                return hit[0]
+        return new_lineage()
+
+    def _expire(self, now: float) -> None:
+        for key in [k for k, (_, exp) in self._emitted.items() if exp < now]:
+            del self._emitted[key]
+        for origin in [o for o, ts in self._chains.items()
+                       if not ts or ts[-1] < now - CHAIN_WINDOW]:
+            del self._chains[origin]
+
+    # ------------------------------------------------------------------
+    # admission
+    # ------------------------------------------------------------------
+    def admit(self, action_id, lineage: dict):
+        """
+        Return ``(True, None)`` when the Action may fire for *lineage*,
+        else ``(False, reason)``.  Rate violations suspend the Action.
+        *action_id* is an ActionWrapper key (template instances are
+        limited per member).
+        """
+        now = time.time()
+        with self._lock:
+            until = self._suspended.get(action_id)
+            if until and until > now:
+                return False, "suspended"
+
+            if lineage["hops"] >= MAX_HOPS:
+                self._suspended[action_id] = now + SUSPEND_SEC
+                return False, f"hop limit {MAX_HOPS} reached (origin {lineage['origin']})"
+
+            chain = self._window(self._chains, lineage["origin"], now, CHAIN_WINDOW)
+            if len(chain) >= CHAIN_MAX:
+                self._suspended[action_id] = now + SUSPEND_SEC
+                return False, (f"chain {lineage['origin']} exceeded "
+                               f"{CHAIN_MAX} firings / {CHAIN_WINDOW:g}s")
+
+            fires = self._window(self._fires, action_id, now, ACTION_WINDOW)
+            if len(fires) >= ACTION_MAX:
+                self._suspended[action_id] = now + SUSPEND_SEC
+                return False, f"exceeded {ACTION_MAX} firings / {ACTION_WINDOW:g}s"
+
+            chain.append(now)
+            fires.append(now)
+            return True, None
+
+    @staticmethod
+    def _window(store: dict, key, now: float, width: float) -> deque:
+        ts = store.setdefault(key, deque())
+        while ts and ts[0] < now - width:
+            ts.popleft()
+        return ts
+
+    @staticmethod
+    def child(lineage: dict) -> dict:
+        """Lineage for the commands published by a firing Action."""
+        return {"origin": lineage["origin"], "hops": lineage["hops"] + 1}
+
+    # ------------------------------------------------------------------
+    # suspension
+    # ------------------------------------------------------------------
+    def is_suspended(self, action_id) -> bool:
+        with self._lock:
+            until = self._suspended.get(action_id)
+            return bool(until and until > time.time())
+
+    def release_expired(self) -> list:
+        """Lift expired suspensions, returning the Action ids released."""
+        now = time.time()
+        with self._lock:
+            done = [aid for aid, until in self._suspended.items() if until <= now]
+            for aid in done:
+                del self._suspended[aid]
+                self._fires.pop(aid, None)
+            return done
+
+    def clear(self, action_id: int) -> None:
+        """
+        Forget all state for an Action (called when it is re-saved),
+        including its template instances keyed ``(action_id, device_id)``.
+        """
+        def mine(key):
+            return key == action_id or (isinstance(key, tuple) and key[0] == action_id)
+
+        with self._lock:
+            for store in (self._suspended, self._fires):
+                for key in [k for k in store if mine(k)]:
+                    del store[key]
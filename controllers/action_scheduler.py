@@ -0,0 +1,181 @@
+"""
+Schedule triggers (cron expressions and fixed intervals) for Actions.
+
+An Action whose IF node has ``"source": "schedule"`` is started by time
+instead of by an MQTT topic:
+
+    {"source": "schedule", "cron": "0 6 * * 1-5"}
+    {"source": "schedule", "interval": 15, "interval_unit": "min"}
+
+Optional keys: ``misfire`` ("once" | "skip", default "once") and
+``misfire_grace`` (seconds, default `ACTIONS_MISFIRE_GRACE`).
+
+All schedules share one thread and one heap ordered by due time.  The
+last fire time of every schedule is persisted in
+`action_schedule_state`; after a restart an occurrence that was missed
+less than `misfire_grace` seconds ago fires once immediately
+(``misfire: "once"``) or is dropped (``misfire: "skip"``).
+"""
+
+import os
+import time
+import heapq
+import calendar
+import threading
+from datetime import datetime
+from itertools import count
+
+from extensions import db
+from models.action_schedule import ActionScheduleState
+from utils.cron import CronExpr
+
+
+MISFIRE_GRACE = float(os.getenv("ACTIONS_MISFIRE_GRACE", 3600))   # sec
+
+_UNIT_SECONDS = {"ms": 0.001, "sec": 1, "min": 60, "hour": 3600, "day": 86400}
+
+
+def schedule_node(chain: list):
+    return next((n for n in chain or [] if n.get("source") == "schedule"), None)
+
+
+class ScheduleSpec:
+    """Parsed schedule IF node; raises ValueError when invalid."""
+
+    def __init__(self, node: dict):
+        self.cron     = CronExpr(node["cron"]) if node.get("cron") else None
+        self.interval = None
+        if not self.cron:
+            val = float(node.get("interval") or 0)
+            self.interval = val * _UNIT_SECONDS.get(node.get("interval_unit", "sec"), 1)
+            if self.interval <= 0:
+                raise ValueError("schedule needs a cron expression or a positive interval")
+        self.misfire = node.get("misfire", "once")
+        if self.misfire not in ("once", "skip"):
+            raise ValueError(f"unknown misfire policy {self.misfire!r}")
+        self.grace = float(node.get("misfire_grace", MISFIRE_GRACE))
+
+    def next_after(self, ts: float) -> float:
+        if self.cron:
+            return self.cron.next_after(datetime.fromtimestamp(ts)).timestamp()
+        return ts + self.interval
+
+    def describe(self) -> str:
+        return f"cron {self.cron.expr!r}" if self.cron else f"every {self.interval:g}s"
+
+
+class ActionScheduler:
+    def __init__(self, flask_app, fire):
+        """
+        *fire(action_id, scheduled_ts)* is called on the scheduler thread
+        for every due occurrence and must not block.
+        """
+        self.flask_app = flask_app
+        self._fire     = fire
+
+        self._cond = threading.Condition()
+        self._heap: list[tuple] = []               # (due, seq, action id)
+        self._entries: dict[int, dict] = {}        # action id → {"spec", "due"}
+        self._seq = count()
+
+        threading.Thread(
+            target=self._run, name="ActionScheduler", daemon=True
+        ).start()
+
+    # ------------------------------------------------------------------
+    # registration (call inside an app context)
+    # ------------------------------------------------------------------
+    def sync(self, action_id: int, chain: list):
+        node = schedule_node(chain)
+        if not node:
+            self.remove(action_id)
+            return
+        try:
+            spec = ScheduleSpec(node)
+        except (ValueError, KeyError) as exc:
+            self.flask_app.logger.error("⏰ Action #%s has a bad schedule: %s", action_id, exc)
+            self.remove(action_id)
+            return
+
+        now  = time.time()
+        row  = ActionScheduleState.query.get(action_id)
+        last = calendar.timegm(row.last_fire_at.timetuple()) if row and row.last_fire_at else None
+
+        if last is None:
+            due = spec.next_after(now)
+        else:
+            due = spec.next_after(last)
+            if due <= now:
+                missed = now - due
+                if spec.misfire == "once" and missed <= spec.grace:
+                    self.flask_app.logger.info(
+                        "⏰ Action #%s missed a run %.0fs ago – firing once", action_id, missed
+                    )
+                    due = now
+                else:
+                    due = spec.next_after(now)
+
+        with self._cond:
+            self._entries[action_id] = {"spec": spec, "due": due}
+            heapq.heappush(self._heap, (due, next(self._seq), action_id))
+            self._cond.notify()
+        self.flask_app.logger.info(
+            "⏰ Action #%s scheduled (%s) next %s",
+            action_id, spec.describe(), datetime.fromtimestamp(due).isoformat(timespec="seconds")
+        )
+
+    def remove(self, action_id: int):
+        with self._cond:
+            self._entries.pop(action_id, None)      # heap item becomes stale
+
+    def snapshot(self) -> list:
+        with self._cond:
+            return [
+                {"action_id": aid, "schedule": e["spec"].describe(), "due": e["due"]}
+                for aid, e in self._entries.items()
+            ]
+
+    # ------------------------------------------------------------------
+    # worker
+    # ------------------------------------------------------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, _, aid = self._heap[0]
+                    entry = self._entries.get(aid)
+                    if entry is None or entry["due"] != due:
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = due - time.time()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+
+                    # next occurrence; skip any we fell behind on while running
+                    now = time.time()
+                    nxt = entry["spec"].next_after(due)
+                    if nxt <= now:
+                        nxt = entry["spec"].next_after(now)
+                    entry["due"] = nxt
+                    heapq.heappush(self._heap, (nxt, next(self._seq), aid))
+                    break
+
+            try:
+                self._fire(aid, due)
+                self._persist(aid, due)
+            except Exception:
+                self.flask_app.logger.exception("⏰ scheduled run of Action #%s failed", aid)
+
+    def _persist(self, action_id: int, ts: float):
+        with self.flask_app.app_context():
+            row = ActionScheduleState.query.get(action_id)
+            if row is None:
+                row = ActionScheduleState(action_id=action_id)
+                db.session.add(row)
+            row.last_fire_at = datetime.utcfromtimestamp(ts)
+            db.session.commit()
@@ -0,0 +1,157 @@
+"""
+Device-group Action templates.
+
+A template is an ordinary Action whose IF node names a device *group*
+(a tag in `Device.tags`) instead of one device, and whose nodes use the
+placeholder ``"$DEVICE"`` wherever the member device belongs:
+
+    {"device_id": "$DEVICE", "device_group": "station", "source": "io",
+     "topic": "input_event/0", "cmp": "==", "match": {"value": "S"}}
+
+The IF predicate is compiled once per template (relative topic,
+operator, expected value) and indexed under the full topic of every
+member, so an incoming message resolves to its (template, member) pairs
+with one dict lookup.  Membership is patched per device when a device is
+saved, deleted or re-tagged – the template itself is never recompiled.
+"""
+
+import threading
+from typing import Optional
+
+
+PLACEHOLDER = "$DEVICE"
+
+
+def device_tags(dev) -> set:
+    tags = dev.tags or []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    if isinstance(tags, dict):
+        tags = tags.keys()
+    return {str(t).strip() for t in tags if str(t).strip()}
+
+
+def is_member(dev, group: str) -> bool:
+    return bool(
+        dev.enabled and dev.topic_prefix and dev.mqtt_client_id
+        and group in device_tags(dev)
+    )
+
+
+def compile_template(chain: list) -> Optional[dict]:
+    """Return the compiled predicate of a template chain, else None."""
+    if_node = next((n for n in chain or [] if n.get("source") == "io"), None)
+    if not if_node or not if_node.get("device_group"):
+        return None
+    then = chain[1] if len(chain) > 1 else {}
+    return {
+        "group":  if_node["device_group"],
+        "topic":  if_node["topic"],
+        "cmp":    if_node.get("cmp", "=="),
+        "exp":    str(if_node["match"]["value"]),
+        # result topic is per-member only when THEN targets the member
+        "result": then.get("result_topic") if then.get("device_id") == PLACEHOLDER else None,
+    }
+
+
+class TemplateIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates: dict[int, dict] = {}               # aid → compiled
+        self._members:   dict[int, dict[int, str]] = {}     # aid → {dev id: base topic}
+        self._triggers:  dict[str, set] = {}                # full IF topic → {(aid, dev id)}
+        self._results:   dict[str, int] = {}                # full result topic → refcount
+
+    # ------------------------------------------------------------------
+    # templates
+    # ------------------------------------------------------------------
+    def install(self, aid: int, compiled: dict, devices) -> None:
+        with self._lock:
+            self._drop(aid)
+            self._templates[aid] = compiled
+            self._members[aid]   = {}
+            for dev in devices:
+                if is_member(dev, compiled["group"]):
+                    self._link(aid, dev)
+
+    def remove(self, aid: int) -> None:
+        with self._lock:
+            self._drop(aid)
+
+    def _drop(self, aid: int) -> None:
+        for dev_id in list(self._members.get(aid, {})):
+            self._unlink(aid, dev_id)
+        self._templates.pop(aid, None)
+        self._members.pop(aid, None)
+
+    # ------------------------------------------------------------------
+    # membership
+    # ------------------------------------------------------------------
+    def device_changed(self, dev) -> list:
+        """Re-evaluate *dev* against every template; return touched ids."""
+        touched = []
+        with self._lock:
+            for aid, tpl in self._templates.items():
+                base   = f"{dev.topic_prefix}/{dev.mqtt_client_id}"
+                member = is_member(dev, tpl["group"])
+                known  = self._members[aid].get(dev.id)
+                if member and known == base:
+                    continue
+                if known is not None:
+                    self._unlink(aid, dev.id)
+                if member:
+                    self._link(aid, dev)
+                if member or known is not None:
+                    touched.append(aid)
+        return touched
+
+    def device_removed(self, dev_id: int) -> list:
+        touched = []
+        with self._lock:
+            for aid, members in self._members.items():
+                if dev_id in members:
+                    self._unlink(aid, dev_id)
+                    touched.append(aid)
+        return touched
+
+    def _link(self, aid: int, dev) -> None:
+        tpl  = self._templates[aid]
+        base = f"{dev.topic_prefix}/{dev.mqtt_client_id}"
+        self._members[aid][dev.id] = base
+        self._triggers.setdefault(f"{base}/{tpl['topic']}", set()).add((aid, dev.id))
+        if tpl["result"]:
+            rt = f"{base}/{tpl['result']}"
+            self._results[rt] = self._results.get(rt, 0) + 1
+
+    def _unlink(self, aid: int, dev_id: int) -> None:
+        tpl  = self._templates[aid]
+        base = self._members[aid].pop(dev_id)
+        topic = f"{base}/{tpl['topic']}"
+        pairs = self._triggers.get(topic, set())
+        pairs.discard((aid, dev_id))
+        if not pairs:
+            self._triggers.pop(topic, None)
+        if tpl["result"]:
+            rt = f"{base}/{tpl['result']}"
+            self._results[rt] -= 1
+            if self._results[rt] <= 0:
+                del self._results[rt]
+
+    # ------------------------------------------------------------------
+    # lookups (hot path)
+    # ------------------------------------------------------------------
+    def match(self, topic: str) -> list:
+        """[(aid, dev id, compiled)] whose IF topic is *topic*."""
+        with self._lock:
+            return [(aid, dev_id, self._templates[aid])
+                    for aid, dev_id in self._triggers.get(topic, ())]
+
+    def is_trigger(self, topic: str) -> bool:
+        return topic in self._triggers
+
+    def is_result(self, topic: str) -> bool:
+        return topic in self._results
+
+    def members(self, aid: int) -> list:
+        with self._lock:
+            return list(self._members.get(aid, {}))
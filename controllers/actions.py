@@ -2,13 +2,16 @@
 
 from __future__ import annotations
 
-from flask import jsonify, request, abort
+from flask import jsonify, request, abort, current_app
 from extensions import db
 from models.actions       import Action
 from models.device        import Device
 from models.device_model  import DeviceModel
 from models.device_category import DeviceCategory
 from controllers.actions_handler import get_action_manager
+from controllers.action_graph    import get_action_graph
+from controllers.action_scheduler import ScheduleSpec
+from controllers.action_templates import PLACEHOLDER, is_member
 
 AGENT_MODEL_NAME = "Action Agent"
 VALID_BRANCHES   = ('success', 'error')
@@ -101,6 +104,125 @@ def _unpack_time(source: dict, field: str, target: dict):
     target[field]         = v
     target[f"{field}_unit"] = u
 
+def _schedule_trigger(sched: dict) -> dict:
+    """Validate a cron / interval trigger and return its IF node."""
+    node = {
+        "source":        "schedule",
+        "cron":          (sched.get("cron") or "").strip(),
+        "interval":      sched.get("interval", 0),
+        "interval_unit": sched.get("interval_unit", "sec"),
+        "misfire":       sched.get("misfire", "once"),
+    }
+    if "misfire_grace" in sched:
+        node["misfire_grace"] = sched["misfire_grace"]
+    try:
+        ScheduleSpec(node)
+    except (ValueError, TypeError) as exc:
+        abort(400, f"Invalid schedule: {exc}")
+    return node
+
+def _group_member(group: str) -> Device:
+    """Any enabled device tagged *group* – templates are validated against it."""
+    for dev in Device.query.filter_by(enabled=True).order_by(Device.id):
+        if is_member(dev, group):
+            return dev
+    abort(400, f"No enabled device is tagged “{group}”")
+
+def _build_chain(trg: dict, res: dict, ev: dict) -> list:
+    """Validate trigger / result / evaluate and assemble the rule chain."""
+    chain = []
+
+    # device-group template: nodes keep "$DEVICE", validation uses one member
+    group  = (trg.get("device_group") or "").strip()
+    member = _group_member(group) if group else None
+    if group:
+        trg = {**trg, "device_id": PLACEHOLDER}
+
+    def _concrete(node: dict) -> dict:
+        if member is not None and node.get("device_id") == PLACEHOLDER:
+            return {**node, "device_id": member.id}
+        return node
+
+    # THEN is checked first: a schedule trigger takes its schema from it
+    _validate_result(_concrete(res))
+
+    # IF node – a device topic, a device-group topic or a schedule
+    if trg.get("schedule"):
+        if group:
+            abort(400, "Schedule triggers cannot be device-group templates")
+        schema_map = _topic_schema(res['device_id'])
+        chain.append(_schedule_trigger(trg["schedule"]))
+    else:
+        _validate_trigger(_concrete(trg))
+        schema_map = _topic_schema(_concrete(trg)['device_id'])
+        tmeta = schema_map.get("topics", {}).get(trg['topic'], {})
+        node_if = {
+            "device_id": trg['device_id'],
+            "source":    "io",
+            "topic":     trg['topic'],
+            "cmp":       trg.get('cmp','=='),
+            "match":     {"value": trg.get('value','')},
+            "poll_topic": trg.get("poll_topic", ""),
+            "poll_payload": tmeta.get("poll_payload","")
+        }
+        if group:
+            node_if["device_group"] = group
+        _unpack_time(trg, "poll_interval", node_if)
+        chain.append(node_if)
+
+    # THEN node
+    cmeta = schema_map.get("command_topics", {}).get(res['topic'], {})
+    node_then = {
+        "device_id":   res['device_id'],
+        "topic":       res['topic'],
+        "command":     res['command'],
+        "ignore_input": bool(res.get('ignore_input', False)),
+        "result_topic": res.get("result_topic", ""),
+        "result_payload": cmeta.get("result_payload", {})
+    }
+    _unpack_time(res, "timeout", node_then)
+    chain.append(node_then)
+
+    # EVALUATE
+    mode = ev.get('mode','ignore')
+    if mode in ('success','both') and ev.get('success'):
+        sb = ev['success']
+        _validate_result(_concrete(sb))
+        sb_meta  = schema_map.get("command_topics",{}).get(sb['topic'],{})
+        sb_node = {
+            **sb,
+            "branch":         "success",
+            "result_topic":   sb.get("result_topic",""),
+            "result_payload": sb_meta.get("result_payload",{})
+        }
+        _unpack_time(sb, "timeout", sb_node)
+        chain.append(sb_node)
+
+    if mode in ('error','both') and ev.get('error'):
+        eb = ev['error']
+        _validate_result(_concrete(eb))
+        eb_meta  = schema_map.get("command_topics",{}).get(eb['topic'],{})
+        eb_node = {
+            **eb,
+            "branch":         "error",
+            "result_topic":   eb.get("result_topic",""),
+            "result_payload": eb_meta.get("result_payload",{})
+        }
+        _unpack_time(eb, "timeout", eb_node)
+        chain.append(eb_node)
+
+    return chain
+
+
+def _analyse(a: Action) -> dict:
+    """Patch the dependency graph with *a* and report storm risks."""
+    graph = get_action_graph()
+    graph.update(a)
+    report = graph.analyse(a.id)
+    for w in report["warnings"]:
+        current_app.logger.warning("⚙️  Action '%s' (#%s): %s", a.name, a.id, w)
+    return report
+
 # ────────────────────────────────────────────────────────────────────
 #  CRUD
 # ────────────────────────────────────────────────────────────────────
@@ -146,70 +268,7 @@ def create_action():
 
     data['name'] = new_name
 
-    trg = data['trigger']
-    res = data['result']
-    ev  = data['evaluate']
-
-    _validate_trigger(trg)
-    _validate_result(res)
-
-    schema_map = _topic_schema(trg['device_id'])
-    chain = []
-
-    # IF node
-    tmeta = schema_map.get("topics", {}).get(trg['topic'], {})
-    node_if = {
-        "device_id": trg['device_id'],
-        "source":    "io",
-        "topic":     trg['topic'],
-        "cmp":       trg.get('cmp','=='),
-        "match":     {"value": trg.get('value','')},
-        "poll_topic": trg.get("poll_topic", ""),
-        "poll_payload": tmeta.get("poll_payload","")
-    }
-    _unpack_time(trg, "poll_interval", node_if)
-    chain.append(node_if)
-
-    # THEN node
-    cmeta = schema_map.get("command_topics", {}).get(res['topic'], {})
-    node_then = {
-        "device_id":   res['device_id'],
-        "topic":       res['topic'],
-        "command":     res['command'],
-        "ignore_input": bool(res.get('ignore_input', False)),
-        "result_topic": res.get("result_topic", ""),
-        "result_payload": cmeta.get("result_payload", {})
-    }
-    _unpack_time(res, "timeout", node_then)
-    chain.append(node_then)
-
-    # EVALUATE
-    mode = ev.get('mode','ignore')
-    if mode in ('success','both') and ev.get('success'):
-        sb = ev['success']
-        _validate_result(sb)
-        sb_meta  = schema_map.get("command_topics",{}).get(sb['topic'],{})
-        sb_node = {
-            **sb,
-            "branch":         "success",
-            "result_topic":   sb.get("result_topic",""),
-            "result_payload": sb_meta.get("result_payload",{})
-        }
-        _unpack_time(sb, "timeout", sb_node)
-        chain.append(sb_node)
-
-    if mode in ('error','both') and ev.get('error'):
-        eb = ev['error']
-        _validate_result(eb)
-        eb_meta  = schema_map.get("command_topics",{}).get(eb['topic'],{})
-        eb_node = {
-            **eb,
-            "branch":         "error",
-            "result_topic":   eb.get("result_topic",""),
-            "result_payload": eb_meta.get("result_payload",{})
-        }
-        _unpack_time(eb, "timeout", eb_node)
-        chain.append(eb_node)
+    chain = _build_chain(data['trigger'], data['result'], data['evaluate'])
 
     a = Action(
         name=data['name'].strip(),
@@ -221,17 +280,11 @@ def create_action():
     db.session.commit()
 
     # --- hot-reload into running ActionManager as a wrapper, not raw model ---
-    from controllers.actions_handler import get_action_manager, ActionWrapper
     mgr = get_action_manager()
     if mgr:
-        if a.enabled:
-            mgr.actions[a.id] = ActionWrapper(a)
-            # re-subscribe to any new topics
-            mgr._install_subscriptions()
-        else:
-            mgr.actions.pop(a.id, None)
+        mgr.reload_action(a)
 
-    return jsonify(ok=True, id=a.id)
+    return jsonify(ok=True, id=a.id, analysis=_analyse(a))
 
 
 def update_action(action_id: int):
@@ -250,82 +303,16 @@ def update_action(action_id: int):
         a.enabled = bool(data['enabled'])
 
     if any(k in data for k in ('trigger','result','evaluate')):
-        trg = data['trigger']
-        res = data['result']
-        ev  = data['evaluate']
-
-        _validate_trigger(trg)
-        _validate_result(res)
-        schema_map = _topic_schema(trg['device_id'])
-        new_chain = []
-
-        tmeta = schema_map.get("topics", {}).get(trg['topic'], {})
-        node_if = {
-            "device_id": trg['device_id'],
-            "source":    "io",
-            "topic":     trg['topic'],
-            "cmp":       trg.get('cmp','=='),
-            "match":     {"value": trg.get('value','')},
-            "poll_topic": trg.get("poll_topic", ""),
-            "poll_payload": tmeta.get("poll_payload","")
-        }
-        _unpack_time(trg, "poll_interval", node_if)
-        new_chain.append(node_if)
-
-        cmeta = schema_map.get("command_topics", {}).get(res['topic'], {})
-        node_then = {
-            "device_id":   res['device_id'],
-            "topic":       res['topic'],
-            "command":     res['command'],
-            "ignore_input": bool(res.get('ignore_input', False)),
-            "result_topic": res.get("result_topic", ""),
-            "result_payload": cmeta.get("result_payload", {})
-        }
-        _unpack_time(res, "timeout", node_then)
-        new_chain.append(node_then)
-
-        mode = ev.get('mode','ignore')
-        if mode in ('success','both') and ev.get('success'):
-            sb = ev['success']
-            _validate_result(sb)
-            sb_meta  = schema_map.get("command_topics",{}).get(sb['topic'],{})
-            sb_node = {
-                **sb,
-                "branch":         "success",
-                "result_topic":   sb.get("result_topic",""),
-                "result_payload": sb_meta.get("result_payload",{})
-            }
-            _unpack_time(sb, "timeout", sb_node)
-            new_chain.append(sb_node)
-
-        if mode in ('error','both') and ev.get('error'):
-            eb = ev['error']
-            _validate_result(eb)
-            eb_meta  = schema_map.get("command_topics",{}).get(eb['topic'],{})
-            eb_node = {
-                **eb,
-                "branch":         "error",
-                "result_topic":   eb.get("result_topic",""),
-                "result_payload": eb_meta.get("result_payload",{})
-            }
-            _unpack_time(eb, "timeout", eb_node)
-            new_chain.append(eb_node)
-
-        a.chain = new_chain
+        a.chain = _build_chain(data['trigger'], data['result'], data['evaluate'])
 
     db.session.commit()
 
-    # --- update live ActionManager as a wrapper, not raw model ---
-    from controllers.actions_handler import get_action_manager, ActionWrapper
+    # --- update live ActionManager (also lifts a loop-guard suspension) ---
     mgr = get_action_manager()
     if mgr:
-        if a.enabled:
-            mgr.actions[a.id] = ActionWrapper(a)
-            mgr._install_subscriptions()
-        else:
-            mgr.actions.pop(a.id, None)
+        mgr.reload_action(a)
 
-    return jsonify(ok=True)
+    return jsonify(ok=True, analysis=_analyse(a))
 
 
 def delete_action(action_id: int):
@@ -336,6 +323,7 @@ def delete_action(action_id: int):
     # --- remove from live ActionManager ---
     mgr = get_action_manager()
     if mgr:
-        mgr.actions.pop(action_id, None)
+        mgr.remove_action(action_id)
+    get_action_graph().remove(action_id)
 
     return jsonify(ok=True)
@@ -2,6 +2,8 @@ import os
 import threading
 import time
 import json
+import copy
+from datetime import datetime
 from typing import Optional
 from threading import Event
 from queue import Full
@@ -12,6 +14,12 @@ from models.device import Device
 
 from controllers.queues import ACTIONS_Q, ALL_QUEUES
 from controllers.queue_consumer import QueueConsumerMixin
+from controllers.action_guard import LoopGuard, SUSPEND_SEC, new_lineage
+from controllers.poll_scheduler import PollScheduler
+from controllers.action_scheduler import ActionScheduler, ScheduleSpec, schedule_node
+from controllers.action_templates import (
+    TemplateIndex, PLACEHOLDER, compile_template, is_member
+)
 
 
 # ──────────────────────── small helpers ───────────────────────────────
@@ -61,12 +69,29 @@ class ActionWrapper:
         self.id           = model.id
         self.name         = model.name
         self.chain        = model.chain
-        self.state        = "idle"          # idle | running | success | error
+        self.state        = "idle"          # idle | running | success | error | suspended
         self.if_payload   = None            # raw payload that fired IF
         self.if_extracted = None            # value after _extract_event
+        self.lineage      = None            # causal origin / hop count of the firing
+        self.template     = compile_template(model.chain)   # device-group template?
+        self.member       = None            # bound device id of a template instance
+
+    @property
+    def key(self):
+        """Runtime identity: action id, or (id, device id) for template instances."""
+        return (self.id, self.member) if self.member is not None else self.id
+
+    def bind(self, device_id: int) -> "ActionWrapper":
+        """Per-member instance of a template sharing its compiled chain."""
+        inst = copy.copy(self)
+        inst.member       = device_id
+        inst.state        = "idle"
+        inst.if_payload   = inst.if_extracted = inst.lineage = None
+        return inst
 
     def __repr__(self):
-        return f"<Action #{self.id} '{self.name}' state={self.state}>"
+        who = f"@dev{self.member}" if self.member is not None else ""
+        return f"<Action #{self.id}{who} '{self.name}' state={self.state}>"
 
 
 # ───────────────────── describe for debug ──────────────────────────────
@@ -76,7 +101,16 @@ def _describe_action(act: ActionWrapper, idx: int) -> str:
     """
     if_node = next((n for n in act.chain if n.get("source") == "io"), None)
     trig = "none"
-    if if_node:
+    sched = schedule_node(act.chain)
+    if act.template:
+        tpl  = act.template
+        trig = f"group {tpl['group']!r} <dev>/{tpl['topic']} {tpl['cmp']} {tpl['exp']!r}"
+    elif sched:
+        try:
+            trig = ScheduleSpec(sched).describe()
+        except (ValueError, KeyError) as exc:
+            trig = f"invalid schedule ({exc})"
+    elif if_node:
         dev = Device.query.get(if_node["device_id"])
         if dev:
             topic = f"{dev.topic_prefix}/{dev.mqtt_client_id}/{if_node['topic']}"
@@ -108,15 +142,28 @@ class ActionManager(QueueConsumerMixin):
         self.interval         = status_interval
         self.watchdog_timeout = status_interval * watchdog_factor
 
-        # per-action + pending THEN state
+        # per-action + pending THEN state (keyed by ActionWrapper.key)
         self.actions:  dict[int, ActionWrapper] = {}
-        self._pending: dict[int, dict]          = {}
+        self._pending: dict                     = {}
         self._lock                             = threading.Lock()
 
+        # device-group templates: member index + per-member instances
+        self.templates  = TemplateIndex()
+        self._instances: dict[tuple, ActionWrapper] = {}
+
         # topic caches
         self._triggers: set[str] = set()
         self._results:  set[str] = set()
 
+        # loop / amplification guard for loop-back chains
+        self.guard = LoopGuard()
+
+        # coalesced IF polling for devices that cannot push state
+        self.polls = PollScheduler(mqtt_client, self.flask_app.logger)
+
+        # cron / interval triggered Actions
+        self.schedules = ActionScheduler(self.flask_app, self._fire_scheduled)
+
         # start heartbeat & watchdog
         threading.Thread(
             target=self._status_loop,
@@ -132,13 +179,21 @@ class ActionManager(QueueConsumerMixin):
         # load actions, build topics, then consume queue
         self._load_actions()
         self._build_topic_sets()
+        with self.flask_app.app_context():
+            for act in self.actions.values():
+                self._install_template(act)
+                self._sync_polls(act)
+                self.schedules.sync(act.id, act.chain)
         self._start_consumer()
 
     # ------------------------------------------------------------------
     # QueueConsumerMixin requirements
     # ------------------------------------------------------------------
     def _is_relevant(self, topic: str) -> bool:
-        return (topic in self._triggers) or (topic in self._results)
+        return (
+            topic in self._triggers or topic in self._results
+            or self.templates.is_trigger(topic) or self.templates.is_result(topic)
+        )
 
     def _process(self, _dev_id: int, topic: str, payload: str):
         # wrap into fake Paho message
@@ -167,6 +222,8 @@ class ActionManager(QueueConsumerMixin):
             self._results.clear()
 
             for act in self.actions.values():
+                if act.template:            # indexed per member by TemplateIndex
+                    continue
                 # IF topics
                 if_node = next((n for n in act.chain if n.get("source") == "io"), None)
                 if if_node:
@@ -190,15 +247,132 @@ class ActionManager(QueueConsumerMixin):
         app.logger.info("⚙️  ActionManager IF-triggers : %s", sorted(self._triggers))
         app.logger.info("⚙️  ActionManager THEN-results: %s", sorted(self._results))
 
+    # ------------------------------------------------------------------
+    # hot-reload from the CRUD controller
+    # ------------------------------------------------------------------
+    def reload_action(self, model: ActionModel):
+        """(Re)install *model* after a save; re-saving lifts a suspension."""
+        self.guard.clear(model.id)
+        self._drop_instances(model.id)
+        if model.enabled:
+            act = self.actions[model.id] = ActionWrapper(model)
+            self._install_template(act)
+            self._sync_polls(act)
+            self.schedules.sync(model.id, model.chain)
+        else:
+            self.actions.pop(model.id, None)
+            self.templates.remove(model.id)
+            self.polls.remove(model.id)
+            self.schedules.remove(model.id)
+        self._build_topic_sets()
+
+    def remove_action(self, action_id: int):
+        self.guard.clear(action_id)
+        self._drop_instances(action_id)
+        self.actions.pop(action_id, None)
+        self.templates.remove(action_id)
+        self.polls.remove(action_id)
+        self.schedules.remove(action_id)
+        self._build_topic_sets()
+
+    # ------------------------------------------------------------------
+    # device-group templates
+    # ------------------------------------------------------------------
+    def _install_template(self, act: ActionWrapper):
+        if not act.template:
+            self.templates.remove(act.id)
+            return
+        group   = act.template["group"]
+        members = [d for d in Device.query.filter_by(enabled=True).all() if is_member(d, group)]
+        self.templates.install(act.id, act.template, members)
+        app.logger.info("⚙️  Template '%s' (#%s) bound to %d device(s) of group %r",
+                        act.name, act.id, len(members), group)
+
+    def _drop_instances(self, action_id: int):
+        with self._lock:
+            for key in [k for k in self._instances if k[0] == action_id]:
+                del self._instances[key]
+
+    def _instance(self, act: ActionWrapper, device_id: int) -> ActionWrapper:
+        with self._lock:
+            inst = self._instances.get((act.id, device_id))
+            if inst is None:
+                inst = self._instances[(act.id, device_id)] = act.bind(device_id)
+            return inst
+
+    def device_changed(self, dev: Device):
+        """Patch template membership after *dev* was created or edited."""
+        for aid in self.templates.device_changed(dev):
+            if dev.id not in self.templates.members(aid):
+                with self._lock:
+                    self._instances.pop((aid, dev.id), None)
+            act = self.actions.get(aid)
+            if act:
+                self._sync_polls(act)
+
+    def device_removed(self, device_id: int):
+        for aid in self.templates.device_removed(device_id):
+            with self._lock:
+                self._instances.pop((aid, device_id), None)
+            act = self.actions.get(aid)
+            if act:
+                self._sync_polls(act)
+
+    def _node_device(self, act: ActionWrapper, node: dict):
+        """Device row of *node*, resolving the template placeholder."""
+        dev_id = node.get("device_id")
+        if dev_id == PLACEHOLDER:
+            dev_id = act.member
+        return Device.query.get(dev_id) if dev_id is not None else None
+
+    def _sync_polls(self, act: ActionWrapper):
+        """Register the IF node's poll request (if any) with the scheduler."""
+        polls = []
+        if_node = next((n for n in act.chain if n.get("source") == "io"), None)
+        interval = self._to_seconds(
+            float((if_node or {}).get("poll_interval") or 0),
+            (if_node or {}).get("poll_interval_unit", "sec")
+        )
+        if if_node and interval > 0 and if_node.get("poll_topic"):
+            if act.template:
+                devs = [Device.query.get(d) for d in self.templates.members(act.id)]
+            else:
+                devs = [Device.query.get(if_node["device_id"])]
+            for dev in devs:
+                if not (dev and dev.topic_prefix and dev.mqtt_client_id):
+                    continue
+                base  = f"{dev.topic_prefix}/{dev.mqtt_client_id}"
+                topic = f"{base}/{if_node['poll_topic']}"
+                payload = if_node.get("poll_payload") or ""
+                if topic == f"{base}/{if_node['topic']}" and not payload:
+                    # an empty publish on the IF topic would just re-trigger the rule
+                    app.logger.warning(
+                        "⏱️  Action '%s': poll topic equals IF topic without payload – not polling",
+                        act.name
+                    )
+                    break
+                polls.append((topic, payload, interval))
+        self.polls.sync(act.id, polls)
+
     # ------------------------------------------------------------------
     # heartbeat & watchdog
     # ------------------------------------------------------------------
     def _status_loop(self):
         while True:
             with self.flask_app.app_context():
+                for key in self.guard.release_expired():
+                    act = (self._instances.get(key) if isinstance(key, tuple)
+                           else self.actions.get(key))
+                    if act and act.state == "suspended":
+                        app.logger.info("⚙️  Action %r resumed", act)
+                        self._set_state(act, "idle")
+
                 summary = [
                     {"id": a.id, "name": a.name, "state": a.state}
                     for a in self.actions.values()
+                ] + [
+                    {"id": i.id, "name": i.name, "state": i.state, "device_id": i.member}
+                    for i in list(self._instances.values()) if i.state != "idle"
                 ]
                 app.logger.info("🕒 actions/status → %s", summary)
                 self.client.publish("actions/status", json.dumps(summary))
@@ -217,7 +391,34 @@ class ActionManager(QueueConsumerMixin):
     # ------------------------------------------------------------------
     def _set_state(self, act: ActionWrapper, new_state: str):
         act.state = new_state
-        self.client.publish(f"actions/{act.id}/status", new_state)
+        if act.member is not None:
+            self.client.publish(f"actions/{act.id}/{act.member}/status", new_state)
+        else:
+            self.client.publish(f"actions/{act.id}/status", new_state)
+
+    def _suspend(self, act: ActionWrapper, reason: str, lineage: dict):
+        """Take a runaway Action out of service and raise an alert."""
+        app.logger.critical(
+            "⛔ Action %r suspended for %ss – %s", act, int(SUSPEND_SEC), reason
+        )
+        self._set_state(act, "suspended")
+        self.client.publish(
+            f"actions/{act.id}/alert",
+            json.dumps({
+                "action_id": act.id,
+                "device_id": act.member,
+                "name":      act.name,
+                "reason":    reason,
+                "origin":    lineage["origin"],
+                "hops":      lineage["hops"],
+                "suspended_for": SUSPEND_SEC,
+            })
+        )
+
+    def _publish_cmd(self, act: ActionWrapper, topic: str, cmd: str):
+        """Publish a command on behalf of *act*, tagging it with its lineage."""
+        self.guard.mark(topic, cmd, self.guard.child(act.lineage))
+        self.client.publish(topic, cmd)
 
     # ------------------------------------------------------------------
     # main handler (reused by queue)
@@ -235,7 +436,7 @@ class ActionManager(QueueConsumerMixin):
             log     = app.logger
 
             # STEP 1: THEN results
-            if topic in self._results:
+            if topic in self._results or self.templates.is_result(topic):
                 with self._lock:
                     for aid, pend in list(self._pending.items()):
                         for br, info in pend["branches"].items():
@@ -247,11 +448,12 @@ class ActionManager(QueueConsumerMixin):
 
             # STEP 2: IF triggers
             if topic in self._triggers:
+                lineage = self.guard.lineage(topic, raw)
                 for act in self.actions.values():
                     if act.state != "idle":
                         continue
                     if_node = next((n for n in act.chain if n.get("source") == "io"), None)
-                    if not if_node:
+                    if not if_node or act.template:
                         continue
                     dev = Device.query.get(if_node["device_id"])
                     if not dev:
@@ -269,17 +471,61 @@ class ActionManager(QueueConsumerMixin):
                     )
 
                     if match:
-                        log.info("🔥 IF triggered for '%s' (#%s)", act.name, act.id)
-                        self.client.publish(
-                            "actions/if/trigger",
-                            json.dumps({"action_id": act.id, "topic": topic, "payload": raw})
-                        )
-                        self._set_state(act, "running")
-                        act.if_payload   = raw
-                        act.if_extracted = payload
-                        threading.Thread(
-                            target=self._execute_then, args=(act,), daemon=True
-                        ).start()
+                        self._fire(act, topic, raw, payload, lineage)
+
+            # STEP 3: device-group templates (one indexed lookup)
+            if self.templates.is_trigger(topic):
+                lineage = self.guard.lineage(topic, raw)
+                for aid, dev_id, tpl in self.templates.match(topic):
+                    tmpl = self.actions.get(aid)
+                    if not tmpl:
+                        continue
+                    inst = self._instance(tmpl, dev_id)
+                    if inst.state != "idle":
+                        continue
+                    if _compare(payload, tpl["exp"], tpl["cmp"]):
+                        self._fire(inst, topic, raw, payload, lineage)
+
+    def _fire(self, act: ActionWrapper, topic: str, raw: str,
+              payload: str, lineage: dict) -> bool:
+        """Start THEN for *act* unless the loop guard refuses it."""
+        ok, reason = self.guard.admit(act.key, lineage)
+        if not ok:
+            if self.guard.is_suspended(act.key):
+                self._suspend(act, reason, lineage)
+            return False
+
+        app.logger.info("🔥 IF triggered for %r hop=%d", act, lineage["hops"])
+        self.client.publish(
+            "actions/if/trigger",
+            json.dumps({"action_id": act.id, "device_id": act.member,
+                        "topic": topic, "payload": raw,
+                        "origin": lineage["origin"], "hops": lineage["hops"]})
+        )
+        self._set_state(act, "running")
+        act.if_payload   = raw
+        act.if_extracted = payload
+        act.lineage      = lineage
+        threading.Thread(
+            target=self._execute_then, args=(act,), daemon=True
+        ).start()
+        return True
+
+    def _fire_scheduled(self, action_id: int, scheduled: float):
+        """ActionScheduler callback – the IF payload is the scheduled time."""
+        with self.flask_app.app_context():
+            act = self.actions.get(action_id)
+            if not act:
+                return
+            if act.state != "idle":
+                app.logger.warning(
+                    "⏰ '%s' (#%s) still %s – scheduled run skipped",
+                    act.name, act.id, act.state
+                )
+                return
+            when = datetime.fromtimestamp(scheduled).isoformat(timespec="seconds")
+            raw  = json.dumps({"event": "schedule", "scheduled": when})
+            self._fire(act, f"actions/schedule/{act.id}", raw, "schedule", new_lineage())
 
     # ------------------------------------------------------------------
     # THEN + branch execution (with loop-back)
@@ -293,19 +539,21 @@ class ActionManager(QueueConsumerMixin):
                 self._set_state(act, "idle")
                 return
 
-            dev_then = Device.query.get(then["device_id"])
+            dev_then = self._node_device(act, then)
             full_cmd = f"{dev_then.topic_prefix}/{dev_then.mqtt_client_id}/{then['topic']}"
             cmd      = then["command"] if then["command"] != "$IF" else act.if_payload or ""
 
             # publish the THEN command
             self.client.publish(
                 "actions/then/command",
-                json.dumps({"action_id": act.id, "topic": full_cmd, "command": cmd})
+                json.dumps({"action_id": act.id, "topic": full_cmd, "command": cmd,
+                            "origin": act.lineage["origin"], "hops": act.lineage["hops"]})
             )
             log.debug("🚀 [THEN] Pub %s → %r", full_cmd, payload_preview(cmd))
-            self.client.publish(full_cmd, cmd)
+            self._publish_cmd(act, full_cmd, cmd)
 
-            # ─── NEW: loop the command back into all queues ─────────
+            # ─── loop the command back into all queues (lineage is
+            #     looked up by topic + payload, see LoopGuard.mark) ────
             for tag, q in ALL_QUEUES:
                 try:
                     q.put_nowait((dev_then.id, full_cmd, cmd))
@@ -338,7 +586,7 @@ class ActionManager(QueueConsumerMixin):
 
             ev = Event()
             with self._lock:
-                self._pending[act.id] = {
+                self._pending[act.key] = {
                     "event": ev,
                     "branches": {
                         **({"success": {"topic": succ_rt, "cmp": succ.get("cmp", "=="),
@@ -353,7 +601,7 @@ class ActionManager(QueueConsumerMixin):
             ev.wait(wait)
 
             with self._lock:
-                pend = self._pending.pop(act.id, {})
+                pend = self._pending.pop(act.key, {})
             obs = pend.get("observed")
 
             self.client.publish(
@@ -387,7 +635,7 @@ class ActionManager(QueueConsumerMixin):
             for node in act.chain:
                 if node.get("branch") != branch:
                     continue
-                dev      = Device.query.get(node["device_id"])
+                dev      = self._node_device(act, node)
                 full_cmd = f"{dev.topic_prefix}/{dev.mqtt_client_id}/{node['topic']}"
                 cmd      = node["command"] if node["command"] != "$IF" else act.if_payload or ""
                 evt      = f"actions/evaluate/{branch}/command"
@@ -395,7 +643,7 @@ class ActionManager(QueueConsumerMixin):
                     "action_id": act.id, "topic": full_cmd, "command": cmd
                 }))
                 app.logger.info(" → [%s] Pub %s → %r", branch.upper(), full_cmd, cmd)
-                self.client.publish(full_cmd, cmd)
+                self._publish_cmd(act, full_cmd, cmd)
 
     @staticmethod
     def _to_seconds(val: float, unit: str) -> float:
@@ -403,7 +651,8 @@ class ActionManager(QueueConsumerMixin):
             "ms":   val / 1000,
             "sec":  val,
             "min":  val * 60,
-            "hour": val * 3600
+            "hour": val * 3600,
+            "day":  val * 86400
         }.get(unit, val)
 
 
@@ -206,7 +206,7 @@ class CameraManager(QueueConsumerMixin):
             # Publish snapshot back to MQTT
             b64 = base64.b64encode(out).decode()
             topic_out = f"{prefix}/{client_id}/snapshot"
-            self.client.publish(topic_out, json.dumps({"ext": ext, "file": b64}))
+            self.client.publish(topic_out, json.dumps({"ext": ext, "file": b64, "camera": dev.name}))
             self.flask_app.logger.info(
                 "MQTT→ %s ext=%s size=%d chars", topic_out, ext, len(b64)
             )
@@ -11,6 +11,30 @@ from models.device_schema import DeviceSchema
 from models.camera import Camera
 from models.camera_stream import CameraStream
 
+# ── LIVE MANAGERS ───────────────────────────────────────────────────
+def _notify_device_changed(dev):
+    """Let running managers patch their device-derived indexes."""
+    from controllers.actions_handler import get_action_manager
+    from controllers.storage_handler import get_storage_manager
+    mgr = get_action_manager()
+    if mgr:
+        mgr.device_changed(dev)
+    storage = get_storage_manager()
+    if storage:
+        storage.invalidate_devices(dev.id)
+
+
+def _notify_device_removed(dev_id):
+    from controllers.actions_handler import get_action_manager
+    from controllers.storage_handler import get_storage_manager
+    mgr = get_action_manager()
+    if mgr:
+        mgr.device_removed(dev_id)
+    storage = get_storage_manager()
+    if storage:
+        storage.invalidate_devices(dev_id)
+
+
 # ── LIST DEVICES FOR TABLE ───────────────────────────────────────────
 def list_devices():
     rows = [
@@ -44,6 +68,7 @@ def get_device(dev_id):
         "poll_interval_unit": dev.poll_interval_unit,
         "description": dev.description,
         "parameters": dev.parameters or {},
+        "tags": dev.tags or [],
         "enabled": dev.enabled,
         "image": dev.image,
         "qr_code": dev.qr_code,
@@ -72,6 +97,7 @@ def create_device():
         poll_interval_unit=data.get("poll_interval_unit", "sec"),
         description=data.get("description"),
         parameters=data.get("parameters", {}),
+        tags=data.get("tags", []),
         enabled=data.get("enabled", True),
         image=data.get("image"),
         qr_code=data.get("qr_code"),
@@ -141,6 +167,7 @@ def create_device():
         cam.default_stream_id = stream.id
 
     db.session.commit()
+    _notify_device_changed(dev)
     return jsonify(ok=True, id=dev.id)
 
 
@@ -165,6 +192,7 @@ def update_device(dev_id):
         "description",
         "image",
         "qr_code",
+        "tags",
         "enabled",
     ):
         if f in data:
@@ -239,6 +267,7 @@ def update_device(dev_id):
         cam.default_stream_id = stream.id
 
     db.session.commit()
+    _notify_device_changed(dev)
     return jsonify(ok=True)
 
 # ── DELETE DEVICE (cascades to Camera + Streams if your FKs are set ON DELETE CASCADE) ───
@@ -246,6 +275,7 @@ def delete_device(dev_id):
     dev = Device.query.get_or_404(dev_id)
     db.session.delete(dev)
     db.session.commit()
+    _notify_device_removed(dev_id)
     return jsonify(ok=True)
 
 
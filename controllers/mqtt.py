@@ -1,6 +1,7 @@
 # mqtt_client.py
 
 import os
+import logging
 import threading
 import copy
 import math
@@ -52,12 +53,13 @@ def _on_message(client, app, msg):
             payload = msg.payload.decode()
             parts   = topic.split("/")
 
-            # preview
-            try:
-                preview = payload_preview(json.loads(payload))
-            except Exception:
-                preview = payload
-            app.logger.debug("MQTT → %s → %s", topic, preview)
+            # preview (parsing a multi-MB file payload only pays off when logged)
+            if app.logger.isEnabledFor(logging.DEBUG):
+                try:
+                    preview = payload_preview(json.loads(payload))
+                except Exception:
+                    preview = payload
+                app.logger.debug("MQTT → %s → %s", topic, preview)
 
             if len(parts) < 3:
                 return
@@ -0,0 +1,128 @@
+"""
+Central poll scheduler for devices that cannot push their state.
+
+An Action IF node may carry `poll_topic` / `poll_payload` and a
+`poll_interval` (+ `poll_interval_unit`).  Every (topic, payload) pair is
+one *poll*; Actions polling the same device topic share it and the
+shortest requested interval wins, so broker traffic grows with devices,
+not with rules.
+
+Polls live in a single heap ordered by due time and are served by one
+thread.  The first run of each poll is spread randomly over its
+interval and every re-schedule gets ±`POLL_JITTER` so devices added at
+the same time do not fire in lock-step.
+"""
+
+import os
+import heapq
+import random
+import threading
+import time
+from itertools import count
+
+
+POLL_JITTER       = float(os.getenv("POLL_JITTER",       0.1))   # fraction of interval
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", 1.0))   # sec
+
+
+class PollScheduler:
+    def __init__(self, mqtt_client, logger):
+        self.client = mqtt_client
+        self.log    = logger
+
+        self._cond  = threading.Condition()
+        self._heap: list[tuple]  = []            # (due, seq, key)
+        self._polls: dict[tuple, dict] = {}      # key → {"due", "interval", "subs"}
+        self._by_action: dict[int, set] = {}     # action id → keys
+        self._seq = count()
+
+        threading.Thread(
+            target=self._run, name="PollScheduler", daemon=True
+        ).start()
+
+    # ------------------------------------------------------------------
+    # registration
+    # ------------------------------------------------------------------
+    def sync(self, action_id: int, polls):
+        """
+        Replace the polls requested by *action_id* with *polls*, an
+        iterable of ``(topic, payload, interval_sec)``.
+        """
+        wanted = {}
+        for topic, payload, interval in polls:
+            key = (topic, payload or "")
+            wanted[key] = max(float(interval), POLL_MIN_INTERVAL)
+
+        with self._cond:
+            for key in self._by_action.pop(action_id, set()) - set(wanted):
+                entry = self._polls.get(key)
+                if not entry:
+                    continue
+                entry["subs"].pop(action_id, None)
+                if entry["subs"]:
+                    entry["interval"] = min(entry["subs"].values())
+                else:
+                    del self._polls[key]      # heap item becomes stale
+
+            for key, interval in wanted.items():
+                entry = self._polls.get(key)
+                if entry is None:
+                    entry = {"subs": {}, "interval": interval, "due": None}
+                    self._polls[key] = entry
+                entry["subs"][action_id] = interval
+                entry["interval"] = min(entry["subs"].values())
+                now = time.time()
+                if entry["due"] is None or entry["due"] > now + entry["interval"]:
+                    self._push(key, now + random.uniform(0, entry["interval"]))
+
+            if wanted:
+                self._by_action[action_id] = set(wanted)
+            self._cond.notify()
+
+    def remove(self, action_id: int):
+        self.sync(action_id, ())
+
+    def snapshot(self) -> list:
+        """Current polls, for status/debug output."""
+        with self._cond:
+            return [
+                {"topic": t, "payload": p, "interval": e["interval"],
+                 "actions": sorted(e["subs"]), "due": e["due"]}
+                for (t, p), e in self._polls.items()
+            ]
+
+    # ------------------------------------------------------------------
+    # heap
+    # ------------------------------------------------------------------
+    def _push(self, key, due: float):
+        self._polls[key]["due"] = due
+        heapq.heappush(self._heap, (due, next(self._seq), key))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, _, key = self._heap[0]
+                    entry = self._polls.get(key)
+                    if entry is None or entry["due"] != due:
+                        heapq.heappop(self._heap)      # stale item
+                        continue
+                    delay = due - time.time()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    jitter = entry["interval"] * POLL_JITTER
+                    self._push(key, time.time() + entry["interval"]
+                               + random.uniform(-jitter, jitter))
+                    break
+
+            topic, payload = key
+            try:
+                self.client.publish(topic, payload)
+                self.log.debug("⏱️  poll → %s %r", topic, payload)
+            except Exception as exc:
+                self.log.warning("⏱️  poll %s failed: %s", topic, exc)
@@ -9,13 +9,83 @@ and implement:
 
     def _is_relevant(self, topic:str) -> bool
     def _process(self, device_id:int, topic:str, payload:str) -> None
+
+Optionally override `_executor_for()` to run messages of different
+devices on separate `Bulkhead`s instead of the one shared pool.
 """
 
+import time
 import threading
-from queue import Empty
+from queue import Empty, Full
 from concurrent.futures import ThreadPoolExecutor
 
 
+class Bulkhead:
+    """
+    Small executor with its own threads, a bounded backlog and counters.
+    `submit()` raises `queue.Full` when `max_queue` tasks are waiting;
+    a task that waited longer than `queue_timeout` seconds is not run,
+    *on_expire(*args)* is called instead.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int,
+                 queue_timeout: float = 0, on_expire=None):
+        self.name          = name
+        self.workers       = workers
+        self.max_queue     = max_queue
+        self.queue_timeout = queue_timeout
+        self._on_expire    = on_expire
+        self._pool = ThreadPoolExecutor(max_workers=workers,
+                                        thread_name_prefix=f"Bulkhead-{name}")
+        self._lock = threading.Lock()
+        self._m = dict(queued=0, running=0, done=0, failed=0,
+                       rejected=0, expired=0, busy_sec=0.0, max_sec=0.0, max_wait=0.0)
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._m["queued"] >= self.max_queue:
+                self._m["rejected"] += 1
+                raise Full(self.name)
+            self._m["queued"] += 1
+        self._pool.submit(self._run, time.monotonic(), fn, args)
+
+    def _run(self, enqueued: float, fn, args):
+        start  = time.monotonic()
+        waited = start - enqueued
+        with self._lock:
+            self._m["queued"]  -= 1
+            self._m["max_wait"] = max(self._m["max_wait"], waited)
+            expired = bool(self.queue_timeout and waited > self.queue_timeout)
+            if expired:
+                self._m["expired"] += 1
+            else:
+                self._m["running"] += 1
+        if expired:
+            if self._on_expire:
+                self._on_expire(*args)
+            return
+
+        ok = False
+        try:
+            fn(*args)
+            ok = True
+        finally:
+            took = time.monotonic() - start
+            with self._lock:
+                self._m["running"]  -= 1
+                self._m["done" if ok else "failed"] += 1
+                self._m["busy_sec"] += took
+                self._m["max_sec"]   = max(self._m["max_sec"], took)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            m = dict(self._m)
+        finished = m["done"] + m["failed"]
+        m["avg_sec"] = round(m["busy_sec"] / finished, 3) if finished else 0.0
+        m.update(workers=self.workers, max_queue=self.max_queue)
+        return m
+
+
 class QueueConsumerMixin:
     _queue     = None     # override
     _tag       = "🪄"
@@ -47,9 +117,23 @@ class QueueConsumerMixin:
                 continue
 
             log.debug("%s ✔︎ take %s", self._tag, topic)
-            self._pool.submit(self._safe_process, dev_id, topic, payload)
+            try:
+                self._executor_for(dev_id, topic).submit(
+                    self._safe_process, dev_id, topic, payload
+                )
+            except Full:
+                self._rejected(dev_id, topic, payload, "backlog full")
             self._queue.task_done()
 
+    # ------------------------------------------------------------------
+
+    def _executor_for(self, device_id, topic):
+        """Executor (or Bulkhead) for one message – the shared pool by default."""
+        return self._pool
+
+    def _rejected(self, device_id, topic, payload, reason):
+        self.flask_app.logger.warning("%s ✖︎ drop %s – %s", self._tag, topic, reason)
+
     # wrapper so an exception in _process doesn’t kill the worker
     def _safe_process(self, device_id, topic, payload):
         try:
@@ -4,7 +4,9 @@ Storage device filesystem logic for Factory Lens.
 Handles listing devices, browsing folders, uploading, downloading, and deleting files.
 """
 import os
+from datetime import datetime
 from flask import (
+    jsonify,
     send_from_directory,
     flash,
     redirect,
@@ -16,6 +18,7 @@ from flask import (
 )
 from models.device import Device
 from models.device_model import DeviceModel
+from models.storage_file import StorageFile
 
 
 # ────────────────────────────────────────────────────────────────────────────────
@@ -82,6 +85,8 @@ def browse_files(dev_id):
         file = request.files.get("file")
         if file:
             dest = os.path.join(base, file.filename)
+            if os.path.exists(dest):
+                os.remove(dest)       # may be a dedup hard link – never write through it
             file.save(dest)
             flash(f"Uploaded {file.filename}", "success")
         return redirect(
@@ -97,10 +102,13 @@ def browse_files(dev_id):
 
     if os.path.isdir(abs_path):
         # list directory
-        entries = [
-            {"name": n, "is_dir": os.path.isdir(os.path.join(abs_path, n))}
-            for n in sorted(os.listdir(abs_path))
-        ]
+        # DirEntry.is_dir() uses the d_type from readdir – no stat per entry
+        with os.scandir(abs_path) as it:
+            entries = sorted(
+                ({"name": e.name, "is_dir": e.is_dir()}
+                 for e in it if not e.name.startswith(".")),
+                key=lambda e: e["name"],
+            )
         return render_template(
             "storage/browse.html",
             dev=dev,
@@ -140,3 +148,108 @@ def delete_file(dev_id):
     return redirect(
         url_for("storage.browse_files", dev_id=dev.id, path=os.path.dirname(target))
     )
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Upload spool (FTP / SFTP targets)
+# ────────────────────────────────────────────────────────────────────────────────
+def spool_status():
+    """Jobs waiting in the local spool plus pooled connection stats."""
+    from controllers.storage_handler import get_storage_manager
+    from storage_pool import get_pool
+
+    mgr = get_storage_manager()
+    if mgr is None:
+        return jsonify(error="storage manager not running"), 503
+    return jsonify(spool=mgr.spool.snapshot(), connections=get_pool().stats())
+
+
+def spool_retry():
+    """Retry all waiting uploads now (optionally only those of ?dev=<id>)."""
+    from controllers.storage_handler import get_storage_manager
+
+    mgr = get_storage_manager()
+    if mgr is None:
+        return jsonify(error="storage manager not running"), 503
+    dev_id = request.values.get("dev", type=int)
+    return jsonify(ok=True, queued=mgr.spool.retry_now(dev_id))
+
+
+def worker_metrics():
+    """Per-storage-device worker pools (queued / running / failed / timings)."""
+    from controllers.storage_handler import get_storage_manager
+
+    mgr = get_storage_manager()
+    if mgr is None:
+        return jsonify(error="storage manager not running"), 503
+    return jsonify(workers=mgr.worker_metrics())
+
+
+def dedup_stats(dev_id):
+    """Blob / link counts and dedup ratio of a local "dedup" storage device."""
+    from controllers.storage_dedup import BlobStore
+    from controllers.storage_handler import local_base
+
+    dev = Device.query.get_or_404(dev_id)
+    params = dev.parameters or {}
+    if not params.get("dedup"):
+        return jsonify(error="deduplication is not enabled for this device"), 400
+    return jsonify(dedup=BlobStore(local_base(params)).stats())
+
+
+def storage_usage(dev_id):
+    """Indexed file count / bytes, busiest folders and retention state of a device."""
+    from controllers.storage_handler import get_storage_manager
+
+    mgr = get_storage_manager()
+    if mgr is None:
+        return jsonify(error="storage manager not running"), 503
+    dev = Device.query.get_or_404(dev_id)
+    model = (dev.model.name or "").lower() if dev.model else ""
+    try:
+        usage = mgr.retention.usage(dev.id, model, dev.parameters or {})
+    except Exception as exc:
+        current_app.logger.error("🧹 usage of %s failed: %s", dev.name, exc)
+        return jsonify(error=str(exc)), 502
+    return jsonify(usage=usage)
+
+
+def _iso(value):
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        abort(400, f"bad timestamp {value!r} (ISO 8601 expected)")
+
+
+def search_files():
+    """
+    Catalogue query: ?dev=&from=&to=&source=&action=&ext=&name=&limit=&offset=
+
+    ``name`` is a prefix match (``*`` for wildcards – those cannot use the
+    index); ``from`` / ``to`` are ISO timestamps (UTC).  Newest first.
+    """
+    q = StorageFile.query
+    dev_id = request.args.get("dev", type=int)
+    if dev_id is not None:
+        q = q.filter(StorageFile.device_id == dev_id)
+    start, end = _iso(request.args.get("from")), _iso(request.args.get("to"))
+    if start:
+        q = q.filter(StorageFile.mtime >= start)
+    if end:
+        q = q.filter(StorageFile.mtime < end)
+    for field in ("source", "action", "ext"):
+        value = request.args.get(field)
+        if value:
+            q = q.filter(getattr(StorageFile, field) == value)
+    name = request.args.get("name")
+    if name:
+        pattern = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = pattern.replace("*", "%")
+        q = q.filter(StorageFile.name.like(pattern if "*" in name else pattern + "%",
+                                           escape="\\"))
+
+    limit  = min(request.args.get("limit", 100, type=int), 1000)
+    offset = request.args.get("offset", 0, type=int)
+    rows = (q.order_by(StorageFile.mtime.desc(), StorageFile.id.desc())
+             .offset(offset).limit(limit).all())
+    return jsonify(files=[r.to_dict() for r in rows], limit=limit, offset=offset)
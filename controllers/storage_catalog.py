@@ -0,0 +1,249 @@
+"""
+Metadata catalogue of stored files (`StorageFile` rows).
+
+Two writers keep it current:
+
+* the StorageManager calls `add()` for every file it stores (with the
+  SHA-256 computed while streaming and the source / action from the
+  payload); retention sweeps call `remove()`
+* a background indexer walks each storage device once after start-up and
+  then every `STORAGE_CATALOG_RESCAN` seconds, adding files written by
+  other means (elFinder, shell, before the catalogue existed) and dropping
+  rows of files that are gone
+
+Writes are queued and flushed by one thread in batches of up to
+`STORAGE_CATALOG_BATCH` rows (or every `STORAGE_CATALOG_FLUSH` seconds), so
+a burst of snapshots costs a handful of transactions, not one each.
+"""
+
+import os
+import time
+import queue
+import itertools
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+from sqlalchemy import tuple_
+
+from extensions import db
+from models.storage_file import StorageFile
+from models.tiered_file import TieredFile
+
+CATALOG_FLUSH  = float(os.getenv("STORAGE_CATALOG_FLUSH",  1.0))     # sec
+CATALOG_BATCH  = int(os.getenv("STORAGE_CATALOG_BATCH",    500))
+CATALOG_RESCAN = float(os.getenv("STORAGE_CATALOG_RESCAN", 86400))   # sec
+CATALOG_DELAY  = float(os.getenv("STORAGE_CATALOG_DELAY",  60))      # sec after start
+
+
+def _split(rel: str):
+    rel = os.path.normpath(rel).replace("\\", "/").lstrip("/")
+    folder, name = os.path.split(rel)
+    return folder, name
+
+
+class StorageCatalog:
+    def __init__(self, flask_app, devices, backend_for):
+        """
+        *devices()* returns ``[(dev_id, model, params)]`` (inside an app
+        context); *backend_for(dev_id, model, params)* gives an object whose
+        ``walk()`` yields ``(rel, mtime, size)`` – see storage_retention.
+        """
+        self.flask_app    = flask_app
+        self._devices     = devices
+        self._backend_for = backend_for
+        self._q: queue.Queue = queue.Queue()
+        self._recent = OrderedDict()             # (dev, folder, name) → size, our own adds
+        self._recent_lock = threading.Lock()
+
+        threading.Thread(
+            target=self._write_loop, name="StorageCatalog-Writer", daemon=True
+        ).start()
+        threading.Thread(
+            target=self._index_loop, name="StorageCatalog-Indexer", daemon=True
+        ).start()
+
+    # ------------------------------------------------------------------
+    # public API
+    # ------------------------------------------------------------------
+    def _remember(self, key, size) -> None:
+        with self._recent_lock:
+            self._recent[key] = size
+            self._recent.move_to_end(key)
+            if len(self._recent) > 10000:
+                self._recent.popitem(last=False)
+
+    def claim(self, dev_id: int, rel: str) -> None:
+        """The manager is about to write *rel* – watcher events for it are ours."""
+        self._remember((dev_id, *_split(rel)), None)
+
+    def add(self, dev_id: int, rel: str, size: int, mtime: float = None,
+            sha256: str = None, source: str = None, action: str = None) -> None:
+        folder, name = _split(rel)
+        if sha256:
+            self._remember((dev_id, folder, name), size)
+        self._q.put(("add", {
+            "device_id": dev_id,
+            "folder":    folder,
+            "name":      name,
+            "ext":       os.path.splitext(name)[1].lstrip(".").lower()[:16],
+            "size":      size,
+            "mtime":     datetime.utcfromtimestamp(mtime or time.time()),
+            "source":    (source or None) and str(source)[:120],
+            "action":    (action or None) and str(action)[:120],
+            "sha256":    sha256,
+        }))
+
+    def touch(self, dev_id: int, rel: str, size: int, mtime: float) -> bool:
+        """
+        A file seen by the watcher.  Skipped (False) if the manager wrote it
+        itself – claimed and not yet added, or added with this size.
+        """
+        key = (dev_id, *_split(rel))
+        with self._recent_lock:
+            if key in self._recent and self._recent[key] in (None, size):
+                return False
+        self.add(dev_id, rel, size, mtime)
+        return True
+
+    def remove(self, dev_id: int, rels) -> None:
+        for rel in rels:
+            self._q.put(("del", (dev_id, *_split(rel))))
+
+    def remove_dir(self, dev_id: int, rel_dir: str) -> None:
+        folder = os.path.normpath(rel_dir).replace("\\", "/").strip("/")
+        self._q.put(("rmdir", (dev_id, folder)))
+
+    # ------------------------------------------------------------------
+    # batched writer
+    # ------------------------------------------------------------------
+    def _write_loop(self):
+        while True:
+            batch = [self._q.get()]
+            deadline = time.time() + CATALOG_FLUSH
+            while len(batch) < CATALOG_BATCH:
+                left = deadline - time.time()
+                if left <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=left))
+                except queue.Empty:
+                    break
+            try:
+                self._flush(batch)
+            except Exception:
+                self.flask_app.logger.exception("🗂️ catalogue flush of %d entries failed", len(batch))
+
+    def _flush(self, batch: list) -> None:
+        # last operation per path wins
+        latest: dict = {}
+        folders = []
+        for op, item in batch:
+            if op == "rmdir":
+                folders.append(item)
+                continue
+            key = item if op == "del" else (item["device_id"], item["folder"], item["name"])
+            latest[key] = (op, item)
+
+        with self.flask_app.app_context():
+            for dev_id, folder in folders:
+                like = folder.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                db.session.query(StorageFile).filter(
+                    StorageFile.device_id == dev_id,
+                    (StorageFile.folder == folder)
+                    | StorageFile.folder.like(like + "/%", escape="\\"),
+                ).delete(synchronize_session=False)
+            keys = list(latest)
+            for i in range(0, len(keys), 200):
+                db.session.query(StorageFile).filter(
+                    tuple_(StorageFile.device_id, StorageFile.folder, StorageFile.name)
+                    .in_(keys[i:i + 200])
+                ).delete(synchronize_session=False)
+            rows = [item for op, item in latest.values() if op == "add"]
+            if rows:
+                db.session.bulk_insert_mappings(StorageFile, rows)
+            db.session.commit()
+
+    # ------------------------------------------------------------------
+    # background indexer
+    # ------------------------------------------------------------------
+    def _index_loop(self):
+        time.sleep(CATALOG_DELAY)
+        while True:
+            try:
+                with self.flask_app.app_context():
+                    devices = self._devices()
+            except Exception:
+                self.flask_app.logger.exception("🗂️ catalogue: device lookup failed")
+                devices = []
+            for dev_id, model, params in devices:
+                try:
+                    self.reindex(dev_id, model, params)
+                except Exception as exc:
+                    self.flask_app.logger.error("🗂️ indexing dev%s failed: %s", dev_id, exc)
+            time.sleep(CATALOG_RESCAN)
+
+    def _not_tiered(self, dev_id, folder: str, names: list) -> list:
+        """Drop names the tier migrator moved – they still exist under that path."""
+        with self.flask_app.app_context():
+            moved = {
+                n for (n,) in TieredFile.query.with_entities(TieredFile.name)
+                .filter(TieredFile.device_id == dev_id, TieredFile.folder == folder,
+                        TieredFile.name.in_(names))
+            }
+        return [n for n in names if n not in moved]
+
+    def reindex(self, dev_id, model, params) -> dict:
+        """Reconcile the rows of one device with its tree, folder by folder."""
+        backend = self._backend_for(dev_id, model, params)
+        added = dropped = 0
+        seen_folders = set()
+        started = datetime.utcnow()
+
+        # walk() yields the files of one folder consecutively
+        entries = ((*_split(rel), mtime, size) for rel, mtime, size in backend.walk())
+        for folder, group in itertools.groupby(entries, key=lambda e: e[0]):
+            seen_folders.add(folder)
+            on_disk = {name: (mtime, size) for _, name, mtime, size in group}
+            with self.flask_app.app_context():
+                known = {
+                    r.name: (r.mtime, r.size)
+                    for r in StorageFile.query
+                    .with_entities(StorageFile.name, StorageFile.mtime, StorageFile.size)
+                    .filter(StorageFile.device_id == dev_id, StorageFile.folder == folder)
+                }
+            for name, (mtime, size) in on_disk.items():
+                row = known.get(name)
+                if row is None or row[1] != size:
+                    self.add(dev_id, f"{folder}/{name}" if folder else name, size, mtime)
+                    added += 1
+            gone = [n for n in known if n not in on_disk]
+            if gone:
+                gone = self._not_tiered(dev_id, folder, gone)
+            self.remove(dev_id, [f"{folder}/{n}" if folder else n for n in gone])
+            dropped += len(gone)
+
+        # folders that vanished altogether (moved to the cold tier does not count)
+        with self.flask_app.app_context():
+            tiered = {
+                f for (f,) in TieredFile.query.with_entities(TieredFile.folder)
+                .filter(TieredFile.device_id == dev_id).distinct()
+            }
+            stale = [
+                f for (f,) in StorageFile.query.with_entities(StorageFile.folder)
+                .filter(StorageFile.device_id == dev_id).distinct()
+                if f not in seen_folders and f not in tiered
+            ]
+            for folder in stale:
+                # rows written while we walked may belong to a folder created meanwhile
+                dropped += StorageFile.query.filter(
+                    StorageFile.device_id == dev_id, StorageFile.folder == folder,
+                    StorageFile.mtime < started,
+                ).delete(synchronize_session=False)
+            db.session.commit()
+
+        if added or dropped:
+            self.flask_app.logger.info(
+                "🗂️ catalogue dev%s: %d files added, %d dropped", dev_id, added, dropped
+            )
+        return {"added": added, "dropped": dropped}
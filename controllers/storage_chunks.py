@@ -0,0 +1,249 @@
+"""
+Chunked file transfers for the StorageManager.
+
+Files larger than one MQTT packet are sent as a transfer:
+
+    <prefix>/<client>/file/<tid>/begin      {"name", "ext", "path", "size",
+                                             "chunk_size", "chunks", "sha256"}
+    <prefix>/<client>/file/<tid>/chunk/<n>  base64 of bytes n*chunk_size …
+    <prefix>/<client>/file/<tid>/end        {"sha256": …}   (optional here)
+
+Chunks are decoded one at a time and written at their offset into
+``<key>.part`` under `STORAGE_CHUNK_DIR`, so memory stays bounded by one
+chunk and chunks may arrive in any order.  The begin metadata
+(``<key>.json``) and an append-only list of received chunk numbers
+(``<key>.idx``) live next to it, which lets a transfer resume after a
+client reconnect or an app restart: re-sending *begin* for a known
+transfer reports the chunks still missing on ``file/<tid>/status``.
+
+Transfers idle for longer than `STORAGE_CHUNK_TTL` are deleted; a *begin*
+announcing more than `STORAGE_CHUNK_MAX_SIZE` bytes is refused (0 = no limit).
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+from controllers.storage_retention import parse_bytes
+
+CHUNK_DIR  = os.getenv("STORAGE_CHUNK_DIR", "/app/storage/.incoming")
+CHUNK_TTL  = float(os.getenv("STORAGE_CHUNK_TTL", 3600))         # sec
+BEGIN_WAIT = float(os.getenv("STORAGE_CHUNK_BEGIN_WAIT", 5))     # sec
+MAX_SIZE   = parse_bytes(os.getenv("STORAGE_CHUNK_MAX_SIZE", "4G"))  # bytes, 0 = off
+
+CHUNK_TOPIC = re.compile(
+    r"^(?P<prefix>[^/]+)/(?P<client>[^/]+)/file/(?P<tid>[^/]+)/"
+    r"(?P<op>begin|end|chunk/(?P<n>\d+))$"
+)
+
+_SAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class TransferError(Exception):
+    pass
+
+
+class ChunkAssembler:
+    def __init__(self, logger, spool_dir: str = CHUNK_DIR):
+        self.log = logger
+        self.dir = spool_dir
+        os.makedirs(self.dir, exist_ok=True)
+
+        self._cond  = threading.Condition()
+        self._open: dict[str, dict] = {}         # key → {"meta", "got", "lock", "seen"}
+
+    # ------------------------------------------------------------------
+    # paths / state
+    # ------------------------------------------------------------------
+    @staticmethod
+    def key(client_id: str, tid: str) -> str:
+        return _SAFE.sub("_", f"{client_id}__{tid}")
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.dir, f"{key}.{ext}")
+
+    def _load(self, key: str):
+        """State from memory, else from disk (after a restart); caller holds _cond."""
+        st = self._open.get(key)
+        if st is not None or not os.path.exists(self._path(key, "json")):
+            return st
+        with open(self._path(key, "json")) as fh:
+            meta = json.load(fh)
+        got = set()
+        if os.path.exists(self._path(key, "idx")):
+            with open(self._path(key, "idx")) as fh:
+                got = {int(line) for line in fh if line.strip()}
+        st = {"meta": meta, "got": got, "lock": threading.Lock(), "seen": time.time()}
+        self._open[key] = st
+        return st
+
+    def state(self, key: str):
+        """State of an open (or persisted) transfer, or None."""
+        with self._cond:
+            return self._load(key)
+
+    @staticmethod
+    def missing(st: dict) -> list:
+        return [n for n in range(st["meta"]["chunks"]) if n not in st["got"]]
+
+    # ------------------------------------------------------------------
+    # protocol steps
+    # ------------------------------------------------------------------
+    def begin(self, key: str, meta: dict) -> dict:
+        """Open (or resume) a transfer and return its state."""
+        try:
+            size       = int(meta["size"])
+            chunk_size = int(meta["chunk_size"])
+        except (KeyError, TypeError, ValueError):
+            raise TransferError("begin needs integer 'size' and 'chunk_size'")
+        if chunk_size <= 0 or size < 0:
+            raise TransferError("invalid size / chunk_size")
+        if MAX_SIZE and size > MAX_SIZE:
+            raise TransferError(f"size {size} exceeds the limit of {MAX_SIZE} bytes")
+        meta = dict(meta, size=size, chunk_size=chunk_size,
+                    chunks=max(1, -(-size // chunk_size)))
+
+        with self._cond:
+            st = self._load(key)
+            same = st and all(
+                st["meta"].get(k) == meta.get(k) for k in ("size", "chunk_size", "sha256")
+            )
+            if same:
+                st["seen"] = time.time()
+                self.log.info("💾 transfer %s resumed (%d/%d chunks)",
+                              key, len(st["got"]), meta["chunks"])
+                return st
+            if st:
+                self._discard(key)
+
+            with open(self._path(key, "json"), "w") as fh:
+                json.dump(meta, fh)
+            with open(self._path(key, "part"), "wb") as fh:
+                fh.truncate(size)
+            open(self._path(key, "idx"), "w").close()
+
+            st = {"meta": meta, "got": set(), "lock": threading.Lock(), "seen": time.time()}
+            self._open[key] = st
+            self._cond.notify_all()
+        self.log.info("💾 transfer %s begin – %d bytes in %d chunks",
+                      key, size, meta["chunks"])
+        return st
+
+    def chunk(self, key: str, n: int, reader) -> None:
+        """Write chunk *n*; *reader* yields its decoded bytes."""
+        deadline = time.time() + BEGIN_WAIT
+        with self._cond:
+            # a chunk can overtake its begin on another worker thread
+            while (st := self._load(key)) is None:
+                left = deadline - time.time()
+                if left <= 0:
+                    raise TransferError(f"chunk {n} for unknown transfer")
+                self._cond.wait(left)
+
+        meta = st["meta"]
+        if n >= meta["chunks"]:
+            raise TransferError(f"chunk {n} out of range (0…{meta['chunks'] - 1})")
+
+        offset = n * meta["chunk_size"]
+        limit  = min(meta["chunk_size"], meta["size"] - offset)
+        with st["lock"]:
+            fd = os.open(self._path(key, "part"), os.O_WRONLY)
+            try:
+                written = 0
+                while True:
+                    data = reader.read()
+                    if not data:
+                        break
+                    if written + len(data) > limit:
+                        raise TransferError(f"chunk {n} longer than {limit} bytes")
+                    os.pwrite(fd, data, offset + written)
+                    written += len(data)
+            finally:
+                os.close(fd)
+            if written != limit:
+                raise TransferError(f"chunk {n} has {written} bytes, expected {limit}")
+
+            if n not in st["got"]:
+                st["got"].add(n)
+                with open(self._path(key, "idx"), "a") as fh:
+                    fh.write(f"{n}\n")
+            st["seen"] = time.time()
+
+        with self._cond:
+            self._cond.notify_all()             # an *end* may be waiting
+
+    def end(self, key: str, info: dict):
+        """
+        Return ``(part_path, meta, [])`` when complete and verified, else
+        ``(None, meta, missing)``.  Raises TransferError on a bad checksum.
+        """
+        deadline = time.time() + BEGIN_WAIT
+        with self._cond:
+            st = self._load(key)
+            if st is None:
+                raise TransferError("end for unknown transfer")
+            # chunks still in flight on other workers
+            while self.missing(st) and time.time() < deadline:
+                self._cond.wait(deadline - time.time())
+
+        with st["lock"]:
+            st["seen"] = time.time()
+            missing = self.missing(st)
+            if missing:
+                return None, st["meta"], missing
+
+            meta = dict(st["meta"], **{k: v for k, v in info.items() if v})
+            for algo in ("sha256", "md5"):
+                if meta.get(algo):
+                    digest = self._digest(self._path(key, "part"), algo)
+                    if digest != str(meta[algo]).lower():
+                        self.discard(key)
+                        raise TransferError(f"{algo} mismatch")
+                    break
+        return self._path(key, "part"), meta, []
+
+    @staticmethod
+    def _digest(path: str, algo: str) -> str:
+        h = hashlib.new(algo)
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    # ------------------------------------------------------------------
+    # cleanup
+    # ------------------------------------------------------------------
+    def discard(self, key: str) -> None:
+        with self._cond:
+            self._discard(key)
+
+    def _discard(self, key: str) -> None:
+        self._open.pop(key, None)
+        for ext in ("part", "json", "idx"):
+            try:
+                os.remove(self._path(key, ext))
+            except FileNotFoundError:
+                pass
+
+    def expire(self) -> list:
+        """Drop transfers idle for longer than `CHUNK_TTL`; return their keys."""
+        cutoff = time.time() - CHUNK_TTL
+        dropped = []
+        with self._cond:
+            for name in os.listdir(self.dir):
+                if not name.endswith(".json"):
+                    continue
+                key = name[:-5]
+                st = self._open.get(key)
+                if st:
+                    seen = st["seen"]
+                else:
+                    seen = max(os.path.getmtime(self._path(key, e))
+                               for e in ("json", "idx") if os.path.exists(self._path(key, e)))
+                if seen < cutoff:
+                    self._discard(key)
+                    dropped.append(key)
+        return dropped
@@ -0,0 +1,154 @@
+"""
+Content-addressed layout for local storage devices (``"dedup": true``).
+
+Every stored file is a hard link to a blob named after its SHA-256:
+
+    <base>/.blobs/ab/abcdef…        one inode per distinct content
+    <base>/images/…/snap.jpg        hard link → same inode
+
+The link count is the reference count: deleting a user-visible file
+(elFinder, storage browser, retention) just drops a link, and `gc()`
+removes blobs nobody links to any more.  A byte-identical snapshot costs
+a directory entry instead of a second copy; payloads up to
+`STORAGE_DEDUP_MEM` bytes are hashed in memory first, so a duplicate
+never touches the disk's data blocks at all.
+
+Files in the tree must never be rewritten in place (that would change
+every link) – writers replace them with a new directory entry instead.
+"""
+
+import io
+import os
+import hashlib
+import tempfile
+
+DEDUP_MEM = int(os.getenv("STORAGE_DEDUP_MEM", 8 * 1024 * 1024))   # bytes
+BLOB_DIR  = ".blobs"
+
+
+class BlobStore:
+    def __init__(self, base_path: str):
+        self.base = base_path
+        self.dir  = os.path.join(base_path, BLOB_DIR)
+
+    def _blob(self, digest: str) -> str:
+        return os.path.join(self.dir, digest[:2], digest)
+
+    # ------------------------------------------------------------------
+    # write path
+    # ------------------------------------------------------------------
+    def put(self, content, dest: str, chunk: int = 1 << 16) -> bool:
+        """
+        Store *content* (a binary file object) at *dest*.  Returns True
+        when the content already existed and only a link was added.
+        """
+        os.makedirs(self.dir, exist_ok=True)
+        h = hashlib.sha256()
+
+        # small payloads: hash in memory, write only if new
+        buf, size = [], 0
+        while size <= DEDUP_MEM:
+            data = content.read(chunk)
+            if not data:
+                break
+            h.update(data)
+            buf.append(data)
+            size += len(data)
+        else:
+            return self._put_large(h, buf, content, dest, chunk)
+
+        blob = self._blob(h.hexdigest())
+        dup  = os.path.exists(blob)
+        if not dup:
+            self._write_blob(blob, io.BytesIO(b"".join(buf)), chunk)
+        self._link(blob, dest)
+        return dup
+
+    def _put_large(self, h, head: list, content, dest: str, chunk: int) -> bool:
+        fd, tmp = tempfile.mkstemp(dir=self.dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for data in head:
+                    fh.write(data)
+                while True:
+                    data = content.read(chunk)
+                    if not data:
+                        break
+                    h.update(data)
+                    fh.write(data)
+            blob = self._blob(h.hexdigest())
+            dup  = os.path.exists(blob)
+            if not dup:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(tmp, blob)
+            self._link(blob, dest)
+            return dup
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _write_blob(self, blob: str, src, chunk: int) -> None:
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(blob), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                while True:
+                    data = src.read(chunk)
+                    if not data:
+                        break
+                    fh.write(data)
+            os.replace(tmp, blob)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @staticmethod
+    def _link(blob: str, dest: str) -> None:
+        # link under a side name, then swap it in atomically
+        side = dest + ".link"
+        if os.path.lexists(side):
+            os.remove(side)
+        os.link(blob, side)
+        os.replace(side, dest)
+
+    # ------------------------------------------------------------------
+    # maintenance / reporting
+    # ------------------------------------------------------------------
+    def _scan(self):
+        if not os.path.isdir(self.dir):
+            return
+        for sub in os.scandir(self.dir):
+            if not sub.is_dir(follow_symlinks=False):
+                continue
+            for ent in os.scandir(sub.path):
+                if ent.name.endswith(".tmp"):
+                    continue
+                yield ent, ent.stat(follow_symlinks=False)
+
+    def gc(self):
+        """Remove blobs without user-visible links; return (count, bytes)."""
+        count = freed = 0
+        for ent, st in self._scan():
+            if st.st_nlink <= 1:
+                os.remove(ent.path)
+                count += 1
+                freed += st.st_size
+        return count, freed
+
+    def stats(self) -> dict:
+        blobs = links = physical = logical = 0
+        for _, st in self._scan():
+            refs = max(st.st_nlink - 1, 0)
+            blobs    += 1
+            links    += refs
+            physical += st.st_size
+            logical  += st.st_size * refs
+        return {
+            "blobs":          blobs,
+            "files":          links,
+            "physical_bytes": physical,
+            "logical_bytes":  logical,
+            "saved_bytes":    max(logical - physical, 0),
+            "dedup_ratio":    round(logical / physical, 3) if physical else 1.0,
+        }
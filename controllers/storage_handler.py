@@ -1,23 +1,60 @@
 import os
-import io
+import re
 import json
 import time
 import base64
 import ftplib
+import hashlib
+import shutil
+import tempfile
 import threading
 from datetime import datetime
-
-try:
-    import paramiko          # SFTP support
-except ImportError:
-    paramiko = None
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from flask import current_app as app
 from extensions import db
 from models.device import Device
+from controllers.storage import get_storage_devices
+from storage_pool import get_pool, paramiko
 
 from controllers.queues        import STORAGE_Q
-from controllers.queue_consumer import QueueConsumerMixin   # new helper
+from controllers.queue_consumer import QueueConsumerMixin, Bulkhead
+from controllers.storage_chunks import ChunkAssembler, CHUNK_TOPIC, CHUNK_DIR
+from controllers.storage_spool import UploadSpool
+from controllers.storage_dedup import BlobStore
+from controllers.storage_retention import RetentionManager
+from controllers.storage_tiering import TierMigrator
+from controllers.storage_catalog import StorageCatalog
+from controllers.storage_watch import StorageWatcher
+
+
+# decoded bytes per read – the base64 text is consumed in 4/3 of that
+B64_CHUNK = int(os.getenv("STORAGE_B64_CHUNK", 64 * 1024))
+
+# remote targets go through the local spool unless the device sets "spool": false
+SPOOL_DEFAULT = os.getenv("STORAGE_SPOOL", "1").lower() in ("1", "true", "yes")
+
+# parallel writes to a device and its "replicas"
+REPLICA_WORKERS = int(os.getenv("STORAGE_REPLICA_WORKERS", 8))
+# … at most this many of them per target device, a slot waited for this long
+REPLICA_PER_TARGET = int(os.getenv("STORAGE_REPLICA_PER_TARGET", 2))
+REPLICA_WAIT       = float(os.getenv("STORAGE_REPLICA_WAIT", 10))   # sec
+
+# one bulkhead per storage device so a hung host cannot starve the others
+DEVICE_WORKERS  = int(os.getenv("STORAGE_DEVICE_WORKERS", 2))
+DEVICE_QUEUE    = int(os.getenv("STORAGE_DEVICE_QUEUE",   200))
+QUEUE_TIMEOUT   = float(os.getenv("STORAGE_QUEUE_TIMEOUT", 300))   # sec, 0 = off
+
+# heartbeat: interval (0 = off), "storage" or "all" devices, one message
+# per device ("device") or a single summary on HEARTBEAT_TOPIC ("aggregate")
+HEARTBEAT_INTERVAL = float(os.getenv("STORAGE_HEARTBEAT_INTERVAL", 5))
+HEARTBEAT_SCOPE    = os.getenv("STORAGE_HEARTBEAT_SCOPE", "storage").lower()
+HEARTBEAT_MODE     = os.getenv("STORAGE_HEARTBEAT_MODE", "device").lower()
+HEARTBEAT_TOPIC    = os.getenv("STORAGE_HEARTBEAT_TOPIC", "factorylens/heartbeat")
+DEVICE_REFRESH     = float(os.getenv("STORAGE_DEVICE_REFRESH", 300))  # sec
+
+# unreferenced blobs of "dedup" devices are collected this often
+DEDUP_GC_SEC = float(os.getenv("STORAGE_DEDUP_GC_SEC", 3600))
 
 
 # ───────────────────────────── Helpers ────────────────────────────────
@@ -37,15 +74,165 @@ def payload_preview(data, max_len: int = 100):
     return data
 
 
-class _FTP(ftplib.FTP):
-    """ftplib that logs via Flask logger instead of print()."""
-    def __init__(self, logger, *a, **kw):
-        self._logger = logger
-        super().__init__(*a, **kw)
+_FILE_KEY = re.compile(r'(?<!\\)"file"\s*:\s*"')
+
+
+def split_file_field(raw: str):
+    """
+    Return ``(meta, src, start, end)`` for a “…/file/…/create” payload
+    where ``src[start:end]`` is the base64 text of the ``file`` field and
+    *meta* is the rest of the payload.  Only the small metadata part is
+    JSON-parsed; the file itself is never copied.
+    """
+    m = _FILE_KEY.search(raw)
+    if m:
+        start = m.end()
+        end   = raw.find('"', start)        # base64 never contains a quote
+        if end != -1:
+            meta = json.loads(raw[:start] + raw[end:])
+            return meta, raw, start, end
+
+    # unusual layout – fall back to a full parse
+    meta = json.loads(raw)
+    b64  = meta.get("file") or ""
+    return meta, b64, 0, len(b64)
+
+
+class _B64Reader:
+    """
+    Read-only file object that base64-decodes ``src[start:end]`` lazily,
+    `B64_CHUNK` bytes at a time.  Works with ``shutil.copyfileobj``,
+    ``ftplib.storbinary`` and paramiko ``putfo``.  JSON escapes that may
+    appear inside base64 (``\\/`` and MIME line breaks) are removed.
+    """
 
-    # python 3.12 removed the internal prints; we still override for safety
-    def _print_debug(self, *msgs):
-        self._logger.debug("[FTP dbg] %s", " ".join(str(m) for m in msgs))
+    def __init__(self, src: str, start: int = 0, end: int = None):
+        self._src   = src
+        self._start = start
+        self._pos   = start
+        self._end   = len(src) if end is None else end
+        self._carry = ""
+        self.total  = 0                      # decoded bytes handed out
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size <= 0:
+            size = B64_CHUNK
+        want = (size + 2) // 3 * 4
+
+        while len(self._carry) < want and self._pos < self._end:
+            stop = min(self._pos + want, self._end)
+            if self._src[stop - 1] == "\\" and stop < self._end:
+                stop += 1                    # keep an escape pair together
+            text = self._src[self._pos:stop]
+            self._pos = stop
+            if "\\" in text:
+                text = (text.replace("\\/", "/")
+                            .replace("\\n", "").replace("\\r", ""))
+            self._carry += text
+
+        n = len(self._carry) if self._pos >= self._end else len(self._carry) // 4 * 4
+        chunk, self._carry = self._carry[:n], self._carry[n:]
+        out = base64.b64decode(chunk) if chunk else b""
+        self.total += len(out)
+        return out
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        """Only rewinding is supported (retry on a fresh connection)."""
+        if offset or whence:
+            raise OSError("_B64Reader can only rewind")
+        self._pos, self._carry, self.total = self._start, "", 0
+        return 0
+
+
+class _Hashing:
+    """Pass-through reader that SHA-256s what it hands out (for the catalogue)."""
+
+    def __init__(self, src):
+        self._src  = src
+        self._hash = hashlib.sha256()
+        self.total = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._src.read(size)
+        self._hash.update(data)
+        self.total += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        """Only rewinding is supported (retry on a fresh connection)."""
+        if offset or whence:
+            raise OSError("_Hashing can only rewind")
+        self._hash, self.total = hashlib.sha256(), 0
+        return self._src.seek(0)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def local_base(params: dict) -> str:
+    """Absolute root of a local storage device (always under /app/storage)."""
+    raw_base = (params or {}).get("base_path", "tmp").lstrip("/")
+    return os.path.normpath(os.path.join("/app/storage", raw_base))
+
+
+def _dir_prefixes(path: str) -> list:
+    """'a/b/c' → ['a', 'a/b', 'a/b/c'] (a leading '/' is kept)."""
+    lead  = "/" if path.startswith("/") else ""
+    parts = [p for p in path.split("/") if p]
+    return [lead + "/".join(parts[:i + 1]) for i in range(len(parts))]
+
+
+class ReplicationError(RuntimeError):
+    """Every target failed; the per-target result is already published."""
+    published = True
+
+
+class _DirCache:
+    """
+    Remote directories known to exist, per storage device and per pooled
+    session, so uploads into an existing folder skip MKD / CWD / mkdir.
+    Entries are dropped when an upload into them fails.
+    """
+    MAX_PER_DEVICE = 1_000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dev: dict = {}                     # device id → {path}
+
+    def known(self, sess, dev_id, path: str) -> bool:
+        if not path:
+            return True                          # login / root dir
+        mine = sess.meta.setdefault("dirs", set())
+        if path in mine:
+            return True
+        with self._lock:
+            hit = path in self._dev.get(dev_id, ())
+        if hit:
+            mine.add(path)
+        return hit
+
+    def add(self, sess, dev_id, path: str) -> None:
+        sess.meta.setdefault("dirs", set()).add(path)
+        with self._lock:
+            known = self._dev.setdefault(dev_id, set())
+            if len(known) >= self.MAX_PER_DEVICE:
+                known.clear()
+            known.add(path)
+
+    def invalidate(self, sess, dev_id, path: str) -> None:
+        def keep(p):
+            return p != path and not p.startswith(path + "/")
+        mine = sess.meta.get("dirs", set())
+        mine.intersection_update({p for p in mine if keep(p)})
+        with self._lock:
+            known = self._dev.get(dev_id, set())
+            known.intersection_update({p for p in known if keep(p)})
+
+
+# errors after which an upload is retried once on a new session
+_RECONNECT_ERRORS = (EOFError, ConnectionError, ftplib.error_temp) + (
+    (paramiko.SSHException,) if paramiko else ()
+)
 
 
 # ────────────────────────── StorageManager ────────────────────────────
@@ -66,28 +253,108 @@ class StorageManager(QueueConsumerMixin):
         self.client    = mqtt_client
         self.flask_app = getattr(mqtt_client, "_userdata", None)
 
+        # keep-alive FTP / SFTP sessions (shared with the elFinder drivers)
+        get_pool(self.flask_app.logger)
+
+        self._dirs = _DirCache()
+
+        # per-device worker pools (see _executor_for)
+        self._bulkheads: dict = {}
+        self._bulkheads_lock = threading.Lock()
+
+        # fan-out to replica targets
+        self._replicas = ThreadPoolExecutor(max_workers=REPLICA_WORKERS,
+                                            thread_name_prefix="StorageReplica")
+        self._replica_slots: dict = {}           # dev id → BoundedSemaphore
+        self._replica_slots_lock = threading.Lock()
+
+        # durable local spool drained to FTP / SFTP in the background
+        self.spool = UploadSpool(self.flask_app.logger, self._upload_spooled)
+
+        # chunked transfers (file/<id>/begin|chunk/<n>|end)
+        self.chunks = ChunkAssembler(self.flask_app.logger)
+        self._drop_replica_scratch()
+
+        # retention / quota sweeper (fed by every stored file, see _store_on)
+        self.retention = RetentionManager(self.flask_app, self._retention_devices, local_base)
+
+        # hot (local) → cold (FTP / SFTP) migration, driven by the same index
+        self.tiering = TierMigrator(self.flask_app, self.retention, self._put_remote,
+                                    self._retention_devices, local_base)
+
+        # searchable metadata of every stored file (see storage_catalog)
+        self.catalog = StorageCatalog(self.flask_app, self._retention_devices,
+                                      self.retention.backend)
+        self.retention.on_removed = self._on_retention_removed
+
+        # changes made to local roots from outside (inotify / polling)
+        self._watch_topics: dict = {}            # dev id → "<prefix>/<client>"
+        self.watcher = StorageWatcher(self.flask_app, self._watch_devices)
+        self.watcher.subscribe(self._on_fs_event)
+
         # start the queue consumer
         self._start_consumer()
 
-        # background heartbeat loop
+        # background heartbeat loop (device list cached, see invalidate_devices)
+        self._hb_targets: list = []              # [(device id, log topic)]
+        self._hb_loaded = 0.0
+        self._hb_stale  = True
         threading.Thread(
             target=self._poll_loop,
             name="StorageManager-Heartbeat",
             daemon=True
         ).start()
 
+        # abandoned chunked transfers
+        threading.Thread(
+            target=self._janitor_loop,
+            name="StorageManager-Janitor",
+            daemon=True
+        ).start()
+
     # ------------------------------------------------------------------
     # QueueConsumerMixin requirements
     # ------------------------------------------------------------------
     def _is_relevant(self, topic: str) -> bool:
         """
         Cheap test before we dequeue: message must contain '/file/' and
-        end with '/create'.
+        end with '/create' or be part of a chunked transfer.
         """
-        return topic.endswith("/create") and "/file/" in topic
+        if "/file/" not in topic:
+            return False
+        return topic.endswith("/create") or CHUNK_TOPIC.match(topic) is not None
+
+    def _executor_for(self, device_id, topic):
+        """Each storage device gets its own Bulkhead."""
+        with self._bulkheads_lock:
+            bh = self._bulkheads.get(device_id)
+            if bh is None:
+                bh = self._bulkheads[device_id] = Bulkhead(
+                    f"dev{device_id}", DEVICE_WORKERS, DEVICE_QUEUE, QUEUE_TIMEOUT,
+                    on_expire=lambda d, t, p: self._rejected(d, t, p, "timed out in queue"),
+                )
+        return bh
+
+    def _rejected(self, device_id, topic, payload, reason):
+        """Tell the sender instead of dropping its file silently."""
+        super()._rejected(device_id, topic, payload, reason)
+        m = CHUNK_TOPIC.match(topic)
+        if m and m["op"].startswith("chunk"):
+            return                          # reported as missing at *end*
+        prefix, client_id, _ = topic.split("/", 2)
+        self.client.publish(f"{prefix}/{client_id}/file/created", json.dumps("error"))
+
+    def worker_metrics(self) -> dict:
+        with self._bulkheads_lock:
+            heads = dict(self._bulkheads)
+        return {dev_id: bh.metrics() for dev_id, bh in heads.items()}
 
     def _process(self, _dev_id: int, topic: str, payload: str):
         """Parse the JSON payload exactly like the old on_create()."""
+        m = CHUNK_TOPIC.match(topic)
+        if m:
+            self._handle_chunked(m, payload)
+            return
         # split once: <prefix>/<client_id>/file/.../create
         prefix, client_id, _ = topic.split("/", 2)
         self._handle_create(prefix, client_id, topic, payload)
@@ -98,173 +365,578 @@ class StorageManager(QueueConsumerMixin):
     def _handle_create(self, prefix: str, client_id: str,
                        full_topic: str, raw_payload: str):
         try:
-            data = json.loads(raw_payload)
+            # only the metadata is parsed; the file is decoded while writing
+            data, src, start, end = split_file_field(raw_payload)
+            data["file"] = f"[{end - start} chars]"
             self.flask_app.logger.info(
                 "💾 MQTT← %s → %s", full_topic, payload_preview(data)
             )
 
-            file_b64 = data.get("file")
-            ext      = data.get("ext", "bin").lower().strip(".")
-            name     = data.get(
-                "name", f"file_{datetime.now():%Y-%m-%d_%H-%M-%S}"
-            )
-            if not file_b64:
+            if end <= start:
                 raise ValueError("missing base64 file payload")
 
-            folder = (
-                "images" if ext in {"jpg", "jpeg", "png", "gif", "bmp", "webp"}
-                else "pdfs" if ext == "pdf" else "others"
+            self._deliver(prefix, client_id, data, _B64Reader(src, start, end))
+
+        except Exception as exc:
+            self.flask_app.logger.error("💾 file/create failed: %s", exc)
+            if not getattr(exc, "published", False):
+                self.client.publish(
+                    f"{prefix}/{client_id}/file/created", json.dumps("error")
+                )
+
+    def _deliver(self, prefix: str, client_id: str, data: dict, content):
+        """Store *content* (a binary file object) as described by *data*."""
+        ext      = data.get("ext", "bin").lower().strip(".")
+        name     = data.get(
+            "name", f"file_{datetime.now():%Y-%m-%d_%H-%M-%S}"
+        )
+
+        folder = (
+            "images" if ext in {"jpg", "jpeg", "png", "gif", "bmp", "webp"}
+            else "pdfs" if ext == "pdf" else "others"
+        )
+        relpath = (
+            os.path.join(folder, data.get("path", ""))
+            if data.get("path") else folder
+        )
+
+        # —— look up Device (+ replicas) to decide storage backends ————
+        with self.flask_app.app_context():
+            dev = Device.query.filter_by(mqtt_client_id=client_id).first()
+            if not dev:
+                raise RuntimeError(f"no Device row for client_id={client_id}")
+            targets = [self._target(dev)] + self._replica_targets(dev)
+            self.flask_app.logger.info(
+                "Device Model: %s | Params: %s", targets[0]["model"], targets[0]["params"]
+            )
+
+        meta = {"source": data.get("source") or data.get("camera"),
+                "action": data.get("action")}
+        content = _Hashing(content)
+        if len(targets) == 1:
+            rel_for_payload = self._store_on(
+                targets[0], prefix, client_id, relpath, name, ext, content, meta
             )
-            relpath = (
-                os.path.join(folder, data.get("path", ""))
-                if data.get("path") else folder
+            stored = [(targets[0]["id"], rel_for_payload)]
+            # publish success / log
+            self._publish_success(prefix, client_id, rel_for_payload)
+        else:
+            stored = self._deliver_replicated(
+                targets, prefix, client_id, relpath, name, ext, content, meta
             )
-            content = base64.b64decode(file_b64)
 
-            # —— look up Device to decide storage backend ————————
-            with self.flask_app.app_context():
-                dev = Device.query.filter_by(mqtt_client_id=client_id).first()
-                if not dev:
-                    raise RuntimeError(f"no Device row for client_id={client_id}")
+        # spooled files are catalogued once the spool has uploaded them
+        spooled = {t["id"] for t in targets if self._spools(t)}
+        for dev_id, rel in stored:
+            if dev_id not in spooled:
+                self.catalog.add(dev_id, rel, content.total, sha256=content.hexdigest(), **meta)
 
-                model  = (dev.model.name or "").lower()
-                params = dev.parameters
-                self.flask_app.logger.info(
-                    "Device Model: %s | Params: %s", model, params
-                )
+    # ------------------------------------------------------------------
+    # targets / replication
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _target(dev) -> dict:
+        return {
+            "id":     dev.id,
+            "name":   dev.name,
+            "model":  (dev.model.name or "").lower(),
+            "params": dev.parameters or {},
+        }
+
+    def _replica_targets(self, dev) -> list:
+        """Enabled storage devices listed in ``parameters["replicas"]``."""
+        ids = [int(i) for i in (dev.parameters or {}).get("replicas") or []
+               if str(i).isdigit() and int(i) != dev.id]
+        if not ids:
+            return []
+        found = {d.id: d for d in Device.query.filter(Device.id.in_(ids)).all()}
+        out = []
+        for i in ids:
+            d = found.get(i)
+            if d is None or not d.enabled:
+                self.flask_app.logger.warning("💾 replica #%s of %s unavailable", i, dev.name)
+                continue
+            out.append(self._target(d))
+        return out
+
+    @staticmethod
+    def _spools(target) -> bool:
+        return (target["model"] == "ftp / sftp storage"
+                and bool(target["params"].get("spool", SPOOL_DEFAULT)))
+
+    def _store_on(self, target, prefix, client_id, relpath, name, ext, content,
+                  meta=None) -> str:
+        model, params = target["model"], target["params"]
+
+        if model == "local storage":
+            rel = os.path.join(relpath, f"{name}.{ext}")
+            self.catalog.claim(target["id"], rel)   # its watcher event is not news
+            self._save_local(params, relpath, name, ext, content)
+            st  = os.stat(os.path.join(local_base(params), rel))
+            self.retention.record(target["id"], rel, st.st_size, st.st_mtime)
+            return rel
+
+        if self._spools(target):
+            # indexed once the spool has actually uploaded it
+            return self._spool_remote(
+                prefix, client_id, target["id"], relpath, name, ext, content, meta
+            )
+
+        if model == "ftp / sftp storage":
+            rel = self._save_remote(
+                target["id"], params, relpath, name, ext, content
+            )
+            size = getattr(content, "total", None)
+            self.retention.record(target["id"], rel, content.tell() if size is None else size)
+            return rel
 
-                if model == "local storage":
-                    self._save_local(params, relpath, name, ext, content)
-                    rel_for_payload = os.path.join(relpath, f"{name}.{ext}")
+        raise RuntimeError(f"unsupported storage model '{model}'")
 
-                elif model == "ftp / sftp storage":
-                    rel_for_payload = self._save_remote(
-                        params, relpath, name, ext, content
+    def _deliver_replicated(self, targets, prefix, client_id, relpath, name, ext, content,
+                            meta=None):
+        """
+        Decode once into a scratch file, then write every target in
+        parallel, each from its own file handle.  Returns the
+        ``[(device id, rel path)]`` written.
+        """
+        fd, scratch = tempfile.mkstemp(dir=CHUNK_DIR, suffix=".replica")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                shutil.copyfileobj(content, fh, B64_CHUNK)
+
+            def one(target, slot):
+                try:
+                    with open(scratch, "rb") as src:
+                        return self._store_on(target, prefix, client_id, relpath, name, ext,
+                                              src, meta)
+                finally:
+                    slot.release()
+
+            futures = [(t, self._submit_replica(one, t)) for t in targets]
+            results, rel_for_payload, stored = {}, None, []
+            for t, fut in futures:
+                try:
+                    rel = fut.result()
+                    rel_for_payload = rel_for_payload or rel
+                    stored.append((t["id"], rel))
+                    results[str(t["id"])] = {"name": t["name"], "result": "success"}
+                except Exception as exc:
+                    self.flask_app.logger.error(
+                        "💾 replica %s failed: %s", t["name"], exc
                     )
+                    results[str(t["id"])] = {"name": t["name"], "result": "error",
+                                             "error": str(exc)}
+        finally:
+            os.remove(scratch)
+
+        ok = sum(r["result"] == "success" for r in results.values())
+        event = "success" if ok == len(results) else "partial" if ok else "error"
+        if not ok:
+            self.client.publish(f"{prefix}/{client_id}/file/created",
+                                json.dumps({"event": event, "targets": results}))
+            raise ReplicationError("all replica targets failed")
+        self._publish_success(prefix, client_id, rel_for_payload,
+                              {"event": event, "targets": results})
+        return stored
+
+    def _submit_replica(self, fn, target) -> Future:
+        """
+        Run *fn(target, slot)* on the shared replica pool, but only while the
+        target has a free slot – hung writes to one device must not take the
+        pool from every other device.
+        """
+        with self._replica_slots_lock:
+            slot = self._replica_slots.get(target["id"])
+            if slot is None:
+                slot = self._replica_slots[target["id"]] = threading.BoundedSemaphore(
+                    max(1, REPLICA_PER_TARGET)
+                )
+        if not slot.acquire(timeout=REPLICA_WAIT):
+            busy = Future()
+            busy.set_exception(ReplicationError(
+                f"{REPLICA_PER_TARGET} writes to this target still running"
+            ))
+            return busy
+        try:
+            return self._replicas.submit(fn, target, slot)
+        except BaseException:
+            slot.release()
+            raise
 
-                else:
-                    raise RuntimeError(f"unsupported storage model '{model}'")
+    # ------------------------------------------------------------------
+    # chunked transfers
+    # ------------------------------------------------------------------
+    def _handle_chunked(self, m, payload: str):
+        prefix, client_id, tid = m["prefix"], m["client"], m["tid"]
+        op     = m["op"]
+        key    = self.chunks.key(client_id, tid)
+        status = f"{prefix}/{client_id}/file/{tid}/status"
+        log    = self.flask_app.logger
 
-                # publish success / log
-                self._publish_success(prefix, client_id, rel_for_payload)
+        try:
+            if op == "begin":
+                st = self.chunks.begin(key, json.loads(payload))
+                reply = {"state": "ready", "chunks": st["meta"]["chunks"]}
+                if st["got"]:
+                    reply["missing"] = self.chunks.missing(st)
+                self.client.publish(status, json.dumps(reply))
+
+            elif op == "end":
+                info = json.loads(payload) if payload.strip() else {}
+                part, meta, missing = self.chunks.end(key, info or {})
+                if missing:
+                    log.warning("💾 transfer %s incomplete – %d chunks missing",
+                                key, len(missing))
+                    self.client.publish(status, json.dumps(
+                        {"state": "incomplete", "missing": missing}
+                    ))
+                    return
+                # a failed delivery keeps the part file so *end* can be retried
+                with open(part, "rb") as fh:
+                    self._deliver(prefix, client_id, meta, fh)
+                self.chunks.discard(key)
+                self.client.publish(status, json.dumps({"state": "done"}))
+
+            else:   # chunk/<n>
+                text = payload.strip()
+                if text.startswith('"'):
+                    text = text[1:-1]
+                self.chunks.chunk(key, int(m["n"]), _B64Reader(text))
 
         except Exception as exc:
-            self.flask_app.logger.error("💾 file/create failed: %s", exc)
-            self.client.publish(
-                f"{prefix}/{client_id}/file/created", json.dumps("error")
+            log.error("💾 transfer %s %s failed: %s", key, op, exc)
+            self.client.publish(status, json.dumps({"state": "error", "error": str(exc)}))
+            if op == "end" and not getattr(exc, "published", False):
+                self.client.publish(
+                    f"{prefix}/{client_id}/file/created", json.dumps("error")
+                )
+
+    def _drop_replica_scratch(self):
+        """Remove ``*.replica`` files a crash left behind in CHUNK_DIR (nothing uses them yet)."""
+        for name in os.listdir(CHUNK_DIR):
+            if name.endswith(".replica"):
+                try:
+                    os.remove(os.path.join(CHUNK_DIR, name))
+                    self.flask_app.logger.warning("💾 stale replica scratch %s removed", name)
+                except OSError:
+                    pass
+
+    def _janitor_loop(self):
+        last_gc = time.time()
+        while True:
+            time.sleep(60)
+            try:
+                for key in self.chunks.expire():
+                    self.flask_app.logger.warning("💾 abandoned transfer %s removed", key)
+            except Exception:
+                self.flask_app.logger.exception("💾 transfer cleanup failed")
+
+            if time.time() - last_gc >= DEDUP_GC_SEC:
+                last_gc = time.time()
+                try:
+                    self._dedup_gc()
+                except Exception:
+                    self.flask_app.logger.exception("💾 blob gc failed")
+
+    def _dedup_gc(self):
+        with self.flask_app.app_context():
+            bases = [
+                local_base(d.parameters) for d in get_storage_devices()
+                if (d.parameters or {}).get("dedup")
+                and (d.model.name or "").lower() == "local storage"
+            ]
+        for base in bases:
+            count, freed = BlobStore(base).gc()
+            if count:
+                self.flask_app.logger.info(
+                    "💾 blob gc %s: %d unreferenced blobs, %d bytes freed", base, count, freed
+                )
+
+    @staticmethod
+    def _retention_devices() -> list:
+        return [
+            (d.id, (d.model.name or "").lower(), d.parameters or {})
+            for d in get_storage_devices() if d.enabled
+        ]
+
+    def _on_retention_removed(self, dev_id, rels):
+        """A retention sweep deleted *rels* – also files tiered onto this device."""
+        self.catalog.remove(dev_id, rels)
+        for hot_id, hot_rels in self.tiering.expired(dev_id, rels).items():
+            self.flask_app.logger.info(
+                "🧊 %d tiered files of dev%s expired on dev%s", len(hot_rels), hot_id, dev_id
             )
+            self.catalog.remove(hot_id, hot_rels)
+
+    # ------------------------------------------------------------------
+    # file system events (see storage_watch)
+    # ------------------------------------------------------------------
+    def _watch_devices(self) -> list:
+        rows = [d for d in get_storage_devices()
+                if d.enabled and (d.model.name or "").lower() == "local storage"]
+        self._watch_topics = {
+            d.id: f"{d.topic_prefix}/{d.mqtt_client_id}"
+            for d in rows if d.topic_prefix and d.mqtt_client_id
+        }
+        return [(d.id, local_base(d.parameters or {}), d.parameters or {}) for d in rows]
+
+    def _on_fs_event(self, ev):
+        """
+        Keep the retention index and the catalogue in step; announce files
+        that came from outside (ours were published by _publish_success).
+        """
+        if ev.kind in ("created", "modified"):
+            self.retention.record(ev.dev_id, ev.rel, ev.size, ev.mtime)
+            outside = self.catalog.touch(ev.dev_id, ev.rel, ev.size, ev.mtime)
+            base = self._watch_topics.get(ev.dev_id)
+            if ev.kind == "created" and outside and base:
+                self.client.publish(f"{base}/file/new", json.dumps({
+                    "path":      ev.rel.replace("\\", "/"),
+                    "size":      ev.size,
+                    "mtime":     datetime.utcfromtimestamp(ev.mtime).isoformat(),
+                    "device_id": ev.dev_id,
+                }))
+        elif ev.kind == "deleted":
+            self.retention.discard(ev.dev_id, [ev.rel])
+            if not self.tiering.was_moved(ev.dev_id, ev.rel):
+                self.catalog.remove(ev.dev_id, [ev.rel])
+        elif ev.kind == "dir_deleted":
+            self.retention.discard_dir(ev.dev_id, ev.rel)
+            self.catalog.remove_dir(ev.dev_id, ev.rel)
+        elif ev.kind == "overflow":
+            # events were lost – rebuild both from the tree
+            self.retention.forget(ev.dev_id)
+            threading.Thread(target=self._reindex, args=(ev.dev_id,),
+                             name="StorageCatalog-Resync", daemon=True).start()
+
+    def _reindex(self, dev_id):
+        try:
+            with self.flask_app.app_context():
+                dev = Device.query.get(dev_id)
+                if dev is None:
+                    return
+                target = self._target(dev)
+            self.catalog.reindex(dev_id, target["model"], target["params"])
+        except Exception:
+            self.flask_app.logger.exception("🗂️ resync of dev%s failed", dev_id)
 
     # ------------------------------------------------------------------
     # local disk
     # ------------------------------------------------------------------
     def _save_local(self, params, relpath, name, ext, content):
-        raw_base  = params.get("base_path", "tmp").lstrip("/")
-        base_path = os.path.normpath(os.path.join("/app/storage", raw_base))
+        base_path = local_base(params)
         full_dir  = os.path.join(base_path, relpath)
         os.makedirs(full_dir, exist_ok=True)
 
         file_path = os.path.join(full_dir, f"{name}.{ext}")
-        with open(file_path, "wb") as fh:
-            fh.write(content)
-        self.flask_app.logger.info("💾 local save → %s", file_path)
+        if params.get("dedup"):
+            dup = BlobStore(base_path).put(content, file_path, B64_CHUNK)
+            self.flask_app.logger.info(
+                "💾 local save → %s (%s)", file_path, "duplicate, linked" if dup else "new blob"
+            )
+            return
+
+        # decode into a side file so a corrupt payload never leaves a torso
+        part_path = file_path + ".part"
+        try:
+            with open(part_path, "wb") as fh:
+                shutil.copyfileobj(content, fh, B64_CHUNK)
+            os.replace(part_path, file_path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        self.flask_app.logger.info(
+            "💾 local save → %s (%d bytes)", file_path, os.path.getsize(file_path)
+        )
 
     # ------------------------------------------------------------------
     # remote dispatcher
     # ------------------------------------------------------------------
-    def _save_remote(self, params, relpath, name, ext, content):
+    def _save_remote(self, dev_id, params, relpath, name, ext, content):
+        remote_rel = os.path.join(relpath, f"{name}.{ext}").replace("\\", "/")
+        return self._put_remote(dev_id, params, remote_rel, content)
+
+    def _put_remote(self, dev_id, params, remote_rel, content):
         proto   = params.get("protocol", "ftp").lower()
-        host    = params["host"]
-        port    = params.get("port", 21 if proto == "ftp" else 22)
-        user    = params.get("username")
-        pw      = params.get("password")
         root    = params.get("root_path", "/").rstrip("/")
-        passive = params.get("passive_mode", True)
 
-        remote_rel  = os.path.join(relpath, f"{name}.{ext}").replace("\\", "/")
         remote_full = remote_rel  # no double-root
 
         if proto == "ftp":
-            return self._ftp_store(
-                host, port, user, pw, passive, params.get("ssl", False),
-                root, remote_rel, remote_full, content
-            )
-        if proto == "sftp":
-            return self._sftp_store(
-                host, port, user, pw, root, remote_rel, remote_full, content
-            )
-        raise RuntimeError(f"unknown protocol '{proto}'")
+            lease, store = get_pool().lease_ftp, self._ftp_store
+        elif proto == "sftp":
+            if not paramiko:
+                raise RuntimeError("paramiko missing → install for SFTP")
+            lease, store = get_pool().lease_sftp, self._sftp_store
+        else:
+            raise RuntimeError(f"unknown protocol '{proto}'")
+
+        # pooled keep-alive session; a connection the server dropped
+        # mid-upload is replaced once and the file re-sent
+        for attempt in (1, 2):
+            try:
+                with lease(dev_id, params) as sess:
+                    return store(sess, dev_id, root, remote_rel, remote_full, content)
+            except _RECONNECT_ERRORS as exc:
+                if attempt == 2:
+                    raise
+                self.flask_app.logger.warning(
+                    "💾 %s session lost (%s) – retrying on a new one", proto, exc
+                )
+                content.seek(0)
+
+    # ------------------------------------------------------------------ spool
+    def _spool_remote(self, prefix, client_id, dev_id, relpath, name, ext, content,
+                      meta=None):
+        """Write locally (fsynced) and let the spool upload it later."""
+        remote_rel = os.path.join(relpath, f"{name}.{ext}").replace("\\", "/")
+        job = self.spool.enqueue(dev_id, {
+            "prefix":     prefix,
+            "client_id":  client_id,
+            "relpath":    relpath,
+            "name":       name,
+            "ext":        ext,
+            "remote_rel": remote_rel,
+            **(meta or {}),                      # source / action for the catalogue
+        }, content)
+        self.flask_app.logger.info(
+            "💾 spooled %s (%d bytes) as job %s", remote_rel, job["size"], job["id"]
+        )
+        return remote_rel
+
+    def _upload_spooled(self, job, fh):
+        """One upload attempt for the spool; raises to trigger a retry."""
+        t = job["target"]
+        with self.flask_app.app_context():
+            dev = Device.query.get(job["dev_id"])
+            if dev is None:
+                self.flask_app.logger.warning(
+                    "💾 storage device #%s gone – dropping %s", job["dev_id"], t["remote_rel"]
+                )
+                return
+            params = dev.parameters or {}
+        self._save_remote(dev.id, params, t["relpath"], t["name"], t["ext"], fh)
+        self.retention.record(dev.id, t["remote_rel"], job["size"])
+        self.catalog.add(dev.id, t["remote_rel"], job["size"], sha256=job.get("sha256"),
+                         source=t.get("source"), action=t.get("action"))
+        self.client.publish(f"{t['prefix']}/{t['client_id']}/log",
+                            json.dumps({
+                                "event":     "file_uploaded",
+                                "path":      t["remote_rel"],
+                                "attempts":  job["attempts"] + 1,
+                                "timestamp": datetime.utcnow().isoformat()
+                            }))
 
     # ------------------------------------------------------------------ FTP
-    def _ftp_store(self, host, port, user, pw, passive,
-                   use_ssl, root_path, remote_rel, remote_full, content):
-        log = self.flask_app.logger
-        ftp = _FTP(log)
-        ftp.set_debuglevel(2)
-        log.debug("[FTP] connect %s:%s ssl=%s user=%s", host, port, use_ssl, user)
-        ftp.connect(host, port, timeout=30)
-        ftp.login(user, pw)
-        ftp.set_pasv(passive)
-        log.debug("[FTP] Logged in. PWD=%s", ftp.pwd())
-
-        if root_path and root_path != "/":
+    def _ftp_store(self, sess, dev_id, root_path, remote_rel, remote_full, content):
+        log   = self.flask_app.logger
+        ftp   = sess.ftp
+        base  = root_path if root_path and root_path != "/" else ""
+        rdir  = "/".join(p for p in (base, os.path.dirname(remote_rel)) if p)
+        fname = os.path.basename(remote_full)
+
+        # known directory → a single STOR, no MKD / CWD round trips
+        if self._dirs.known(sess, dev_id, rdir):
+            target = f"{rdir}/{fname}" if rdir else fname
+            log.debug("[FTP] STOR %s (known dir)", target)
             try:
-                ftp.cwd(root_path)
-            except ftplib.error_perm:
-                self._ftp_mkdirs(ftp, root_path.lstrip("/"))
-                ftp.cwd(root_path)
-
-        self._ftp_mkdirs(ftp, os.path.dirname(remote_rel))
+                self._ftp_put(ftp, target, content)
+                return remote_rel
+            except ftplib.error_perm as exc:
+                log.info("💾 FTP dir %s gone? (%s) – re-creating", rdir, exc)
+                self._dirs.invalidate(sess, dev_id, rdir)
+                content.seek(0)
+
+        sess.moved = True
+        self._ftp_mkdirs(sess, dev_id, rdir)
         log.debug("[FTP] STOR %s", remote_full)
-        ftp.storbinary(f"STOR {os.path.basename(remote_full)}", io.BytesIO(content))
-        ftp.quit()
+        self._ftp_put(ftp, fname, content)
         return remote_rel
 
-    def _ftp_mkdirs(self, ftp, path):
-        for part in path.strip("/").split("/"):
-            if not part:
-                continue
+    def _ftp_put(self, ftp, target, content):
+        try:
+            ftp.storbinary(f"STOR {target}", content, B64_CHUNK)
+        except (ValueError, TypeError):            # bad base64 mid-stream
+            try:
+                ftp.delete(target)
+            except ftplib.all_errors:
+                pass
+            raise
+
+    def _ftp_mkdirs(self, sess, dev_id, path):
+        """CWD into *path*, creating what is missing below the deepest known dir."""
+        ftp      = sess.ftp
+        prefixes = _dir_prefixes(path)
+        todo     = prefixes
+        for i in range(len(prefixes) - 1, -1, -1):
+            if self._dirs.known(sess, dev_id, prefixes[i]):
+                try:
+                    ftp.cwd(prefixes[i])
+                    todo = prefixes[i + 1:]
+                except ftplib.error_perm:
+                    self._dirs.invalidate(sess, dev_id, prefixes[i])
+                break
+        if todo is prefixes and path.startswith("/"):
+            ftp.cwd("/")
+
+        for prefix in todo:
+            part = prefix.rsplit("/", 1)[-1]
             try:
                 ftp.mkd(part)
             except ftplib.error_perm:
                 pass
             ftp.cwd(part)
+            self._dirs.add(sess, dev_id, prefix)
 
     # ----------------------------------------------------------------- SFTP
-    def _sftp_store(self, host, port, user, pw,
-                    root_path, remote_rel, remote_full, content):
-        if not paramiko:
-            raise RuntimeError("paramiko missing → install for SFTP")
-
-        log = self.flask_app.logger
-        transport = paramiko.Transport((host, port))
-        transport.connect(username=user, password=pw)
-        sftp = paramiko.SFTPClient.from_transport(transport)
-
+    def _sftp_store(self, sess, dev_id, root_path, remote_rel, remote_full, content):
+        sftp     = sess.sftp
         rel_root = root_path.lstrip("/")
-        self._sftp_mkdirs(sftp, rel_root)
-        sftp.chdir(rel_root)
+        rdir     = "/".join(p for p in (rel_root, os.path.dirname(remote_full)) if p)
+        target   = "/".join(p for p in (rel_root, remote_full) if p)
 
-        self._sftp_mkdirs(sftp, os.path.dirname(remote_full))
-        with sftp.open(remote_full, "wb") as fh:
-            fh.write(content)
-
-        sftp.close()
-        transport.close()
+        cached = self._dirs.known(sess, dev_id, rdir)
+        if not cached:
+            self._sftp_mkdirs(sess, dev_id, rdir)
+        try:
+            self._sftp_put(sftp, target, content)
+        except FileNotFoundError:
+            if not cached:
+                raise
+            self.flask_app.logger.info("💾 SFTP dir %s gone – re-creating", rdir)
+            self._dirs.invalidate(sess, dev_id, rdir)
+            content.seek(0)
+            self._sftp_mkdirs(sess, dev_id, rdir)
+            self._sftp_put(sftp, target, content)
         return remote_rel
 
-    def _sftp_mkdirs(self, sftp, path):
-        cwd = ""
-        for part in path.strip("/").split("/"):
-            cwd = f"{cwd}/{part}" if cwd else part
+    def _sftp_put(self, sftp, target, content):
+        try:
+            with sftp.open(target, "wb") as fh:
+                fh.set_pipelined(True)
+                shutil.copyfileobj(content, fh, B64_CHUNK)
+        except (ValueError, TypeError):            # bad base64 mid-stream
+            try:
+                sftp.remove(target)
+            except IOError:
+                pass
+            raise
+
+    def _sftp_mkdirs(self, sess, dev_id, path):
+        for prefix in _dir_prefixes(path):
+            if self._dirs.known(sess, dev_id, prefix):
+                continue
             try:
-                sftp.mkdir(cwd)
+                sess.sftp.mkdir(prefix)
             except IOError:
                 pass
+            self._dirs.add(sess, dev_id, prefix)
 
     # ------------------------------------------------------------------ success / logs
-    def _publish_success(self, prefix, client_id, rel_file):
+    def _publish_success(self, prefix, client_id, rel_file, result="success"):
         res_topic = f"{prefix}/{client_id}/file/created"
-        self.client.publish(res_topic, json.dumps("success"))
+        self.client.publish(res_topic, json.dumps(result))
         self.flask_app.logger.info("💾 Published success → %s", res_topic)
 
         self.client.publish(f"{prefix}/{client_id}/file/new",
@@ -277,20 +949,51 @@ class StorageManager(QueueConsumerMixin):
                             }))
 
     # ------------------------------------------------------------------ heartbeat loop
+    def invalidate_devices(self, dev_id=None):
+        """Called when a device is saved / deleted – reload on the next beat."""
+        self._hb_stale = True
+        self.watcher.refresh()
+        if dev_id is not None:
+            self.retention.forget(dev_id)        # root / policy may have changed
+
+    def _heartbeat_targets(self) -> list:
+        if self._hb_stale or time.time() - self._hb_loaded > DEVICE_REFRESH:
+            self._hb_stale = False
+            with self.flask_app.app_context():
+                if HEARTBEAT_SCOPE == "all":
+                    rows = Device.query.filter_by(enabled=True).all()
+                else:
+                    rows = [d for d in get_storage_devices() if d.enabled]
+                self._hb_targets = [
+                    (d.id, f"{d.topic_prefix}/{d.mqtt_client_id}/log")
+                    for d in rows if d.topic_prefix and d.mqtt_client_id
+                ]
+            self._hb_loaded = time.time()
+        return self._hb_targets
+
     def _poll_loop(self):
+        if HEARTBEAT_INTERVAL <= 0:
+            return
         while True:
-            ts = datetime.utcnow().isoformat()
-            with self.flask_app.app_context():
-                for d in Device.query.filter_by(enabled=True).all():
-                    self.client.publish(
-                        f"{d.topic_prefix}/{d.mqtt_client_id}/log",
-                        json.dumps({
+            try:
+                ts      = datetime.utcnow().isoformat()
+                targets = self._heartbeat_targets()
+                if HEARTBEAT_MODE == "aggregate":
+                    self.client.publish(HEARTBEAT_TOPIC, json.dumps({
+                        "event":     "heartbeat",
+                        "devices":   [dev_id for dev_id, _ in targets],
+                        "timestamp": ts
+                    }))
+                else:
+                    for dev_id, topic in targets:
+                        self.client.publish(topic, json.dumps({
                             "event":     "heartbeat",
-                            "device_id": d.id,
+                            "device_id": dev_id,
                             "timestamp": ts
-                        })
-                    )
-            time.sleep(5)
+                        }))
+            except Exception:
+                self.flask_app.logger.exception("💾 heartbeat failed")
+            time.sleep(HEARTBEAT_INTERVAL)
 
 
 # ───────────────────────── singleton helpers ──────────────────────────
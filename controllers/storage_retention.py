@@ -0,0 +1,461 @@
+"""
+Retention / quota policies for storage devices.
+
+A storage device may carry a policy in its parameters:
+
+    "retention": {
+        "max_age_days":         30,       # delete files older than this
+        "max_bytes":            "50G",    # keep the device below this size
+        "max_files_per_folder": 5000      # oldest files beyond this go first
+    }
+
+The sweeper does not walk the tree on every run.  Each device has an
+in-memory `FileIndex` (path → mtime / size, plus age heaps for the
+device and for every folder).  It is built by one walk the first time
+and then kept current by the StorageManager, which records each file
+it stores; a full re-walk only happens every `STORAGE_RETENTION_RESCAN`
+seconds to pick up changes made elsewhere (elFinder, shell, …).
+
+Deletions are applied in batches of at most `STORAGE_RETENTION_BATCH`
+per device and sweep; remote targets are cleaned through one pooled
+FTP / SFTP session per batch.
+"""
+
+import os
+import re
+import time
+import calendar
+import heapq
+import ftplib
+import stat as pystat
+import threading
+
+from storage_pool import get_pool
+
+RETENTION_INTERVAL = float(os.getenv("STORAGE_RETENTION_INTERVAL", 300))     # sec
+RETENTION_RESCAN   = float(os.getenv("STORAGE_RETENTION_RESCAN",   86400))   # sec
+RETENTION_BATCH    = int(os.getenv("STORAGE_RETENTION_BATCH",      500))
+
+_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_bytes(value) -> int:
+    """'50G' / '512M' / 1024 → bytes."""
+    if value in (None, ""):
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    m = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)i?B?\s*", str(value).upper())
+    if not m:
+        raise ValueError(f"bad size {value!r}")
+    return int(float(m.group(1)) * _UNITS[m.group(2)])
+
+
+def parse_policy(params: dict):
+    """Normalised policy dict, or None when the device has none."""
+    pol = (params or {}).get("retention") or {}
+    out = {
+        "max_age":   float(pol.get("max_age_days") or 0) * 86400,
+        "max_bytes": parse_bytes(pol.get("max_bytes")),
+        "max_files": int(pol.get("max_files_per_folder") or 0),
+    }
+    return out if any(out.values()) else None
+
+
+def is_hidden(name: str) -> bool:
+    return name.startswith(".") or name.endswith((".part", ".link"))
+
+
+# ───────────────────────────── file index ─────────────────────────────
+class FileIndex:
+    """Files of one device with O(log n) access to the oldest ones."""
+
+    def __init__(self):
+        self.files: dict[str, tuple] = {}        # rel path → (mtime, size)
+        self.total = 0
+        self.built_at = 0.0
+        self._heap: list[tuple] = []             # (mtime, rel) – lazily pruned
+        self._folders: dict[str, list] = {}      # folder → heap
+        self._counts: dict[str, int] = {}        # folder → files
+
+    def add(self, rel: str, mtime: float, size: int) -> None:
+        self.discard(rel)
+        self.files[rel] = (mtime, size)
+        self.total += size
+        folder = os.path.dirname(rel)
+        heapq.heappush(self._heap, (mtime, rel))
+        heapq.heappush(self._folders.setdefault(folder, []), (mtime, rel))
+        self._counts[folder] = self._counts.get(folder, 0) + 1
+        if len(self._heap) > 2 * len(self.files) + 1024:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Drop heap entries of overwritten / deleted files."""
+        self._heap = [(m, r) for r, (m, _) in self.files.items()]
+        heapq.heapify(self._heap)
+        for folder, heap in self._folders.items():
+            heap[:] = [(m, r) for m, r in heap if self.files.get(r, (None,))[0] == m]
+            heapq.heapify(heap)
+
+    def discard(self, rel: str) -> None:
+        old = self.files.pop(rel, None)
+        if old is None:
+            return
+        self.total -= old[1]
+        folder = os.path.dirname(rel)
+        self._counts[folder] -= 1
+        if not self._counts[folder]:
+            del self._counts[folder]
+            self._folders.pop(folder, None)
+
+    def _peek(self, heap: list):
+        while heap:
+            mtime, rel = heap[0]
+            cur = self.files.get(rel)
+            if cur and cur[0] == mtime:
+                return mtime, rel
+            heapq.heappop(heap)                  # stale entry
+        return None
+
+    def oldest(self):
+        return self._peek(self._heap)
+
+    def iter_oldest(self, folder: str = None):
+        """Live (mtime, rel) pairs, oldest first, without modifying the index."""
+        heap = list(self._heap if folder is None else self._folders.get(folder, []))
+        while heap:
+            mtime, rel = heapq.heappop(heap)
+            cur = self.files.get(rel)
+            if cur and cur[0] == mtime:
+                yield mtime, rel
+
+    def oldest_in(self, folder: str):
+        return self._peek(self._folders.get(folder, []))
+
+    def crowded(self, limit: int) -> list:
+        return [f for f, n in self._counts.items() if n > limit]
+
+    def usage(self, top: int = 10) -> dict:
+        oldest = self.oldest()
+        busiest = sorted(self._counts.items(), key=lambda kv: -kv[1])[:top]
+        return {
+            "files":    len(self.files),
+            "bytes":    self.total,
+            "oldest":   oldest[0] if oldest else None,
+            "folders":  len(self._counts),
+            "busiest":  [{"folder": f or "/", "files": n} for f, n in busiest],
+            "indexed":  self.built_at,
+        }
+
+
+# ───────────────────────────── backends ───────────────────────────────
+class _LocalBackend:
+    def __init__(self, base: str):
+        self.base = base
+
+    def walk(self):
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                it = os.scandir(os.path.join(self.base, rel_dir))
+            except FileNotFoundError:
+                continue
+            with it:
+                for ent in it:
+                    if is_hidden(ent.name):
+                        continue
+                    rel = os.path.join(rel_dir, ent.name)
+                    if ent.is_dir(follow_symlinks=False):
+                        stack.append(rel)
+                    elif ent.is_file(follow_symlinks=False):
+                        st = ent.stat(follow_symlinks=False)
+                        yield rel, st.st_mtime, st.st_size
+
+    def remove(self, rels: list) -> list:
+        done = []
+        for rel in rels:
+            try:
+                os.remove(os.path.join(self.base, rel))
+            except FileNotFoundError:
+                pass
+            done.append(rel)
+        return done
+
+
+class _SFTPBackend:
+    def __init__(self, dev_id, params: dict):
+        self.dev_id, self.params = dev_id, params
+        self.root = params.get("root_path", "/").rstrip("/").lstrip("/")
+
+    def _abs(self, rel: str) -> str:
+        return "/".join(p for p in (self.root, rel) if p)
+
+    def walk(self):
+        with get_pool().lease_sftp(self.dev_id, self.params) as sess:
+            stack = [""]
+            while stack:
+                rel_dir = stack.pop()
+                for attr in sess.sftp.listdir_attr(self._abs(rel_dir) or "."):
+                    if is_hidden(attr.filename):
+                        continue
+                    rel = "/".join(p for p in (rel_dir, attr.filename) if p)
+                    if pystat.S_ISDIR(attr.st_mode):
+                        stack.append(rel)
+                    else:
+                        yield rel, attr.st_mtime, attr.st_size
+
+    def read(self, rel: str, out) -> None:
+        with get_pool().lease_sftp(self.dev_id, self.params) as sess:
+            sess.sftp.getfo(self._abs(rel), out)
+
+    def remove(self, rels: list) -> list:
+        done = []
+        with get_pool().lease_sftp(self.dev_id, self.params) as sess:
+            for rel in rels:
+                try:
+                    sess.sftp.remove(self._abs(rel))
+                except FileNotFoundError:
+                    pass
+                done.append(rel)
+        return done
+
+
+class _FTPBackend:
+    def __init__(self, dev_id, params: dict):
+        self.dev_id, self.params = dev_id, params
+        root = params.get("root_path", "/").rstrip("/")
+        self.root = root if root and root != "/" else ""
+
+    def _abs(self, rel: str) -> str:
+        return "/".join(p for p in (self.root, rel) if p)
+
+    def walk(self):
+        with get_pool().lease_ftp(self.dev_id, self.params) as sess:
+            stack = [""]
+            while stack:
+                rel_dir = stack.pop()
+                # MLSD gives type / size / modify in one round trip per folder
+                for name, facts in sess.ftp.mlsd(self._abs(rel_dir) or ".",
+                                                 facts=["type", "size", "modify"]):
+                    if is_hidden(name) or facts.get("type") in ("cdir", "pdir"):
+                        continue
+                    rel = "/".join(p for p in (rel_dir, name) if p)
+                    if facts.get("type") == "dir":
+                        stack.append(rel)
+                    else:
+                        # MLSD times are UTC
+                        mtime = calendar.timegm(
+                            time.strptime(facts["modify"][:14], "%Y%m%d%H%M%S")
+                        )
+                        yield rel, mtime, int(facts.get("size", 0))
+
+    def read(self, rel: str, out) -> None:
+        with get_pool().lease_ftp(self.dev_id, self.params) as sess:
+            try:
+                sess.ftp.retrbinary(f"RETR {self._abs(rel)}", out.write)
+            except ftplib.error_perm as exc:
+                raise FileNotFoundError(rel) from exc
+
+    def remove(self, rels: list) -> list:
+        done = []
+        with get_pool().lease_ftp(self.dev_id, self.params) as sess:
+            for rel in rels:
+                try:
+                    sess.ftp.delete(self._abs(rel))
+                except ftplib.error_perm:
+                    pass                         # already gone
+                done.append(rel)
+        return done
+
+
+def remote_backend(dev_id, params: dict):
+    """FTP / SFTP backend of a remote storage device (paths as the StorageManager writes them)."""
+    proto = params.get("protocol", "ftp").lower()
+    return _SFTPBackend(dev_id, params) if proto == "sftp" else _FTPBackend(dev_id, params)
+
+
+# ───────────────────────────── manager ────────────────────────────────
+class RetentionManager:
+    def __init__(self, flask_app, devices, base_for):
+        """
+        *devices()* returns ``[(dev_id, model, params)]`` for all storage
+        devices (called inside an app context); *base_for(params)* maps a
+        local device to its directory.
+        """
+        self.flask_app = flask_app
+        self._devices  = devices
+        self._base_for = base_for
+        self._lock     = threading.Lock()
+        self._indexes: dict[int, FileIndex] = {}
+        self._last: dict[int, dict] = {}         # dev id → last sweep result
+        self.on_removed = None                   # callback(dev_id, [rel]) after a sweep
+
+        threading.Thread(
+            target=self._run, name="StorageRetention", daemon=True
+        ).start()
+
+    def backend(self, dev_id, model: str, params: dict):
+        if model == "local storage":
+            return _LocalBackend(self._base_for(params))
+        return remote_backend(dev_id, params)
+
+    # ------------------------------------------------------------------
+    # index maintenance
+    # ------------------------------------------------------------------
+    def record(self, dev_id: int, rel: str, size: int, mtime: float = None) -> None:
+        """A file was stored – keep an existing index current."""
+        with self._lock:
+            idx = self._indexes.get(dev_id)
+            if idx is not None:
+                rel = os.path.normpath(rel).replace("\\", "/").lstrip("/")
+                idx.add(rel, mtime or time.time(), size)
+
+    def forget(self, dev_id: int) -> None:
+        with self._lock:
+            self._indexes.pop(dev_id, None)
+
+    def _index(self, dev_id, backend, force: bool = False) -> FileIndex:
+        with self._lock:
+            idx = self._indexes.get(dev_id)
+        if idx is not None and not force and time.time() - idx.built_at < RETENTION_RESCAN:
+            return idx
+
+        fresh = FileIndex()
+        for rel, mtime, size in backend.walk():
+            fresh.add(rel, mtime, size)
+        fresh.built_at = time.time()
+        with self._lock:
+            self._indexes[dev_id] = fresh
+        return fresh
+
+    # ------------------------------------------------------------------
+    # sweeping
+    # ------------------------------------------------------------------
+    def _run(self):
+        while True:
+            time.sleep(RETENTION_INTERVAL)
+            try:
+                with self.flask_app.app_context():
+                    devices = self._devices()
+            except Exception:
+                self.flask_app.logger.exception("🧹 retention: device lookup failed")
+                continue
+            for dev_id, model, params in devices:
+                policy = parse_policy(params)
+                if not policy:
+                    continue
+                try:
+                    self.sweep(dev_id, model, params, policy)
+                except Exception as exc:
+                    self.flask_app.logger.error("🧹 retention dev%s failed: %s", dev_id, exc)
+
+    def sweep(self, dev_id, model, params, policy) -> dict:
+        backend = self.backend(dev_id, model, params)
+        idx     = self._index(dev_id, backend)
+
+        with self._lock:
+            victims = self._select(idx, policy)
+        removed = backend.remove(victims) if victims else []
+
+        freed = 0
+        with self._lock:
+            for rel in removed:
+                freed += idx.files.get(rel, (0, 0))[1]
+                idx.discard(rel)
+            result = {"at": time.time(), "removed": len(removed), "freed": freed,
+                      "more": len(victims) >= RETENTION_BATCH}
+            self._last[dev_id] = result
+        if removed:
+            self.flask_app.logger.info(
+                "🧹 retention dev%s: %d files, %d bytes removed", dev_id, len(removed), freed
+            )
+            if self.on_removed:
+                self.on_removed(dev_id, removed)
+        return result
+
+    @staticmethod
+    def _select(idx: FileIndex, policy: dict) -> list:
+        """Pick up to RETENTION_BATCH files, oldest first, without touching idx."""
+        chosen: dict[str, int] = {}              # rel → size
+        budget = RETENTION_BATCH
+
+        # per-folder limits
+        if policy["max_files"]:
+            for folder in idx.crowded(policy["max_files"]):
+                excess = idx._counts[folder] - policy["max_files"]
+                for _, rel in idx.iter_oldest(folder):
+                    if excess <= 0 or len(chosen) >= budget:
+                        break
+                    if rel not in chosen:
+                        chosen[rel] = idx.files[rel][1]
+                        excess -= 1
+
+        # age and total size – walk the device heap oldest first
+        cutoff = time.time() - policy["max_age"] if policy["max_age"] else None
+        over   = idx.total - sum(chosen.values()) - policy["max_bytes"] if policy["max_bytes"] else 0
+        RetentionManager._pick_oldest(idx, chosen, budget, cutoff, over)
+        return list(chosen)
+
+    @staticmethod
+    def _pick_oldest(idx: FileIndex, chosen: dict, budget: int, cutoff=None, over: int = 0):
+        """Add files older than *cutoff*, then more until *over* bytes are covered."""
+        if cutoff is None and over <= 0:
+            return
+        for mtime, rel in idx.iter_oldest():
+            if len(chosen) >= budget:
+                break
+            if rel in chosen:
+                continue
+            if not (cutoff is not None and mtime < cutoff) and over <= 0:
+                break
+            size = idx.files[rel][1]
+            chosen[rel] = size
+            over -= size
+
+    # ------------------------------------------------------------------
+    # used by the tier migrator
+    # ------------------------------------------------------------------
+    def candidates(self, dev_id, model, params, cutoff=None, high: int = 0, low: int = 0,
+                   limit: int = RETENTION_BATCH) -> list:
+        """
+        Oldest files of a device as ``[(rel, mtime, size)]``: all older than
+        *cutoff*, plus enough to bring the device from above *high* bytes
+        down to *low*.
+        """
+        idx = self._index(dev_id, self.backend(dev_id, model, params))
+        with self._lock:
+            over = idx.total - low if high and idx.total > high else 0
+            chosen: dict[str, int] = {}
+            self._pick_oldest(idx, chosen, limit, cutoff, over)
+            return [(rel, idx.files[rel][0], size) for rel, size in chosen.items()]
+
+    def discard(self, dev_id, rels) -> None:
+        """Files moved away or deleted by someone else (tiering, watcher)."""
+        with self._lock:
+            idx = self._indexes.get(dev_id)
+            if idx is not None:
+                for rel in rels:
+                    idx.discard(rel)
+
+    def discard_dir(self, dev_id, rel_dir: str) -> None:
+        prefix = rel_dir.rstrip("/") + "/"
+        with self._lock:
+            idx = self._indexes.get(dev_id)
+            if idx is not None:
+                for rel in [r for r in idx.files if r.startswith(prefix)]:
+                    idx.discard(rel)
+
+    # ------------------------------------------------------------------
+    # reporting
+    # ------------------------------------------------------------------
+    def usage(self, dev_id, model, params) -> dict:
+        idx = self._index(dev_id, self.backend(dev_id, model, params))
+        with self._lock:
+            out = idx.usage()
+            out["last_sweep"] = self._last.get(dev_id)
+        pol = parse_policy(params)
+        out["policy"] = pol
+        if pol and pol["max_bytes"]:
+            out["quota_used"] = round(out["bytes"] / pol["max_bytes"], 4)
+        return out
@@ -0,0 +1,252 @@
+"""
+Durable local spool for FTP / SFTP storage targets.
+
+A file for a remote target is first written to `STORAGE_SPOOL_DIR` and
+fsynced; the caller acknowledges the file right away and a background
+uploader drains the spool:
+
+    <job>.data   the file itself
+    <job>.json   the job (target, remote path, attempts, next try, error)
+
+The ``.json`` sidecars are the persistent job index – they are scanned on
+start-up, so nothing is lost across restarts.  Failed uploads are retried
+with exponential backoff (`STORAGE_SPOOL_BACKOFF` … `STORAGE_SPOOL_BACKOFF_MAX`
+seconds, ±20 % jitter); at most `STORAGE_SPOOL_PER_TARGET` uploads run per
+storage device and `STORAGE_SPOOL_WORKERS` overall.
+"""
+
+import os
+import json
+import hashlib
+import time
+import heapq
+import random
+import threading
+import uuid
+from datetime import datetime
+from itertools import count
+from concurrent.futures import ThreadPoolExecutor
+
+SPOOL_DIR       = os.getenv("STORAGE_SPOOL_DIR", "/app/storage/.spool")
+SPOOL_WORKERS   = int(os.getenv("STORAGE_SPOOL_WORKERS", 4))
+SPOOL_PER_TARGET = int(os.getenv("STORAGE_SPOOL_PER_TARGET", 2))
+BACKOFF         = float(os.getenv("STORAGE_SPOOL_BACKOFF", 5))        # sec
+BACKOFF_MAX     = float(os.getenv("STORAGE_SPOOL_BACKOFF_MAX", 900))  # sec
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class UploadSpool:
+    def __init__(self, logger, upload, spool_dir: str = SPOOL_DIR):
+        """
+        *upload(job, fileobj)* performs one attempt and raises on failure.
+        """
+        self.log     = logger
+        self.dir     = spool_dir
+        self._upload = upload
+        os.makedirs(self.dir, exist_ok=True)
+
+        self._cond    = threading.Condition()
+        self._jobs: dict[str, dict] = {}         # job id → job
+        self._heap: list[tuple]     = []         # (next_try, seq, job id)
+        self._running: dict         = {}         # device id → uploads in flight
+        self._seq  = count()
+        self._pool = ThreadPoolExecutor(max_workers=SPOOL_WORKERS,
+                                        thread_name_prefix="StorageSpool")
+
+        self._recover()
+        threading.Thread(
+            target=self._run, name="StorageSpool-Scheduler", daemon=True
+        ).start()
+
+    # ------------------------------------------------------------------
+    # paths / persistence
+    # ------------------------------------------------------------------
+    def _path(self, job_id: str, ext: str) -> str:
+        return os.path.join(self.dir, f"{job_id}.{ext}")
+
+    def _save(self, job: dict) -> None:
+        tmp = self._path(job["id"], "json.tmp")
+        with open(tmp, "w") as fh:
+            json.dump(job, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self._path(job["id"], "json"))
+
+    def _recover(self) -> None:
+        for name in os.listdir(self.dir):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(self.dir, name))
+                continue
+            if name.endswith(".data") and not os.path.exists(self._path(name[:-5], "json")):
+                os.remove(os.path.join(self.dir, name))      # crashed before its job was saved
+                continue
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-5]
+            try:
+                with open(self._path(job_id, "json")) as fh:
+                    job = json.load(fh)
+            except (OSError, ValueError):
+                self.log.error("📦 unreadable spool job %s skipped", job_id)
+                continue
+            if not os.path.exists(self._path(job_id, "data")):
+                os.remove(self._path(job_id, "json"))
+                continue
+            self._push(job)
+        if self._jobs:
+            self.log.info("📦 %d spooled uploads recovered", len(self._jobs))
+
+    # ------------------------------------------------------------------
+    # public API
+    # ------------------------------------------------------------------
+    def enqueue(self, dev_id: int, target: dict, content) -> dict:
+        """
+        Store *content* durably and queue it for *dev_id*.  *target* holds
+        whatever the uploader needs (remote path, topic prefix, …).
+        """
+        job_id = uuid.uuid4().hex
+        data   = self._path(job_id, "data")
+        digest = hashlib.sha256()
+        try:
+            with open(data, "wb") as fh:
+                for block in iter(lambda: content.read(1 << 16), b""):
+                    digest.update(block)
+                    fh.write(block)
+                fh.flush()
+                os.fsync(fh.fileno())
+        except BaseException:
+            # bad payload, disk full … – no job will ever own this file
+            try:
+                os.remove(data)
+            except OSError:
+                pass
+            raise
+
+        job = {
+            "id":         job_id,
+            "dev_id":     dev_id,
+            "target":     target,
+            "size":       os.path.getsize(data),
+            "sha256":     digest.hexdigest(),
+            "created":    datetime.utcnow().isoformat(),
+            "attempts":   0,
+            "next_try":   time.time(),
+            "last_error": None,
+        }
+        self._save(job)
+        _fsync_dir(self.dir)
+        self._push(job)
+        return job
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            jobs = sorted(self._jobs.values(), key=lambda j: j["created"])
+            per_dev: dict = {}
+            for j in jobs:
+                d = per_dev.setdefault(j["dev_id"], {"queued": 0, "bytes": 0, "failing": 0})
+                d["queued"]  += 1
+                d["bytes"]   += j["size"]
+                d["failing"] += 1 if j["attempts"] else 0
+            return {
+                "queued":  len(jobs),
+                "running": sum(self._running.values()),
+                "devices": per_dev,
+                "jobs": [
+                    dict({k: j[k] for k in ("id", "dev_id", "size", "created",
+                                            "attempts", "next_try", "last_error")},
+                         path=j["target"].get("remote_rel"))
+                    for j in jobs[:200]
+                ],
+            }
+
+    def retry_now(self, dev_id: int = None) -> int:
+        """Make waiting jobs (of one device) due immediately."""
+        n = 0
+        with self._cond:
+            for job in self._jobs.values():
+                if job.get("busy") or (dev_id is not None and job["dev_id"] != dev_id):
+                    continue
+                job["next_try"] = time.time()
+                heapq.heappush(self._heap, (job["next_try"], next(self._seq), job["id"]))
+                n += 1
+            self._cond.notify()
+        return n
+
+    # ------------------------------------------------------------------
+    # scheduler
+    # ------------------------------------------------------------------
+    def _push(self, job: dict) -> None:
+        with self._cond:
+            self._jobs[job["id"]] = job
+            heapq.heappush(self._heap, (job["next_try"], next(self._seq), job["id"]))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, _, job_id = self._heap[0]
+                    job = self._jobs.get(job_id)
+                    if job is None or job.get("busy") or job["next_try"] != due:
+                        heapq.heappop(self._heap)           # stale entry
+                        continue
+                    delay = due - time.time()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                    if self._running.get(job["dev_id"], 0) >= SPOOL_PER_TARGET:
+                        # target saturated – look again in a second
+                        heapq.heappop(self._heap)
+                        job["next_try"] = time.time() + 1
+                        heapq.heappush(self._heap, (job["next_try"], next(self._seq), job_id))
+                        continue
+                    heapq.heappop(self._heap)
+                    job["busy"] = True
+                    self._running[job["dev_id"]] = self._running.get(job["dev_id"], 0) + 1
+                    break
+            self._pool.submit(self._attempt, job)
+
+    def _attempt(self, job: dict):
+        error = None
+        try:
+            with open(self._path(job["id"], "data"), "rb") as fh:
+                self._upload(job, fh)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+
+        with self._cond:
+            self._running[job["dev_id"]] -= 1
+            job["busy"] = False
+            if error is None:
+                self._jobs.pop(job["id"], None)
+            else:
+                job["attempts"]  += 1
+                job["last_error"] = error
+                wait = min(BACKOFF * 2 ** (job["attempts"] - 1), BACKOFF_MAX)
+                job["next_try"]   = time.time() + wait * random.uniform(0.8, 1.2)
+                heapq.heappush(self._heap, (job["next_try"], next(self._seq), job["id"]))
+            self._cond.notify()
+
+        if error is None:
+            for ext in ("json", "data"):
+                try:
+                    os.remove(self._path(job["id"], ext))
+                except FileNotFoundError:
+                    pass
+            self.log.info("📦 spooled upload %s → %s done",
+                          job["id"], job["target"].get("remote_rel"))
+        else:
+            self.log.warning("📦 upload %s failed (attempt %d): %s – retry in %.0fs",
+                             job["id"], job["attempts"], error,
+                             job["next_try"] - time.time())
+            self._save({k: v for k, v in job.items() if k != "busy"})
@@ -0,0 +1,222 @@
+"""
+Hot / cold tiering for local storage devices.
+
+Files always land on the local device (capture latency = local disk).
+A device with a tier policy in its parameters
+
+    "tier": {
+        "device":         7,        # FTP / SFTP storage device (cold tier)
+        "after_days":     14,       # move files older than this …
+        "high_watermark": "80G",    # … or, once the device is above this,
+        "low_watermark":  "60G",    #     the oldest ones until it is below this
+        "path":           "tier/dev3"   # remote folder (default tier/dev<id>)
+    }
+
+is drained by the `TierMigrator`: every `STORAGE_TIER_INTERVAL` seconds
+it takes up to `STORAGE_TIER_BATCH` of the oldest files from the
+retention index, uploads them over the pooled connection of the cold
+device, records them in `TieredFile` (one commit per batch) and only
+then deletes the local copies.  The rows keep the files visible and
+downloadable under their original path (see `TieredLocalDriver`).  A
+retention policy of the cold device applies to them as well; the rows of
+files it removes are dropped (`TierMigrator.expired`).
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+
+from extensions import db
+from models.tiered_file import TieredFile
+from controllers.storage_retention import parse_bytes, remote_backend
+
+TIER_INTERVAL = float(os.getenv("STORAGE_TIER_INTERVAL", 600))   # sec
+TIER_BATCH    = int(os.getenv("STORAGE_TIER_BATCH", 200))
+
+
+def parse_tier(params: dict):
+    """Normalised tier policy, or None when the device has none."""
+    tier = (params or {}).get("tier") or {}
+    if not str(tier.get("device", "")).isdigit():
+        return None
+    high = parse_bytes(tier.get("high_watermark"))
+    return {
+        "device": int(tier["device"]),
+        "after":  float(tier.get("after_days") or 0) * 86400,
+        "high":   high,
+        "low":    parse_bytes(tier.get("low_watermark")) or int(high * 0.8),
+        "path":   (tier.get("path") or "").strip("/"),
+    }
+
+
+def cold_path(tier: dict, dev_id: int, rel: str) -> str:
+    return f"{tier['path'] or f'tier/dev{dev_id}'}/{rel}"
+
+
+def split_rel(rel: str):
+    folder, name = os.path.split(rel.replace("\\", "/"))
+    return folder, name
+
+
+# ───────────────────────────── lookups ────────────────────────────────
+def tiered_entries(dev_id: int, folder: str) -> list:
+    """Migrated files of one folder of a hot device."""
+    return TieredFile.query.filter_by(device_id=dev_id, folder=folder).all()
+
+
+def tiered_file(dev_id: int, rel: str):
+    folder, name = split_rel(rel)
+    return TieredFile.query.filter_by(device_id=dev_id, folder=folder, name=name).first()
+
+
+def _cold_backend(row: TieredFile):
+    from models.device import Device
+    cold = Device.query.get(row.remote_device_id)
+    if cold is None:
+        raise FileNotFoundError(f"cold tier #{row.remote_device_id} is gone")
+    return remote_backend(cold.id, cold.parameters or {})
+
+
+def read_tiered(row: TieredFile, out) -> None:
+    _cold_backend(row).read(row.remote_path, out)
+
+
+def remove_tiered(row: TieredFile) -> None:
+    _cold_backend(row).remove([row.remote_path])
+    db.session.delete(row)
+    db.session.commit()
+
+
+# ───────────────────────────── migrator ───────────────────────────────
+class TierMigrator:
+    def __init__(self, flask_app, retention, put_remote, devices, base_for):
+        """
+        *put_remote(dev_id, params, remote_rel, fileobj)* uploads one file;
+        *devices()* / *base_for(params)* as for the RetentionManager.
+        """
+        self.flask_app   = flask_app
+        self.retention   = retention
+        self._put_remote = put_remote
+        self._devices    = devices
+        self._base_for   = base_for
+        self._moved: dict = {}                   # (dev_id, rel) → time the local copy went
+        self._moved_lock = threading.Lock()
+
+        threading.Thread(
+            target=self._run, name="StorageTiering", daemon=True
+        ).start()
+
+    def was_moved(self, dev_id, rel: str) -> bool:
+        """True once for a local file this migrator deleted (watcher events)."""
+        cutoff = time.time() - 300
+        with self._moved_lock:
+            for key in [k for k, t in self._moved.items() if t < cutoff]:
+                del self._moved[key]
+            return self._moved.pop((dev_id, rel), None) is not None
+
+    def expired(self, cold_id: int, remote_paths: list) -> dict:
+        """
+        The cold device's own retention removed *remote_paths*: drop the
+        rows that still list them, return ``{hot dev id: [rel]}``.
+        """
+        gone: dict = {}
+        with self.flask_app.app_context():
+            for i in range(0, len(remote_paths), 500):
+                rows = TieredFile.query.filter(
+                    TieredFile.remote_device_id == cold_id,
+                    TieredFile.remote_path.in_(remote_paths[i:i + 500]),
+                ).all()
+                for row in rows:
+                    gone.setdefault(row.device_id, []).append(row.path)
+                    db.session.delete(row)
+            db.session.commit()
+        return gone
+
+    def _run(self):
+        while True:
+            time.sleep(TIER_INTERVAL)
+            try:
+                with self.flask_app.app_context():
+                    devices = {d[0]: d for d in self._devices()}
+            except Exception:
+                self.flask_app.logger.exception("🧊 tiering: device lookup failed")
+                continue
+            for dev_id, model, params in devices.values():
+                tier = parse_tier(params)
+                if not tier or model != "local storage":
+                    continue
+                cold = devices.get(tier["device"])
+                if cold is None or cold[1] != "ftp / sftp storage":
+                    self.flask_app.logger.warning(
+                        "🧊 tier target #%s of dev%s is not an enabled FTP / SFTP device",
+                        tier["device"], dev_id)
+                    continue
+                try:
+                    self.migrate(dev_id, params, tier, cold)
+                except Exception as exc:
+                    self.flask_app.logger.error("🧊 tiering dev%s failed: %s", dev_id, exc)
+
+    def migrate(self, dev_id, params, tier, cold) -> int:
+        cold_id, _, cold_params = cold
+        cutoff = time.time() - tier["after"] if tier["after"] else None
+        files = self.retention.candidates(
+            dev_id, "local storage", params, cutoff, tier["high"], tier["low"], TIER_BATCH
+        )
+        if not files:
+            return 0
+
+        base, moved, gone = self._base_for(params), [], []
+        for rel, mtime, size in files:
+            dst = cold_path(tier, dev_id, rel)
+            try:
+                with open(os.path.join(base, rel), "rb") as fh:
+                    self._put_remote(cold_id, cold_params, dst, fh)
+            except FileNotFoundError:
+                gone.append(rel)                 # deleted meanwhile
+                continue
+            except Exception as exc:
+                # cold tier unreachable – keep what is done, retry next run
+                self.flask_app.logger.warning("🧊 upload of %s to tier failed: %s", rel, exc)
+                break
+            moved.append((rel, mtime, size, dst))
+        self.retention.discard(dev_id, gone)
+        if not moved:
+            return 0
+
+        # lookup rows first, local copies last: a crash leaves a duplicate,
+        # never a file that exists nowhere
+        now = datetime.utcnow()
+        with self.flask_app.app_context():
+            for rel, mtime, size, dst in moved:
+                folder, name = split_rel(rel)
+                row = (TieredFile.query
+                       .filter_by(device_id=dev_id, folder=folder, name=name).first()
+                       or TieredFile(device_id=dev_id, folder=folder, name=name))
+                row.size, row.mtime = size, int(mtime)
+                row.remote_device_id, row.remote_path = cold_id, dst
+                row.migrated_at = now
+                db.session.add(row)
+            db.session.commit()
+
+        done, freed = [], 0
+        for rel, mtime, size, dst in moved:
+            path = os.path.join(base, rel)
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    continue                     # rewritten since – the local copy wins
+                with self._moved_lock:
+                    self._moved[(dev_id, rel)] = time.time()
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            done.append(rel)
+            freed += size
+            self.retention.record(cold_id, dst, size)
+        self.retention.discard(dev_id, done)
+
+        self.flask_app.logger.info(
+            "🧊 tiering dev%s → dev%s: %d files, %d bytes",
+            dev_id, cold_id, len(done), freed
+        )
+        return len(done)
@@ -0,0 +1,374 @@
+"""
+Change watcher for local storage roots.
+
+Local devices are also written from outside the app (Docker volumes, NFS,
+cameras uploading through their own FTP server).  The `StorageWatcher`
+turns those changes into events for the in-memory indexes and caches, so
+they stay correct without periodic full rescans:
+
+    FsEvent(dev_id, kind, rel, size, mtime)
+        kind = "created" | "modified" | "deleted"      (files)
+               "dir_deleted"                           (a whole folder went away)
+               "overflow"                              (events lost → resync dev_id)
+
+* Linux: inotify through ctypes – one watch per directory, new folders
+  are picked up (and scanned) as they appear.  One thread serves all
+  devices.
+* elsewhere, on network file systems (inotify only sees local writes) or
+  when ``"watch": "poll"`` is set on the device: a poller that re-lists
+  only directories whose mtime changed, every `STORAGE_WATCH_POLL`
+  seconds.  In-place rewrites of a file in an unchanged folder are not
+  seen this way.
+
+``"watch": "off"`` disables watching for a device.  Subscribers are
+called on the watcher thread and must be quick.
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from collections import namedtuple
+
+from controllers.storage_retention import is_hidden
+
+WATCH_POLL = float(os.getenv("STORAGE_WATCH_POLL", 30))    # sec
+
+FsEvent = namedtuple("FsEvent", "dev_id kind rel size mtime")
+
+# inotify(7)
+IN_MODIFY       = 0x00000002
+IN_CLOSE_WRITE  = 0x00000008
+IN_MOVED_FROM   = 0x00000040
+IN_MOVED_TO     = 0x00000080
+IN_CREATE       = 0x00000100
+IN_DELETE       = 0x00000200
+IN_DELETE_SELF  = 0x00000400
+IN_MOVE_SELF    = 0x00000800
+IN_Q_OVERFLOW   = 0x00004000
+IN_IGNORED      = 0x00008000
+IN_ONLYDIR      = 0x01000000
+IN_ISDIR        = 0x40000000
+
+_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+         | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT = struct.Struct("iIII")                # wd, mask, cookie, len
+
+_NETWORK_FS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p"}
+
+
+def _fs_type(path: str) -> str:
+    """File system type of the mount holding *path* ('' when unknown)."""
+    best, fstype = "", ""
+    try:
+        with open("/proc/self/mounts") as fh:
+            for line in fh:
+                parts = line.split()
+                mnt = parts[1].replace("\\040", " ")
+                if path == mnt or path.startswith(mnt.rstrip("/") + "/"):
+                    if len(mnt) > len(best):
+                        best, fstype = mnt, parts[2]
+    except OSError:
+        pass
+    return fstype
+
+
+# ───────────────────────────── inotify ────────────────────────────────
+class _Inotify:
+    def __init__(self):
+        name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch({path}): {os.strerror(err)}")
+        return wd
+
+    def remove(self, wd: int) -> None:
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: float):
+        """Yield (wd, mask, cookie, name) – waits up to *timeout* seconds."""
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        if not poller.poll(timeout * 1000):
+            return
+        try:
+            buf = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return
+        pos = 0
+        while pos < len(buf):
+            wd, mask, cookie, size = _EVENT.unpack_from(buf, pos)
+            pos += _EVENT.size
+            name = buf[pos:pos + size].rstrip(b"\0").decode(errors="surrogateescape")
+            pos += size
+            yield wd, mask, cookie, name
+
+
+# ───────────────────────────── watcher ────────────────────────────────
+class StorageWatcher:
+    def __init__(self, flask_app, devices):
+        """
+        *devices()* returns ``[(dev_id, base_path, params)]`` of the local
+        storage devices (called inside an app context).
+        """
+        self.flask_app = flask_app
+        self._devices  = devices
+        self._subs: list = []
+        self._lock  = threading.Lock()
+        self._stale = True
+
+        # inotify state (watcher thread only)
+        self._ino = None
+        self._modes: dict[int, tuple] = {}       # dev_id → (base, "inotify" | "poll")
+        self._wd: dict[int, tuple] = {}          # wd → (dev_id, base, rel dir)
+        self._fresh: set = set()                 # (dev_id, rel) created, not yet closed
+
+        # polling state (watcher thread only)
+        self._polled: dict[int, dict] = {}       # dev_id → {"base", "dirs", "subs", "files"}
+
+        try:
+            self._ino = _Inotify()
+        except (OSError, AttributeError) as exc:
+            flask_app.logger.info("👁️ inotify unavailable (%s) – polling storage roots", exc)
+
+        threading.Thread(
+            target=self._run, name="StorageWatcher", daemon=True
+        ).start()
+
+    # ------------------------------------------------------------------
+    # bus
+    # ------------------------------------------------------------------
+    def subscribe(self, callback) -> None:
+        """*callback(FsEvent)* for every change on a watched device."""
+        with self._lock:
+            self._subs.append(callback)
+
+    def _emit(self, dev_id, kind, rel, size=0, mtime=0.0) -> None:
+        ev = FsEvent(dev_id, kind, rel, size, mtime)
+        with self._lock:
+            subs = list(self._subs)
+        for cb in subs:
+            try:
+                cb(ev)
+            except Exception:
+                self.flask_app.logger.exception("👁️ subscriber failed on %s", ev)
+
+    def refresh(self) -> None:
+        """Device list changed – re-read it on the next turn."""
+        self._stale = True
+
+    # ------------------------------------------------------------------
+    # main loop
+    # ------------------------------------------------------------------
+    def _run(self):
+        last_load = last_poll = 0.0
+        while True:
+            if self._stale or time.time() - last_load > 300:
+                self._stale, last_load = False, time.time()
+                try:
+                    self._sync_devices()
+                except Exception:
+                    self.flask_app.logger.exception("👁️ device lookup failed")
+
+            if self._ino and self._wd:
+                try:
+                    self._drain(timeout=1.0)
+                except Exception:
+                    self.flask_app.logger.exception("👁️ inotify read failed")
+            else:
+                time.sleep(1.0)
+
+            if self._polled and time.time() - last_poll >= WATCH_POLL:
+                last_poll = time.time()
+                for dev_id in list(self._polled):
+                    try:
+                        self._poll(dev_id)
+                    except Exception:
+                        self.flask_app.logger.exception("👁️ polling dev%s failed", dev_id)
+
+    def _sync_devices(self) -> None:
+        with self.flask_app.app_context():
+            wanted = {}
+            for dev_id, base, params in self._devices():
+                mode = str(params.get("watch", "auto")).lower()
+                if mode == "off":
+                    continue
+                if mode == "auto":
+                    mode = "poll" if not self._ino or _fs_type(base) in _NETWORK_FS else "inotify"
+                wanted[dev_id] = (base, mode)
+
+        for dev_id in list(self._modes):
+            if wanted.get(dev_id) != self._modes[dev_id]:
+                self._unwatch(dev_id)
+
+        for dev_id, (base, mode) in wanted.items():
+            if dev_id in self._modes:
+                continue
+            self._modes[dev_id] = (base, mode)
+            os.makedirs(base, exist_ok=True)
+            if mode == "inotify" and self._ino:
+                try:
+                    self._watch_tree(dev_id, base, "", emit=False)
+                    self.flask_app.logger.info("👁️ watching dev%s %s (inotify)", dev_id, base)
+                    continue
+                except OSError as exc:          # e.g. ENOSPC: max_user_watches
+                    self.flask_app.logger.warning(
+                        "👁️ inotify on %s failed (%s) – polling instead", base, exc)
+                    self._drop_watches(dev_id)
+            self._polled[dev_id] = {"base": base, "dirs": {}, "subs": {}, "files": {}}
+            self._poll(dev_id, emit=False)
+            self.flask_app.logger.info("👁️ watching dev%s %s (poll)", dev_id, base)
+
+    def _unwatch(self, dev_id) -> None:
+        self._modes.pop(dev_id, None)
+        self._polled.pop(dev_id, None)
+        self._drop_watches(dev_id)
+
+    def _drop_watches(self, dev_id) -> None:
+        for wd, (d, _, _) in list(self._wd.items()):
+            if d == dev_id:
+                self._ino.remove(wd)
+                del self._wd[wd]
+
+    # ------------------------------------------------------------------
+    # inotify
+    # ------------------------------------------------------------------
+    def _watch_tree(self, dev_id, base: str, rel_dir: str, emit: bool) -> None:
+        """Watch *rel_dir* and everything below; report files already there."""
+        stack = [rel_dir]
+        while stack:
+            rel = stack.pop()
+            path = os.path.join(base, rel)
+            try:
+                self._wd[self._ino.add(path)] = (dev_id, base, rel)
+                it = os.scandir(path)
+            except OSError as exc:
+                if exc.errno in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise
+            with it:
+                for ent in it:
+                    if is_hidden(ent.name):
+                        continue
+                    child = os.path.join(rel, ent.name)
+                    if ent.is_dir(follow_symlinks=False):
+                        stack.append(child)
+                    elif emit and ent.is_file(follow_symlinks=False):
+                        st = ent.stat(follow_symlinks=False)
+                        self._emit(dev_id, "created", child, st.st_size, st.st_mtime)
+
+    def _drain(self, timeout: float) -> None:
+        for wd, mask, _cookie, name in self._ino.read(timeout):
+            if mask & IN_Q_OVERFLOW:
+                self.flask_app.logger.warning("👁️ inotify queue overflow – resyncing")
+                for dev_id, (_, mode) in list(self._modes.items()):
+                    if mode == "inotify" and dev_id not in self._polled:
+                        self._emit(dev_id, "overflow", "")
+                continue
+            if mask & IN_IGNORED:
+                self._wd.pop(wd, None)
+                continue
+            where = self._wd.get(wd)
+            if where is None:
+                continue
+            dev_id, base, rel_dir = where
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                continue                         # reported by the parent
+            if not name or is_hidden(name):
+                continue
+            rel = os.path.join(rel_dir, name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(dev_id, base, rel, emit=True)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._forget_dir(dev_id, rel)
+                    self._emit(dev_id, "dir_deleted", rel)
+                continue
+
+            if mask & IN_CREATE:
+                self._fresh.add((dev_id, rel))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                kind = "created" if (mask & IN_MOVED_TO or (dev_id, rel) in self._fresh) \
+                    else "modified"
+                self._fresh.discard((dev_id, rel))
+                try:
+                    st = os.stat(os.path.join(base, rel))
+                except FileNotFoundError:
+                    continue
+                self._emit(dev_id, kind, rel, st.st_size, st.st_mtime)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self._fresh.discard((dev_id, rel))
+                self._emit(dev_id, "deleted", rel)
+
+    def _forget_dir(self, dev_id, rel: str) -> None:
+        prefix = rel + os.sep
+        for wd, (d, _, r) in list(self._wd.items()):
+            if d == dev_id and (r == rel or r.startswith(prefix)):
+                self._ino.remove(wd)
+                del self._wd[wd]
+
+    # ------------------------------------------------------------------
+    # polling fallback
+    # ------------------------------------------------------------------
+    def _poll(self, dev_id, emit: bool = True) -> None:
+        """Re-list only folders whose mtime changed since the last round."""
+        st_ = self._polled[dev_id]
+        base, dirs, subs, files = st_["base"], st_["dirs"], st_["subs"], st_["files"]
+
+        seen, stack = set(), [""]
+        while stack:
+            rel  = stack.pop()
+            path = os.path.join(base, rel)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            seen.add(rel)
+            if dirs.get(rel) == mtime:
+                stack.extend(subs.get(rel, ()))
+                continue
+
+            listing, children = {}, []
+            try:
+                with os.scandir(path) as it:
+                    for ent in it:
+                        if is_hidden(ent.name):
+                            continue
+                        if ent.is_dir(follow_symlinks=False):
+                            children.append(os.path.join(rel, ent.name))
+                        elif ent.is_file(follow_symlinks=False):
+                            s = ent.stat(follow_symlinks=False)
+                            listing[ent.name] = (s.st_mtime, s.st_size)
+            except FileNotFoundError:
+                continue
+            dirs[rel], subs[rel] = mtime, children
+            stack.extend(children)
+
+            old, files[rel] = files.get(rel, {}), listing
+            if not emit:
+                continue
+            for name, (m, size) in listing.items():
+                prev = old.get(name)
+                if prev != (m, size):
+                    self._emit(dev_id, "created" if prev is None else "modified",
+                               os.path.join(rel, name), size, m)
+            for name in old.keys() - listing.keys():
+                self._emit(dev_id, "deleted", os.path.join(rel, name))
+
+        for rel in set(dirs) - seen:
+            for state in (dirs, subs, files):
+                state.pop(rel, None)
+            if emit and rel:
+                self._emit(dev_id, "dir_deleted", rel)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# bench_local_driver.py
+"""
+Benchmark directory listings of a local storage folder.
+
+• Fills a temporary folder with N empty files (plus a few sub-folders)
+• Times the old pathlib listing (iterdir + stat + is_dir per entry)
+  against LocalDriver.listdir (os.scandir, one cached stat per entry)
+
+Usage:  python dev_scripts/bench_local_driver.py [N] [ROUNDS]
+"""
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+
+# ── project import path ─────────────────────────────────────────────────
+top = Path(__file__).resolve().parents[1].as_posix()
+if top not in sys.path:
+    sys.path.insert(0, top)
+
+from flask import Flask
+from storage_drivers import LocalDriver
+
+N_FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+ROUNDS  = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+
+def old_listdir(root: Path, rel: str):
+    """The listing as LocalDriver did it before (kept here for comparison)."""
+    abs_dir = (root / rel.lstrip("/")).resolve()
+    for child in abs_dir.iterdir():
+        if child.name.startswith("."):
+            continue
+        st = child.stat()
+        yield (child.name, str(child), child.is_dir(),
+               st.st_size, int(st.st_mtime))
+
+
+def best_of(fn) -> float:
+    best = None
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        n = sum(1 for _ in fn())
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    assert n >= N_FILES, n
+    return best
+
+
+def main():
+    tmp = Path(tempfile.mkdtemp(prefix="bench_local_"))
+    try:
+        folder = tmp / "snapshots"
+        folder.mkdir()
+        for i in range(N_FILES):
+            (folder / f"snap_{i:07d}.jpg").touch()
+        for i in range(10):
+            (folder / f"sub{i}").mkdir()
+
+        app = Flask(__name__)
+        with app.app_context():
+            drv = LocalDriver({"base_path": str(tmp)})
+            old = best_of(lambda: old_listdir(drv.root, "snapshots"))
+            new = best_of(lambda: drv.listdir("snapshots"))
+
+        print(f"{N_FILES} files, best of {ROUNDS}:")
+        print(f"  pathlib iterdir+stat+is_dir  : {old * 1000:8.1f} ms")
+        print(f"  LocalDriver.listdir (scandir): {new * 1000:8.1f} ms")
+        print(f"  speed-up                     : {old / new:8.2f}x")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""create action_schedule_state table
+
+Revision ID: 4b2e9d7a1c3f
+Revises: 1713516d6639
+Create Date: 2026-10-19 09:12:41.208311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b2e9d7a1c3f'
+down_revision = '1713516d6639'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('action_schedule_state',
+    sa.Column('action_id', sa.Integer(), nullable=False),
+    sa.Column('last_fire_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['action_id'], ['actions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('action_id')
+    )
+
+
+def downgrade():
+    op.drop_table('action_schedule_state')
@@ -0,0 +1,38 @@
+"""create tiered_files table
+
+Revision ID: 8d1f3a6c2e47
+Revises: 4b2e9d7a1c3f
+Create Date: 2026-10-19 14:03:17.552904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d1f3a6c2e47'
+down_revision = '4b2e9d7a1c3f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tiered_files',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('folder', sa.String(length=500), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('mtime', sa.Integer(), nullable=False),
+    sa.Column('remote_device_id', sa.Integer(), nullable=False),
+    sa.Column('remote_path', sa.String(length=1024), nullable=False),
+    sa.Column('migrated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['remote_device_id'], ['devices.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('device_id', 'folder', 'name', name='uq_tiered_path')
+    )
+
+
+def downgrade():
+    op.drop_table('tiered_files')
@@ -0,0 +1,47 @@
+"""create storage_files catalogue
+
+Revision ID: e5a7c9b31d08
+Revises: 8d1f3a6c2e47
+Create Date: 2026-10-19 15:21:44.108376
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c9b31d08'
+down_revision = '8d1f3a6c2e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('storage_files',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('folder', sa.String(length=500), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('ext', sa.String(length=16), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('mtime', sa.DateTime(), nullable=False),
+    sa.Column('source', sa.String(length=120), nullable=True),
+    sa.Column('action', sa.String(length=120), nullable=True),
+    sa.Column('sha256', sa.String(length=64), nullable=True),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('device_id', 'folder', 'name', name='uq_storage_file_path')
+    )
+    with op.batch_alter_table('storage_files', schema=None) as batch_op:
+        batch_op.create_index('ix_storage_files_device_mtime', ['device_id', 'mtime'], unique=False)
+        batch_op.create_index('ix_storage_files_source_mtime', ['source', 'mtime'], unique=False)
+        batch_op.create_index('ix_storage_files_name', ['name'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('storage_files', schema=None) as batch_op:
+        batch_op.drop_index('ix_storage_files_name')
+        batch_op.drop_index('ix_storage_files_source_mtime')
+        batch_op.drop_index('ix_storage_files_device_mtime')
+
+    op.drop_table('storage_files')
@@ -8,6 +8,9 @@ from .device_category import DeviceCategory
 from .device_model import DeviceModel
 from .device_schema import DeviceSchema
 from .actions import Action
+from .action_schedule import ActionScheduleState
+from .tiered_file import TieredFile
+from .storage_file import StorageFile
 
 # For migrations or Flask shell usage
 __all__ = [
@@ -18,5 +21,8 @@ __all__ = [
     "DeviceModel",
     "DeviceSchema",
     "Action",
+    "ActionScheduleState",
+    "TieredFile",
+    "StorageFile",
     "CameraStream"
 ]
\ No newline at end of file
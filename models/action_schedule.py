@@ -0,0 +1,18 @@
+# models/action_schedule.py
+from extensions import db
+
+
+class ActionScheduleState(db.Model):
+    """
+    Last fire time of a schedule-triggered Action, so the scheduler can
+    detect occurrences missed while the app was down.
+    """
+    __tablename__ = "action_schedule_state"
+
+    action_id    = db.Column(db.Integer,
+                             db.ForeignKey("actions.id", ondelete="CASCADE"),
+                             primary_key=True)
+    last_fire_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ActionScheduleState #{self.action_id} last={self.last_fire_at}>"
@@ -0,0 +1,49 @@
+# models/storage_file.py
+from extensions import db
+
+
+class StorageFile(db.Model):
+    """
+    Catalogue entry of one file on a storage device, so files can be found
+    by time, source and name without walking the device.
+    """
+    __tablename__ = "storage_files"
+
+    id        = db.Column(db.Integer, primary_key=True)
+    device_id = db.Column(db.Integer,
+                          db.ForeignKey("devices.id", ondelete="CASCADE"),
+                          nullable=False)
+    folder    = db.Column(db.String(500), nullable=False, default="")
+    name      = db.Column(db.String(255), nullable=False)
+    ext       = db.Column(db.String(16),  nullable=False, default="")
+    size      = db.Column(db.BigInteger,  nullable=False, default=0)
+    mtime     = db.Column(db.DateTime,    nullable=False)
+    source    = db.Column(db.String(120), nullable=True)    # camera / client
+    action    = db.Column(db.String(120), nullable=True)    # action that sent it
+    sha256    = db.Column(db.String(64),  nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint("device_id", "folder", "name", name="uq_storage_file_path"),
+        db.Index("ix_storage_files_device_mtime", "device_id", "mtime"),
+        db.Index("ix_storage_files_source_mtime", "source", "mtime"),
+        db.Index("ix_storage_files_name", "name"),
+    )
+
+    @property
+    def path(self) -> str:
+        return f"{self.folder}/{self.name}" if self.folder else self.name
+
+    def to_dict(self) -> dict:
+        return {
+            "id":        self.id,
+            "device_id": self.device_id,
+            "path":      self.path,
+            "size":      self.size,
+            "mtime":     self.mtime.isoformat(),
+            "source":    self.source,
+            "action":    self.action,
+            "sha256":    self.sha256,
+        }
+
+    def __repr__(self):
+        return f"<StorageFile dev{self.device_id}:{self.path}>"
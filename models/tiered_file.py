@@ -0,0 +1,36 @@
+# models/tiered_file.py
+from extensions import db
+
+
+class TieredFile(db.Model):
+    """
+    A file that the tier migrator moved from a local (hot) storage device
+    to its remote (cold) tier.  The row keeps the file visible and
+    downloadable under its original path.
+    """
+    __tablename__ = "tiered_files"
+
+    id               = db.Column(db.Integer, primary_key=True)
+    device_id        = db.Column(db.Integer,
+                                 db.ForeignKey("devices.id", ondelete="CASCADE"),
+                                 nullable=False)
+    folder           = db.Column(db.String(500), nullable=False, default="")
+    name             = db.Column(db.String(255), nullable=False)
+    size             = db.Column(db.BigInteger, nullable=False, default=0)
+    mtime            = db.Column(db.Integer, nullable=False)          # epoch sec
+    remote_device_id = db.Column(db.Integer,
+                                 db.ForeignKey("devices.id", ondelete="CASCADE"),
+                                 nullable=False)
+    remote_path      = db.Column(db.String(1024), nullable=False)
+    migrated_at      = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("device_id", "folder", "name", name="uq_tiered_path"),
+    )
+
+    @property
+    def path(self) -> str:
+        return f"{self.folder}/{self.name}" if self.folder else self.name
+
+    def __repr__(self):
+        return f"<TieredFile dev{self.device_id}:{self.path} → dev{self.remote_device_id}>"
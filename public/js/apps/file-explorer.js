@@ -3,8 +3,102 @@
 $(function () {
   const connectorUrl = '/storage/connector';
   const baseUrl      = '/assets/vendor/elfinder/';
+  const pageSize     = 1000;
   let   fmInstance   = null;
 
+  // Pager under the explorer: the connector sends one window of a folder
+  // (cwd.page = {offset, limit, total, sort, order}); paging re-opens the
+  // cwd with a new offset, sorting asks the server for a new order.
+  const $pager = $(
+    '<div id="fePager" class="d-flex align-items-center justify-content-end gap-2 mt-2 d-none">' +
+      '<span class="text-muted small me-2" data-role="info"></span>' +
+      '<div class="btn-group btn-group-sm">' +
+        '<button type="button" class="btn btn-outline-secondary" data-step="first">&laquo;</button>' +
+        '<button type="button" class="btn btn-outline-secondary" data-step="prev">&lsaquo;</button>' +
+        '<button type="button" class="btn btn-outline-secondary" data-step="next">&rsaquo;</button>' +
+        '<button type="button" class="btn btn-outline-secondary" data-step="last">&raquo;</button>' +
+      '</div>' +
+    '</div>'
+  );
+
+  function updatePager(fm) {
+    const cwd  = fm.cwd();
+    const page = cwd && cwd.page;
+    if (!page || page.total <= page.limit) {
+      $pager.addClass('d-none');
+      return;
+    }
+    const last = page.offset + page.limit >= page.total;
+    $pager.find('[data-role="info"]').text(
+      (page.offset + 1) + '–' + Math.min(page.offset + page.limit, page.total) +
+      ' / ' + page.total
+    );
+    $pager.find('[data-step="first"], [data-step="prev"]').prop('disabled', page.offset === 0);
+    $pager.find('[data-step="next"], [data-step="last"]').prop('disabled', last);
+    $pager.removeClass('d-none');
+  }
+
+  // Progress of streamed ZIP downloads (cmd=zipdl&status=<token>)
+  const $zipStatus = $('<div id="feZipStatus" class="text-muted small mt-2 d-none"></div>');
+
+  function formatBytes(n) {
+    const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+    let i = 0;
+    while (n >= 1024 && i < units.length - 1) { n /= 1024; i++; }
+    return n.toFixed(i ? 1 : 0) + ' ' + units[i];
+  }
+
+  function trackZip(devId, token) {
+    let waits = 0;                       // the download may never be started
+    const poll = function () {
+      $.post(connectorUrl, { cmd: 'zipdl', status: token, dev: devId })
+        .done(function (job) {
+          if (job.state === 'pending' || job.state === 'listing') {
+            $zipStatus.text('ZIP: preparing…').removeClass('d-none');
+          } else {
+            $zipStatus.text(
+              'ZIP: ' + job.files + ' / ' + job.files_total + ' files, ' +
+              formatBytes(job.bytes) + ' / ' + formatBytes(job.bytes_total) +
+              (job.skipped ? ' (' + job.skipped + ' skipped)' : '') +
+              (job.state === 'streaming' ? '' : ' – ' + job.state)
+            ).removeClass('d-none');
+          }
+          const waiting = job.state === 'pending' && ++waits > 30;
+          if (!waiting && ['done', 'error', 'aborted'].indexOf(job.state) === -1) {
+            setTimeout(poll, 1000);
+          } else {
+            setTimeout(function () { $zipStatus.addClass('d-none'); }, 5000);
+          }
+        })
+        .fail(function () { $zipStatus.addClass('d-none'); });
+    };
+    poll();
+  }
+
+  // the connector answers the first zipdl step with the archive token
+  $(document).ajaxSuccess(function (ev, xhr, settings) {
+    const res = xhr.responseJSON;
+    if (res && res.zipdl && res.zipdl.file && fmInstance) {
+      trackZip(fmInstance.customData.dev, res.zipdl.file);
+    }
+  });
+
+  function goToOffset(fm, offset) {
+    Object.assign(fm.customData, { offset: offset, page_of: fm.cwd().hash });
+    fm.exec('reload');
+  }
+
+  $pager.on('click', 'button[data-step]', function () {
+    const fm   = fmInstance;
+    const page = fm && fm.cwd().page;
+    if (!page) return;
+    const step = { first : 0,
+                   prev  : page.offset - page.limit,
+                   next  : page.offset + page.limit,
+                   last  : Math.floor((page.total - 1) / page.limit) * page.limit };
+    goToOffset(fm, Math.max(0, step[this.dataset.step]));
+  });
+
   // Initialize elFinder against the given device ID
   function initElfinderFor(devId) {
     // Destroy any existing instance and unbind its events
@@ -13,14 +107,16 @@ $(function () {
       fmInstance = null;
       $('#fileExplorer').off().empty();
     }
+    $pager.addClass('d-none').insertAfter('#fileExplorer');
+    $zipStatus.addClass('d-none').insertAfter($pager);
 
     const opts = {
       // connector endpoint
       url          : connectorUrl,
       // force POST so customData (dev) is sent on every request
       requestType  : 'post',
-      // always include current device
-      customData   : { dev: devId },
+      // always include current device (+ the window of big folders)
+      customData   : { dev: devId, limit: pageSize },
       baseUrl      : baseUrl,
       cssAutoLoad  : false,
       debug        : true,
@@ -29,7 +125,7 @@ $(function () {
       commands     : [
         'open','reload','home','up','back','forward',
         'select','copy','cut','paste','rm',
-        'mkdir','upload','download','quicklook'
+        'mkdir','upload','download','zipdl','quicklook'
       ],
 
       uiOptions: {
@@ -50,7 +146,15 @@ $(function () {
 
       handlers: {
         init   : (e, fm)   => console.log('elFinder started on dev', devId),
-        request: (e, data) => console.log('elFinder request:', data.cmd, data)
+        request: (e, data) => console.log('elFinder request:', data.cmd, data),
+        open   : (e, fm)   => updatePager(fm),
+        sync   : (e, fm)   => updatePager(fm),
+        // the page holds only part of the folder – let the server sort it
+        sortchange: (e, fm) => {
+          const sort = { name: 'name', date: 'date', size: 'size' }[fm.sortType] || 'name';
+          Object.assign(fm.customData, { sort: sort, order: fm.sortOrder });
+          if (fm.cwd().page) goToOffset(fm, 0);
+        }
       }
     };
 
@@ -9,9 +9,11 @@ const toast = (msg, variant = "success") => {
   t.className = `toast align-items-center text-bg-${variant} border-0 position-fixed bottom-0 end-0 m-3`;
   t.innerHTML = `
     <div class="d-flex">
-      <div class="toast-body">${msg}</div>
+      <div class="toast-body"></div>
       <button type="button" class="btn-close btn-close-white ms-auto me-2" data-bs-dismiss="toast"></button>
     </div>`;
+  // messages carry user-supplied Action names – text only, never markup
+  t.querySelector(".toast-body").textContent = msg;
   document.body.appendChild(t);
   new bootstrap.Toast(t, { delay: 2500 }).show();
 };
@@ -383,6 +385,17 @@ qs("#actionsTable tbody").addEventListener("click", async e => {
   if (!r.ok) { toast("Error loading action","danger"); return; }
   const a = await r.json();
 
+  // the form knows device triggers only – schedules and device-group
+  // templates are created and edited through the API
+  const first = a.chain[0] || {};
+  if (first.source === "schedule" || first.device_group) {
+    toast(first.source === "schedule"
+      ? "Schedule-triggered actions can only be edited through the API"
+      : "Device-group actions can only be edited through the API", "warning");
+    currentEditId = null;
+    return;
+  }
+
   // reset form
   f.reset(); f.classList.remove("was-validated");
   modalTitle.textContent = "Edit Action";
@@ -588,10 +601,12 @@ qs("#saveActionBtn").addEventListener("click", async () => {
   });
 
   if (res.ok) {
+    const saved = await res.json().catch(() => ({}));
     modal.hide();
     await loadRows();
     currentEditId = null;
     toast("Saved");
+    (saved.analysis?.warnings || []).forEach(w => toast(w, "warning"));
   } else {
     let msg;
     let payload;
@@ -9,25 +9,66 @@ Blueprint URL prefix  : /storage/connector
 from __future__ import annotations
 
 import base64
+import hashlib
 import io
 import mimetypes
 import os
+import re
+import secrets
+import shutil
+import stat as pystat
+import tempfile
+import threading
+import time
 import traceback
+import zipfile
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Dict
+from urllib.parse import quote
 
 from flask import (
     Blueprint,
+    Response,
     jsonify,
     request,
     send_file,
+    stream_with_context,
     current_app,
 )
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.wsgi import FileWrapper
 from models.device import Device
+from controllers.storage_chunks import ChunkAssembler, TransferError, CHUNK_DIR
+from controllers.storage_retention import parse_bytes
 
-from storage_drivers import LocalDriver, SFTPDriver, BaseDriver, DirEntry
+from storage_drivers import (
+    LocalDriver, TieredLocalDriver, SFTPDriver, CachedDriver, BaseDriver, DirEntry,
+    STREAM_CHUNK,
+)
 
 elfinder_bp = Blueprint("elfinder_connector", __name__, url_prefix="/storage/connector")
 
+# `open` returns one window of the directory (see _page_args)
+PAGE_SIZE = int(os.getenv("ELFINDER_PAGE_SIZE", 1000))
+PAGE_MAX  = int(os.getenv("ELFINDER_PAGE_MAX", 10000))
+SORTS     = {"name": "name", "date": "mtime", "mtime": "mtime", "size": "size"}
+
+# uploads: largest file ("0" = no limit) and largest request body – elFinder
+# splits bigger files into chunks of a little less than the latter
+UPLOAD_MAX_SIZE    = os.getenv("ELFINDER_UPLOAD_MAX_SIZE", "0")
+UPLOAD_REQUEST_MAX = os.getenv("ELFINDER_UPLOAD_REQUEST_MAX", "16M")
+
+_CHUNK_NAME = re.compile(r"^(?P<name>.+)\.(?P<n>\d+)_(?P<last>\d+)\.part$")
+_MERGE_KEY  = re.compile(r"^elfinder\d+__[0-9a-f]{40}$")
+
+# zipdl: archives are streamed; already-compressed formats are only stored
+ZIP_JOB_TTL    = float(os.getenv("ELFINDER_ZIP_TTL", 3600))   # sec a job stays queryable
+ZIP_STORED_EXT = {
+    "jpg", "jpeg", "png", "gif", "webp", "heic", "mp4", "mkv", "mov", "avi",
+    "h264", "h265", "zip", "gz", "7z", "xz", "bz2",
+}
+
 
 # ────────────────────────── helpers ──────────────────────────────
 def _b64(s: str) -> str:
@@ -39,19 +80,374 @@ def _b64pad(s: str) -> str:
 
 
 def _driver_for(dev) -> BaseDriver:
-    """Instantiate the correct protocol driver for *dev*."""
+    """Instantiate the correct protocol driver for *dev* (behind the listing cache)."""
     params = dev.parameters or {}
     proto = params.get("protocol", "local").lower()
-    try:
-        return {"local": LocalDriver, "sftp": SFTPDriver}[proto](params)
-    except KeyError:  # unsupported protocol
+    if proto == "local":
+        if params.get("tier"):
+            drv = TieredLocalDriver(params, dev.id)   # includes migrated files
+        else:
+            drv = LocalDriver(params)
+    elif proto == "sftp":
+        drv = SFTPDriver(params, dev_id=dev.id)    # pooled session
+    else:
         raise ValueError(f"Unsupported protocol: {proto}")
+    return CachedDriver(drv, dev.id)
 
 
 def _hash(volumeid: str, rel: str) -> str:
     return f"{volumeid}_{_b64(rel or '/')}"
 
 
+@lru_cache(maxsize=512)
+def _mime_for_ext(ext: str) -> str:
+    return mimetypes.guess_type("x" + ext)[0] or "application/octet-stream"
+
+
+def _mime(name: str) -> str:
+    return _mime_for_ext(os.path.splitext(name)[1].lower())
+
+
+def _page_args(values, target: str):
+    """
+    Window requested for `open`:  sort=name|date|size, order=asc|desc and
+    either offset/limit or page (1-based)/limit.  The offset only applies
+    to the folder named in ``page_of`` (the hash it was chosen for), so
+    navigating into another folder starts at its first entries.
+    """
+    sort  = SORTS.get(values.get("sort", "name"), "name")
+    desc  = values.get("order", "asc") == "desc"
+    try:
+        limit = int(values.get("limit") or PAGE_SIZE)
+    except ValueError:
+        limit = PAGE_SIZE
+    limit = max(1, min(limit, PAGE_MAX))
+    offset = 0
+    if values.get("page_of", target) == target:
+        try:
+            if values.get("page"):
+                offset = (int(values["page"]) - 1) * limit
+            else:
+                offset = int(values.get("offset") or 0)
+        except ValueError:
+            offset = 0
+    return sort, desc, max(0, offset), limit
+
+
+def _set_disposition(resp: Response, name: str, as_attachment: bool) -> None:
+    try:
+        name.encode("ascii")
+        disposition = {"filename": name}
+    except UnicodeEncodeError:
+        disposition = {"filename*": "UTF-8''" + quote(name, safe="")}
+    resp.headers.set(
+        "Content-Disposition", "attachment" if as_attachment else "inline", **disposition
+    )
+
+
+def _stream_response(reader, name: str, mimetype: str, as_attachment: bool) -> Response:
+    """
+    Stream a seekable remote *reader*; werkzeug answers Range, If-Range and
+    conditional requests from its size and mtime and only the requested
+    window is read (videos seek, downloads resume).
+    """
+    resp = Response(
+        FileWrapper(reader, STREAM_CHUNK), mimetype=mimetype, direct_passthrough=True
+    )
+    resp.content_length = reader.size
+    resp.last_modified  = datetime.fromtimestamp(int(reader.mtime), timezone.utc)
+    resp.set_etag(f"{int(reader.mtime):x}-{reader.size:x}")
+    _set_disposition(resp, name, as_attachment)
+    try:
+        return resp.make_conditional(request, accept_ranges=True, complete_length=reader.size)
+    except BaseException:
+        reader.close()
+        raise
+
+
+# ─────────────────────── chunked uploads ─────────────────────────
+_assembler: ChunkAssembler = None
+_assembler_lock = threading.Lock()
+_last_expire = 0.0
+_claimed: set = set()                            # transfers handed back for merging
+
+
+def _chunks() -> ChunkAssembler:
+    """Shared assembler under STORAGE_CHUNK_DIR/elfinder (stale parts swept every minute)."""
+    global _assembler, _last_expire
+    with _assembler_lock:
+        if _assembler is None:
+            _assembler = ChunkAssembler(current_app.logger, os.path.join(CHUNK_DIR, "elfinder"))
+        if time.time() - _last_expire > 60:
+            _last_expire = time.time()
+            for key in _assembler.expire():
+                current_app.logger.warning("💾 abandoned elFinder upload %s removed", key)
+        return _assembler
+
+
+class _BlockReader:
+    """ChunkAssembler.chunk() reads until b"" – hand it the request 1 MiB at a time."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self) -> bytes:
+        return self.stream.read(1 << 20)
+
+
+class _PartFile:
+    """An assembled upload, shaped like the FileStorage drivers receive."""
+
+    def __init__(self, path: str, filename: str, folder: str = ""):
+        self.path = path
+        self.filename = filename
+        self.folder = folder                     # where the upload was started
+        self._fh = None
+
+    def read(self, size: int = -1) -> bytes:
+        if self._fh is None:
+            self._fh = open(self.path, "rb")
+        return self._fh.read(size)
+
+    def save(self, dst: str) -> None:
+        shutil.move(self.path, dst)              # a rename when on the same file system
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+
+
+def _check_upload_size(size: int) -> None:
+    limit = parse_bytes(UPLOAD_MAX_SIZE)
+    if limit and size > limit:
+        raise TransferError(f"file is larger than {UPLOAD_MAX_SIZE}")
+
+
+def _upload_size(f) -> int:
+    """Size of a plain (non-chunked) upload part – the part header if sent, else the spooled stream."""
+    if f.content_length:
+        return f.content_length
+    pos = f.stream.tell()
+    f.stream.seek(0, os.SEEK_END)
+    size = f.stream.tell()
+    f.stream.seek(pos)
+    return size
+
+
+def _store_chunk(dev_id, rel: str, chunk: str, rng: str, blob) -> Dict:
+    """
+    Write one piece of a chunked upload.  The transfer is keyed by device,
+    folder, name and size – not by elFinder's per-attempt ``cid`` – so the
+    pieces of an interrupted upload are kept (STORAGE_CHUNK_TTL) and a new
+    attempt only fills in what is missing.
+    """
+    m = _CHUNK_NAME.match(chunk)
+    if not m or blob is None:
+        raise TransferError("malformed chunk request")
+    try:
+        start, length, size = (int(x) for x in rng.split(","))
+    except ValueError:
+        raise TransferError(f"bad range {rng!r}")
+    _check_upload_size(size)
+
+    n, last = int(m["n"]), int(m["last"])
+    chunk_size = start // n if n else length
+    if n * chunk_size != start:
+        raise TransferError(f"chunk {n} does not start at a chunk boundary")
+    name = os.path.basename(m["name"])
+    ident = hashlib.sha1(f"{rel}\0{name}\0{size}".encode()).hexdigest()
+    asm = _chunks()
+    key = asm.key(f"elfinder{dev_id}", ident)
+
+    st = asm.state(key)
+    if st is not None and st["meta"].get("folder") != rel:
+        asm.discard(key)                         # started before the folder was recorded
+        st = None
+    if st is None or (st["meta"]["size"], st["meta"]["chunk_size"]) != (size, chunk_size):
+        st = asm.begin(key, {"name": name, "folder": rel, "size": size, "chunk_size": chunk_size})
+    if st["meta"]["chunks"] != last + 1:
+        raise TransferError(f"expected {st['meta']['chunks']} chunks, client sends {last + 1}")
+    asm.chunk(key, n, _BlockReader(blob.stream))
+
+    # the client merges once: only the request completing the set says so
+    with _assembler_lock:
+        if asm.missing(st) or key in _claimed:
+            return {"added": []}
+        _claimed.add(key)
+    return {"added": [], "_chunkmerged": key, "_name": name}
+
+
+def _check_merge_key(dev_id, key: str) -> None:
+    """A merge may only name a transfer of the device it is sent for."""
+    if not _MERGE_KEY.match(key) or not key.startswith(f"elfinder{dev_id}__"):
+        raise TransferError("unknown upload")
+
+
+def _merged_file(key: str) -> _PartFile:
+    part, meta, missing = _chunks().end(key, {})
+    if missing:
+        raise TransferError(f"upload incomplete – {len(missing)} chunks missing")
+    if "folder" not in meta:                     # begun before the folder was recorded
+        raise TransferError("unknown upload")
+    return _PartFile(part, meta["name"], meta["folder"])
+
+
+def _merge_done(key: str, ok: bool) -> None:
+    with _assembler_lock:
+        _claimed.discard(key)
+    if ok:
+        _chunks().discard(key)                   # a failed store keeps the parts for a retry
+
+
+# ───────────────────────── zip downloads ─────────────────────────
+_zip_jobs: Dict[str, dict] = {}                  # token → selection + progress
+_zip_lock = threading.Lock()
+
+
+def _new_zip_job(dev_id, rels: list) -> str:
+    now = time.time()
+    with _zip_lock:
+        for token in [t for t, j in _zip_jobs.items() if now - j["touched"] > ZIP_JOB_TTL]:
+            del _zip_jobs[token]
+        token = secrets.token_hex(16)
+        _zip_jobs[token] = {
+            "dev": dev_id, "targets": rels, "touched": now,
+            "state": "pending", "files": 0, "files_total": 0,
+            "bytes": 0, "bytes_total": 0, "skipped": 0,
+        }
+    return token
+
+
+def _zip_job(token: str):
+    with _zip_lock:
+        return _zip_jobs.get(token)
+
+
+def _zip_progress(job: dict) -> Dict:
+    return {k: v for k, v in job.items() if k not in ("dev", "targets", "touched")}
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable target for ZipFile; what it wrote so far is drained per block."""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _zip_entries(drv: BaseDriver, rels: list) -> list:
+    """``(rel, arcname, size, mtime)`` of every file in the selection, folders walked."""
+    out = []
+    for rel in rels:
+        base = os.path.dirname(rel)
+        cut = len(base) + 1 if base else 0
+        st = drv.stat(rel)
+        if not pystat.S_ISDIR(st.st_mode):
+            out.append((rel, os.path.basename(rel), st.st_size, int(st.st_mtime)))
+            continue
+        stack = [rel]
+        while stack:
+            folder = stack.pop()
+            subdirs = []
+            for name, _, is_dir, size, mtime in drv.sorted_listing(folder):
+                child = os.path.join(folder, name)
+                if is_dir:
+                    subdirs.append(child)
+                else:
+                    out.append((child, child[cut:], size, mtime))
+            stack.extend(reversed(subdirs))      # depth first, in name order
+    return out
+
+
+def _zip_source(drv: BaseDriver, rel: str):
+    path = drv.local_path(rel)
+    if path is not None:
+        return open(path, "rb")
+    reader = drv.open_stream(rel)
+    if reader is not None:
+        return reader
+    return _disk_copy(drv, rel)
+
+
+def _disk_copy(drv: BaseDriver, rel: str):
+    """
+    Cold tier: the backend only pushes into a file object – copy to an
+    unlinked temporary file, read back in blocks like any other file.
+    """
+    tmp = tempfile.TemporaryFile()
+    try:
+        drv.readfile(rel, tmp)
+        tmp.seek(0)
+    except BaseException:
+        tmp.close()
+        raise
+    return tmp
+
+
+def _zip_stream(drv: BaseDriver, job: dict):
+    """
+    Yield the ZIP of the job's selection block by block as files are read –
+    the archive is never staged and no file is held in memory (cold-tier
+    files pass through a temporary file, one at a time).  Progress is kept
+    on the job for ``cmd=zipdl&status=<token>``.
+    """
+    sink = _ZipSink()
+    try:
+        job["state"] = "listing"
+        entries = _zip_entries(drv, job["targets"])
+        job.update(state="streaming", files_total=len(entries),
+                   bytes_total=sum(e[2] for e in entries))
+        with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+            for rel, arcname, size, mtime in entries:
+                zi = zipfile.ZipInfo(arcname, time.localtime(max(mtime, 315532800))[:6])
+                ext = os.path.splitext(arcname)[1].lstrip(".").lower()
+                zi.compress_type = (zipfile.ZIP_STORED if ext in ZIP_STORED_EXT
+                                    else zipfile.ZIP_DEFLATED)
+                zi.file_size = size              # decides zip64 for big recordings
+                zi.external_attr = 0o644 << 16
+                try:
+                    src = _zip_source(drv, rel)
+                except OSError as exc:           # removed since the listing
+                    current_app.logger.warning("💾 zipdl: skipping %s: %s", rel, exc)
+                    job["skipped"] += 1
+                    continue
+                with src, zf.open(zi, "w") as dst:
+                    for block in iter(lambda: src.read(STREAM_CHUNK), b""):
+                        dst.write(block)
+                        job["bytes"] += len(block)
+                        data = sink.drain()
+                        if data:
+                            yield data
+                job["files"] += 1
+                job["touched"] = time.time()
+        yield sink.drain()                       # central directory
+        job["state"] = "done"
+    except GeneratorExit:
+        job["state"] = "aborted"                 # client went away
+        raise
+    except Exception:
+        job["state"] = "error"
+        current_app.logger.exception("💾 zipdl failed")
+        raise
+    finally:
+        job["touched"] = time.time()
+        current_app.logger.info(
+            "💾 zipdl %s: %d/%d files, %d bytes",
+            job["state"], job["files"], job["files_total"], job["bytes"],
+        )
+
+
 # ────────────────────────── main route ───────────────────────────
 @elfinder_bp.route("", methods=["GET", "POST"])
 def connector():
@@ -61,7 +457,16 @@ def connector():
 
     current_app.logger.debug("elFinder cmd=%s dev=%s target=%s", cmd, dev_id, target)
 
+    drv = None
+    keep_open = False  # a streamed download closes the driver when it is done
     try:
+        # progress of a streamed archive – needs no driver
+        if cmd == "zipdl" and request.values.get("status"):
+            job = _zip_job(request.values["status"])
+            if job is None:
+                return jsonify(error="errFileNotFound"), 404
+            return jsonify(_zip_progress(job))
+
         # ───── init device / driver ───────────────────────────────
         dev = Device.query.get_or_404(dev_id)
         drv = _driver_for(dev)
@@ -80,8 +485,12 @@ def connector():
             return "" if decoded in ("/", "") else decoded.lstrip("/")
 
         def listdir_for(rel_dir: str) -> Dict:
-            """Return cwd entry + children lists like elFinder's OPEN."""
-            cwd_abs = rel_dir
+            """Return cwd entry + one window of its children like elFinder's OPEN."""
+            sort, desc, offset, limit = _page_args(request.values, target)
+            entries = drv.sorted_listing(rel_dir, sort, desc)
+            total = len(entries)
+            if offset >= total:                  # folder shrank: last full window
+                offset = max(0, total - limit)
             # cwd meta
             st = drv.stat(rel_dir)
             cwd_entry = {
@@ -99,16 +508,24 @@ def connector():
             }
             if rel_dir:
                 cwd_entry["phash"] = _hash(volumeid, os.path.dirname(rel_dir))
+            # the window sent; elFinder keeps it on the cwd object for the pager
+            cwd_entry["page"] = {
+                "offset": offset,
+                "limit": limit,
+                "total": total,
+                "sort": sort,
+                "order": "desc" if desc else "asc",
+            }
 
             files = [cwd_entry]
-            # children
-            for name, full, is_dir, size, mtime in drv.listdir(rel_dir):
+            # children – mime types only for the window sent
+            for name, full, is_dir, size, mtime in entries[offset:offset + limit]:
                 files.append(
                     {
                         "hash": _hash(volumeid, os.path.join(rel_dir, name)),
                         "phash": cwd_entry["hash"],
                         "name": name,
-                        "mime": "directory" if is_dir else (mimetypes.guess_type(full)[0] or "application/octet-stream"),
+                        "mime": "directory" if is_dir else _mime(name),
                         "ts": mtime,
                         "size": size,
                         "dirs": 1 if is_dir else 0,
@@ -119,7 +536,7 @@ def connector():
                     }
                 )
             return {
-                "api": 2.1,
+                "api": 2.1012,                   # ≥ 2.1012: clients offer zipdl
                 "cwd": cwd_entry,
                 "files": files,
                 "options": {
@@ -127,10 +544,11 @@ def connector():
                     "url": "",
                     "tmbUrl": "",
                     "disabled": [],
-                    "uploadMaxSize": "64M",
+                    "uploadMaxSize": UPLOAD_MAX_SIZE,
                 },
                 "netDrivers": [],
                 "tree": [f for f in files if f.get("dirs")],
+                "uplMaxSize": UPLOAD_REQUEST_MAX,
             }
 
         # ───── command switch ─────────────────────────────────────
@@ -142,12 +560,9 @@ def connector():
         if cmd == "tree":
             rel = resolve_hash(target)
             nodes = []
-            for name, full, is_dir, _, mtime in drv.listdir(rel):
-                if not is_dir:
-                    continue
+            # one listing for the level; has-subdirs from the driver, not a listdir per child
+            for (name, full, is_dir, _, mtime), has_sub in drv.tree(rel):
                 child_rel = os.path.join(rel, name)
-                # has subdirs?
-                has_sub = any(ent[2] for ent in drv.listdir(child_rel))
                 nodes.append(
                     {
                         "hash": _hash(volumeid, child_rel),
@@ -240,18 +655,49 @@ def connector():
 
         if cmd == "upload":
             rel = resolve_hash(target)
-            files = request.files.getlist("upload[]") or request.files.getlist("files[]")
+            chunk = request.values.get("chunk", "")
+            if chunk and "chunkfail" in request.values.getlist("upload[]"):
+                return jsonify(added=[])         # client gave up – parts stay for a retry
+            if chunk and request.values.get("cid"):
+                return jsonify(_store_chunk(
+                    dev.id, rel, chunk, request.values.get("range", ""),
+                    request.files.get("upload[]"),
+                ))
+            stored = []
+            if chunk:                            # all pieces are in – store the whole file
+                _check_merge_key(dev.id, chunk)
+                part = None
+                try:
+                    part = _merged_file(chunk)
+                    rel = part.folder            # not the target of this request
+                    drv.upload(part, os.path.join(rel, part.filename))
+                except BaseException:
+                    _merge_done(chunk, False)
+                    raise
+                finally:
+                    if part is not None:
+                        part.close()
+                _merge_done(chunk, True)
+                stored.append(part.filename)
+            else:
+                files = request.files.getlist("upload[]") or request.files.getlist("files[]")
+                limit = parse_bytes(UPLOAD_MAX_SIZE)
+                if limit and (request.content_length or 0) > limit:
+                    for f in files:              # check all before storing any
+                        _check_upload_size(_upload_size(f))
+                for f in files:
+                    fn = os.path.basename(f.filename)
+                    drv.upload(f, os.path.join(rel, fn))
+                    stored.append(fn)
             added = []
-            for f in files:
-                fn = os.path.basename(f.filename)
-                drv.upload(f, os.path.join(rel, fn))
+            for fn in stored:
                 st = drv.stat(os.path.join(rel, fn))
                 added.append(
                     {
                         "hash": _hash(volumeid, os.path.join(rel, fn)),
                         "phash": _hash(volumeid, rel),
                         "name": fn,
-                        "mime": mimetypes.guess_type(fn)[0] or "application/octet-stream",
+                        "mime": _mime(fn),
                         "ts": int(st.st_mtime),
                         "size": st.st_size,
                         "dirs": 0,
@@ -310,28 +756,82 @@ def connector():
 
         if cmd in ("file", "download"):
             rel = resolve_hash(target)
-            mime = mimetypes.guess_type(rel)[0] or "application/octet-stream"
-            buf = io.BytesIO()
-            drv.readfile(rel, buf)
-            buf.seek(0)
             as_attach = cmd == "download"
-            return send_file(
-                buf,
-                mimetype=mime if not as_attach else "application/octet-stream",
-                as_attachment=as_attach,
-                download_name=os.path.basename(rel),
-            )
+            mime = "application/octet-stream" if as_attach else _mime(rel)
+            name = os.path.basename(rel)
+
+            # local file: sendfile from the path, Range / conditional by werkzeug
+            path = drv.local_path(rel)
+            if path is not None:
+                return send_file(
+                    path, mimetype=mime, as_attachment=as_attach,
+                    download_name=name, conditional=True,
+                )
+
+            # remote file: streamed in windows while the session stays leased
+            reader = drv.open_stream(rel)
+            if reader is not None:
+                resp = _stream_response(reader, name, mime, as_attach)
+                resp.call_on_close(drv.close)
+                keep_open = True
+                return resp
+
+            # anything else (cold tier copies): through a temporary file,
+            # streamed like a remote reader so Range keeps working
+            tmp = _disk_copy(drv, rel)
+            try:
+                tmp.size  = os.fstat(tmp.fileno()).st_size
+                tmp.mtime = drv.stat(rel).st_mtime
+            except BaseException:
+                tmp.close()
+                raise
+            return _stream_response(tmp, name, mime, as_attach)
+
+        if cmd == "zipdl":
+            targets = request.values.getlist("targets[]")
+            if request.values.get("download"):
+                # second step: targets = [cwd hash, token, download name, mime]
+                _, token, dl_name, _ = (targets + ["", "", "", ""])[:4]
+                job = _zip_job(token)
+                if job is None or job["dev"] != dev.id:
+                    return jsonify(error="errFileNotFound"), 404
+                resp = Response(
+                    stream_with_context(_zip_stream(drv, job)), mimetype="application/zip"
+                )
+                _set_disposition(resp, os.path.basename(dl_name) or "files.zip", True)
+                resp.call_on_close(drv.close)
+                keep_open = True
+                return resp
+
+            # first step: remember the selection, the archive is built while sent
+            rels = [resolve_hash(h) for h in targets]
+            if not rels:
+                return jsonify(error="errCmdParams"), 400
+            if len(rels) == 1:
+                name = os.path.basename(rels[0])
+            else:
+                name = os.path.basename(os.path.dirname(rels[0]))
+            token = _new_zip_job(dev.id, rels)
+            return jsonify(zipdl={
+                "file": token,
+                "name": f"{name or 'files'}.zip",
+                "mime": "application/zip",
+            })
 
         # ───── unsupported / default ───────────────────────────────
         return jsonify(error=f"Unsupported command: {cmd}"), 400
 
+    except RequestedRangeNotSatisfiable as exc:
+        return exc.get_response()
+
     except Exception as exc:
         tb = traceback.format_exc()
         current_app.logger.error("elFinder error: %s\n%s", exc, tb)
         return jsonify(error=str(exc)), 500
 
     finally:
-        try:
-            drv.close()
-        except Exception:  # noqa: BLE001
-            pass
+        if drv is not None and not keep_open:
+            try:
+                drv.close()
+            except Exception:  # noqa: BLE001
+                pass
@@ -1,7 +1,10 @@
 # routes/storage.py
 
 from flask import Blueprint
-from controllers.storage import list_devices, browse_files, delete_file
+from controllers.storage import (
+    list_devices, browse_files, delete_file, spool_status, spool_retry,
+    worker_metrics, dedup_stats, storage_usage, search_files,
+)
 
 storage_bp = Blueprint('storage', __name__, url_prefix='/storage')
 
@@ -19,3 +22,31 @@ storage_bp.add_url_rule(
 storage_bp.add_url_rule(
     '/<int:dev_id>/delete', 'delete_file', delete_file, methods=['POST']
 )
+
+# Upload spool status / manual retry
+storage_bp.add_url_rule(
+    '/spool', 'spool_status', spool_status, methods=['GET']
+)
+storage_bp.add_url_rule(
+    '/spool/retry', 'spool_retry', spool_retry, methods=['POST']
+)
+
+# Per-device worker pool metrics
+storage_bp.add_url_rule(
+    '/workers', 'worker_metrics', worker_metrics, methods=['GET']
+)
+
+# Dedup ratio of a content-addressed local device
+storage_bp.add_url_rule(
+    '/<int:dev_id>/dedup', 'dedup_stats', dedup_stats, methods=['GET']
+)
+
+# Disk usage / retention state (see "retention" in the device parameters)
+storage_bp.add_url_rule(
+    '/<int:dev_id>/usage', 'storage_usage', storage_usage, methods=['GET']
+)
+
+# Catalogue search (time range / source / name)
+storage_bp.add_url_rule(
+    '/catalog', 'search_files', search_files, methods=['GET']
+)
@@ -3,6 +3,7 @@ Protocol drivers for the elFinder connector, with debug prints.
 
 Every driver implements a common set of file-ops used by elFinder:
     listdir, stat, mkdir, upload, remove, rename, readfile
+(downloads prefer local_path / open_stream over readfile when offered)
 All paths passed to a driver are absolute *inside the driver’s own root*
 so the caller never worries about escaping the storage sandbox.
 """
@@ -11,15 +12,23 @@ from __future__ import annotations
 
 import os
 import io
+import time
 import shutil
+import threading
 import stat as pystat
 import mimetypes
+from collections import OrderedDict
 from pathlib import Path
 from typing import Iterator, Tuple
 
-import paramiko
 from flask import current_app
 
+from storage_pool import get_pool
+
+LISTING_CACHE_SIZE = int(os.getenv("STORAGE_LISTING_CACHE", 2048))    # entries
+LISTING_TTL        = float(os.getenv("STORAGE_LISTING_TTL", 15))      # sec (remote)
+STREAM_CHUNK       = int(os.getenv("STORAGE_STREAM_CHUNK", 1 << 20))  # bytes per remote read
+
 
 # ─────────────────────────── Base API ────────────────────────────
 DirEntry = Tuple[str, str, bool, int, int]
@@ -31,6 +40,14 @@ class BaseDriver:
 
     root: str  # absolute path of the driver’s root
 
+    # listing cache validation (see CachedDriver): None → dir_token(),
+    # otherwise entries are trusted for this many seconds
+    cache_ttl = None
+
+    def dir_token(self, path: str):
+        """Cheap value that changes whenever the directory content does."""
+        raise NotImplementedError
+
     def close(self) -> None:
         """Release any underlying resources (SSH connections…)."""
         pass
@@ -56,6 +73,42 @@ class BaseDriver:
     def readfile(self, path: str, out_buf: io.BytesIO) -> None:
         raise NotImplementedError
 
+    def local_path(self, path: str):
+        """Absolute path of the file on this machine (sent zero-copy), or None."""
+        return None
+
+    def open_stream(self, path: str):
+        """Seekable reader with ``size`` / ``mtime`` for streaming, or None."""
+        return None
+
+    def has_subdirs(self, path: str) -> bool:
+        return any(entry[2] for entry in self.listdir(path))
+
+    def tree(self, path: str):
+        """
+        Child directories of *path* as ``[(DirEntry, has_subdirs)]``;
+        *has_subdirs* is None where the driver cannot tell without a probe.
+        """
+        return [(entry, None) for entry in self.listdir(path) if entry[2]]
+
+    def sorted_listing(self, path: str, sort: str = "name", reverse: bool = False) -> list:
+        """Listing of *path*, folders first, each group ordered by *sort*."""
+        return sort_entries(list(self.listdir(path)), sort, reverse)
+
+
+SORT_KEYS = {
+    "name":  lambda e: (e[0].lower(), e[0]),
+    "mtime": lambda e: (e[4], e[0].lower()),
+    "size":  lambda e: (e[3], e[0].lower()),
+}
+
+
+def sort_entries(entries: list, sort: str = "name", reverse: bool = False) -> list:
+    key = SORT_KEYS.get(sort, SORT_KEYS["name"])
+    dirs  = sorted((e for e in entries if e[2]), key=key, reverse=reverse)
+    files = sorted((e for e in entries if not e[2]), key=key, reverse=reverse)
+    return dirs + files
+
 
 # ─────────────────────────── Local FS ────────────────────────────
 class LocalDriver(BaseDriver):
@@ -76,90 +129,214 @@ class LocalDriver(BaseDriver):
         # ensure it exists
         self.root.mkdir(parents=True, exist_ok=True)
         current_app.logger.debug("LocalDriver root resolved to: %s", self.root)
+        self._root  = str(self.root)
+        self._paths: dict = {}                   # rel → resolved absolute path
 
-    def _abs(self, rel: str) -> Path:
-        p = (self.root / rel.lstrip("/")).resolve()
-        if self.root not in p.parents and p != self.root:
-            current_app.logger.warning("LocalDriver access denied to: %s", p)
-            raise PermissionError("Access denied")
+    def _abs(self, rel: str) -> str:
+        """Absolute path of *rel* inside the root (resolved once per path and request)."""
+        rel = (rel or "").lstrip("/")
+        p = self._paths.get(rel)
+        if p is None:
+            p = os.path.realpath(os.path.join(self._root, rel))
+            if p != self._root and not p.startswith(self._root + os.sep):
+                current_app.logger.warning("LocalDriver access denied to: %s", p)
+                raise PermissionError("Access denied")
+            self._paths[rel] = p
         return p
 
     def listdir(self, path: str):
         current_app.logger.debug("LocalDriver.listdir: %s", path)
-        abs_dir = self._abs(path)
-        for child in abs_dir.iterdir():
-            if child.name.startswith("."):
-                continue
-            st = child.stat()
-            yield (child.name, str(child), child.is_dir(),
-                   st.st_size, int(st.st_mtime))
+        # one stat per entry (DirEntry caches it); the type comes from the same stat
+        with os.scandir(self._abs(path)) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:        # removed meanwhile / dangling link
+                    continue
+                yield (entry.name, entry.path, pystat.S_ISDIR(st.st_mode),
+                       st.st_size, int(st.st_mtime))
 
     def stat(self, path: str):
         current_app.logger.debug("LocalDriver.stat: %s", path)
-        return self._abs(path).stat()
+        return os.stat(self._abs(path))
 
     def mkdir(self, path: str):
         current_app.logger.debug("LocalDriver.mkdir: %s", path)
-        self._abs(path).mkdir(parents=True, exist_ok=True)
+        os.makedirs(self._abs(path), exist_ok=True)
 
     def upload(self, fileobj, dest_path: str):
         current_app.logger.debug("LocalDriver.upload: %s", dest_path)
         dest = self._abs(dest_path)
+        if os.path.lexists(dest):
+            os.unlink(dest)     # may be a dedup hard link – never write through it
         fileobj.save(dest)
 
     def remove(self, path: str):
         current_app.logger.debug("LocalDriver.remove: %s", path)
         p = self._abs(path)
-        if p.is_dir():
-            p.rmdir()
+        if os.path.isdir(p):
+            os.rmdir(p)
         else:
-            p.unlink()
+            os.unlink(p)
 
     def rename(self, src: str, dst: str, copy: bool = False):
         current_app.logger.debug("LocalDriver.rename: %s -> %s (copy=%s)", src, dst, copy)
         a_src = self._abs(src)
         a_dst = self._abs(dst)
         if copy:
-            if a_src.is_dir():
+            if os.path.isdir(a_src):
                 shutil.copytree(a_src, a_dst)
             else:
-                shutil.copy2(a_src, a_dst)
+                # copy under a side name, then swap it in – an existing a_dst
+                # may be a dedup hard link and must not be written through
+                side = a_dst + ".copy"
+                try:
+                    shutil.copy2(a_src, side)
+                    os.replace(side, a_dst)
+                except BaseException:
+                    if os.path.lexists(side):
+                        os.remove(side)
+                    raise
         else:
-            a_src.rename(a_dst)
+            os.rename(a_src, a_dst)
 
     def readfile(self, path: str, out_buf: io.BytesIO):
         current_app.logger.debug("LocalDriver.readfile: %s", path)
-        with self._abs(path).open("rb") as f:
+        with open(self._abs(path), "rb") as f:
             shutil.copyfileobj(f, out_buf)
 
+    def local_path(self, path: str):
+        return self._abs(path)
+
+    def dir_token(self, path: str):
+        return os.stat(self._abs(path)).st_mtime_ns
+
+    def has_subdirs(self, path: str) -> bool:
+        # DirEntry.is_dir() comes from d_type – no stat, stops at the first hit
+        with os.scandir(self._abs(path)) as it:
+            return any(not e.name.startswith(".") and e.is_dir() for e in it)
+
+    def tree(self, path: str):
+        return [(entry, self.has_subdirs(os.path.join(path, entry[0])))
+                for entry in self.listdir(path) if entry[2]]
+
+
+# ─────────────────────── Local + cold tier ───────────────────────
+class TieredLocalDriver(LocalDriver):
+    """
+    Local device with a cold tier: files the tier migrator moved away
+    (see controllers/storage_tiering.py) stay listed under their old path
+    and are read from / deleted on the remote device.
+    """
+
+    def __init__(self, params: dict, dev_id: int):
+        super().__init__(params)
+        self.dev_id = dev_id
+
+    def _row(self, path: str):
+        from controllers.storage_tiering import tiered_file
+        return tiered_file(self.dev_id, path.strip("/"))
+
+    def listdir(self, path: str):
+        from controllers.storage_tiering import tiered_entries
+        seen = set()
+        for entry in super().listdir(path):
+            seen.add(entry[0])
+            yield entry
+        for row in tiered_entries(self.dev_id, path.strip("/")):
+            if row.name not in seen:             # a newer local copy wins
+                yield (row.name, self._abs(row.path), False, row.size, row.mtime)
+
+    def stat(self, path: str):
+        try:
+            return super().stat(path)
+        except FileNotFoundError:
+            row = self._row(path)
+            if row is None:
+                raise
+            return os.stat_result((pystat.S_IFREG | 0o444, 0, 0, 1, 0, 0,
+                                   row.size, row.mtime, row.mtime, row.mtime))
+
+    def remove(self, path: str):
+        if os.path.exists(self._abs(path)):
+            return super().remove(path)
+        row = self._row(path)
+        if row is None:
+            raise FileNotFoundError(path)
+        from controllers.storage_tiering import remove_tiered
+        current_app.logger.debug("TieredLocalDriver.remove (cold): %s", path)
+        remove_tiered(row)
+
+    def rename(self, src: str, dst: str, copy: bool = False):
+        if os.path.exists(self._abs(src)):
+            return super().rename(src, dst, copy)
+        row = self._row(src)
+        if row is None:
+            raise FileNotFoundError(src)
+        if copy:
+            raise PermissionError("file is on the cold tier – move it instead of copying")
+        from extensions import db
+        from controllers.storage_tiering import split_rel
+        row.folder, row.name = split_rel(dst.strip("/"))
+        db.session.commit()
+
+    def readfile(self, path: str, out_buf: io.BytesIO):
+        if os.path.exists(self._abs(path)):
+            return super().readfile(path, out_buf)
+        row = self._row(path)
+        if row is None:
+            raise FileNotFoundError(path)
+        from controllers.storage_tiering import read_tiered
+        current_app.logger.debug("TieredLocalDriver.readfile (cold): %s", path)
+        read_tiered(row, out_buf)
+
+    def local_path(self, path: str):
+        p = self._abs(path)
+        return p if os.path.exists(p) else None   # cold copies go through readfile
+
 
 # ─────────────────────────── SFTP driver ─────────────────────────
+def _subdirs_from_longname(longname: str):
+    """True / False from the link count of ``drwxr-xr-x 5 …``; None if unusable."""
+    parts = (longname or "").split(None, 2)
+    if len(parts) < 2 or not parts[1].isdigit():
+        return None
+    nlink = int(parts[1])
+    return nlink > 2 if nlink >= 2 else None   # btrfs & co. always report 1
+
 
 class SFTPDriver(BaseDriver):
-    def __init__(self, params: dict):
+    cache_ttl = LISTING_TTL                      # no cheap validator over SFTP
+
+    def __init__(self, params: dict, dev_id=None):
         current_app.logger.debug("SFTPDriver init params: %s", params)
         self.host     = params.get("host")
         self.port     = int(params.get("port", 22))
         self.username = params.get("username")
-        self.password = params.get("password")
         raw_root      = (params.get("root_path") or "").strip().rstrip("/")
 
-        # connect
-        self.ssh = paramiko.SSHClient()
-        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        current_app.logger.debug("SFTPDriver connecting to %s@%s:%d …",
-                                 self.username, self.host, self.port)
-        self.ssh.connect(
-            hostname=self.host,
-            port=self.port,
-            username=self.username,
-            password=self.password,
-            allow_agent=False,
-            look_for_keys=False,
-            timeout=10,
-        )
-        self.sftp = self.ssh.open_sftp()
-
+        # pooled keep-alive session; returned to the pool by close()
+        pool = get_pool()
+        self._lease = pool.lease_sftp(dev_id, params)
+        self._sess  = self._lease.__enter__()
+        self.sftp   = self._sess.sftp
+
+        # the resolved root is remembered per session
+        cached = self._sess.meta.get("driver_root")
+        if cached and cached[0] == raw_root:
+            self.root = cached[1]
+            return
+        try:
+            self._resolve_root(raw_root)
+        except BaseException:
+            self.close()
+            raise
+        self._sess.meta["driver_root"] = (raw_root, self.root)
+
+    def _resolve_root(self, raw_root: str):
+        """Pick the configured root (absolute, so pooled sessions can share it)."""
         # figure out home dir (may fail or return None)
         try:
             home = self.sftp.getcwd()
@@ -174,7 +351,7 @@ class SFTPDriver(BaseDriver):
         if raw_root:
             try:
                 self.sftp.chdir(raw_root)
-                self.root = raw_root
+                self.root = self.sftp.getcwd() or raw_root
                 current_app.logger.debug("SFTPDriver.chdir success: %s", raw_root)
             except Exception as e:
                 current_app.logger.warning("SFTPDriver.chdir(%s) failed: %s – falling back to home", raw_root, e)
@@ -189,11 +366,7 @@ class SFTPDriver(BaseDriver):
             current_app.logger.debug("No root_path given; using home as root: %s", home)
 
         # inspect final root
-        try:
-            entries = self.sftp.listdir(self.root)
-            current_app.logger.debug("SFTPDriver final root=%s, contents=%s", self.root, entries)
-        except Exception as e:
-            current_app.logger.error("Failed to list SFTP root %s: %s", self.root, e, exc_info=True)
+        current_app.logger.debug("SFTPDriver final root=%s", self.root)
 
     def _abs(self, rel: str) -> str:
         # Treat None as empty → always return a string
@@ -215,6 +388,22 @@ class SFTPDriver(BaseDriver):
                 int(attr.st_mtime),
             )
 
+    def tree(self, path: str):
+        """
+        One LIST for the whole level: on POSIX servers the link count in
+        the ``ls -l`` style longname is 2 + number of subdirectories.
+        """
+        current_app.logger.debug("SFTPDriver.tree: %r", path)
+        abs_dir = self._abs(path)
+        nodes = []
+        for attr in self.sftp.listdir_attr(abs_dir):
+            if attr.filename.startswith(".") or not pystat.S_ISDIR(attr.st_mode):
+                continue
+            entry = (attr.filename, f"{abs_dir}/{attr.filename}", True,
+                     attr.st_size, int(attr.st_mtime))
+            nodes.append((entry, _subdirs_from_longname(getattr(attr, "longname", ""))))
+        return nodes
+
     def stat(self, path: str):
         current_app.logger.debug("SFTPDriver.stat: %r", path)
         return self.sftp.stat(self._abs(path))
@@ -225,9 +414,8 @@ class SFTPDriver(BaseDriver):
 
     def upload(self, fileobj, dest_path: str):
         current_app.logger.debug("SFTPDriver.upload: %r", dest_path)
-        buf = io.BytesIO(fileobj.read())
-        buf.seek(0)
-        self.sftp.putfo(buf, self._abs(dest_path))
+        # streamed in 32 KiB pipelined writes – no copy of the file in memory
+        self.sftp.putfo(fileobj, self._abs(dest_path))
 
     def remove(self, path: str):
         current_app.logger.debug("SFTPDriver.remove: %r", path)
@@ -252,9 +440,270 @@ class SFTPDriver(BaseDriver):
         current_app.logger.debug("SFTPDriver.readfile: %r", path)
         self.sftp.getfo(self._abs(path), out_buf)
 
+    def open_stream(self, path: str):
+        current_app.logger.debug("SFTPDriver.open_stream: %r", path)
+        return SFTPReader(self.sftp.open(self._abs(path), "rb"))
+
     def close(self):
         current_app.logger.debug("SFTPDriver.close")
+        lease, self._lease = getattr(self, "_lease", None), None
+        if lease is not None:
+            lease.__exit__(None, None, None)
+
+
+class SFTPReader(io.RawIOBase):
+    """
+    Seekable read-only view of a remote file.  Each read() asks for its
+    whole range at once as pipelined 32 KiB requests (``readv``) instead
+    of one round trip per request, and nothing is fetched outside the
+    ranges actually read – seeking into a video costs no download.
+    """
+
+    PIECE = 32768                                # paramiko's max request size
+
+    def __init__(self, fh):
+        self.fh    = fh
+        st         = fh.stat()                   # fresh – never from the listing cache
+        self.size  = st.st_size
+        self.mtime = st.st_mtime
+        self.pos   = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.pos, io.SEEK_END: self.size}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def read(self, n: int = -1) -> bytes:
+        end = self.size if n is None or n < 0 else min(self.size, self.pos + n)
+        if self.pos >= end:
+            return b""
+        pieces = [(off, min(self.PIECE, end - off)) for off in range(self.pos, end, self.PIECE)]
+        data = b"".join(self.fh.readv(pieces))
+        self.pos += len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                self.fh.close()
+            finally:
+                super().close()
+
+
+# ─────────────────────────── listing cache ───────────────────────
+class ListingCache:
+    """Process-wide LRU of directory listings (and remote stats)."""
+
+    def __init__(self, size: int = LISTING_CACHE_SIZE):
+        self.size   = size
+        self.hits   = 0
+        self.misses = 0
+        self._lock  = threading.Lock()
+        self._data: OrderedDict = OrderedDict()  # (volume, kind, rel) → (token, value)
+
+    def get(self, key):
+        with self._lock:
+            ent = self._data.get(key)
+            if ent is not None:
+                self._data.move_to_end(key)
+            return ent
+
+    def put(self, key, token, value) -> None:
+        with self._lock:
+            self._data[key] = (token, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def invalidate(self, volume, rel: str, subtree: bool = False) -> None:
+        prefix = rel + "/" if rel else ""
+        with self._lock:
+            for key in list(self._data):
+                if key[0] != volume:
+                    continue
+                if key[2] == rel or (subtree and key[2].startswith(prefix)):
+                    del self._data[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "size": self.size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+listing_cache = ListingCache()
+
+
+def _norm(path: str) -> str:
+    path = os.path.normpath(path or "").replace("\\", "/").strip("/")
+    return "" if path == "." else path
+
+
+class CachedDriver(BaseDriver):
+    """
+    Wraps a driver with `listing_cache`.  Local listings are validated by
+    the directory mtime (one stat instead of a full listing, so writes from
+    other processes show up at once); remote listings and stats are trusted
+    for `cache_ttl` seconds.  Changes made through this wrapper invalidate
+    the affected entries immediately.
+    """
+
+    def __init__(self, inner: BaseDriver, volume):
+        self.inner  = inner
+        self.volume = (volume, str(inner.root))
+        self.root   = inner.root
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def close(self) -> None:
+        self.inner.close()
+
+    # ------------------------------------------------------------------ reads
+    def listdir(self, path: str):
+        return iter(self._listing(_norm(path)))
+
+    def _listing(self, rel: str) -> list:
+        """The (cached) listing of *rel* – shared, never modify it."""
+        key = (self.volume, "ls", rel)
+        ent = listing_cache.get(key)
+        ttl = self.inner.cache_ttl
+
+        if ttl is None:
+            token = self.inner.dir_token(rel)
+            if ent is not None and ent[0] == token:
+                listing_cache.count(True)
+                return ent[1]
+            items = list(self.inner.listdir(rel))
+            # a change within the file system's mtime granularity would go unseen
+            if time.time() - token / 1e9 > 2:
+                listing_cache.put(key, token, items)
+            elif ent is not None:
+                listing_cache.invalidate(self.volume, rel)
+        else:
+            if ent is not None and time.time() - ent[0] < ttl:
+                listing_cache.count(True)
+                return ent[1]
+            items = list(self.inner.listdir(rel))
+            listing_cache.put(key, time.time(), items)
+        listing_cache.count(False)
+        return items
+
+    def sorted_listing(self, path: str, sort: str = "name", reverse: bool = False) -> list:
+        """
+        Sorted view of the cached listing, itself cached next to it: paging
+        through a 100k-file folder sorts it once, not once per page.
+        """
+        rel   = _norm(path)
+        items = self._listing(rel)
+        key   = (self.volume, f"sort:{sort}:{int(reverse)}", rel)
+        ent   = listing_cache.get(key)
+        if ent is not None and ent[0] is items:   # built from this very listing
+            return ent[1]
+        ordered = sort_entries(items, sort, reverse)
+        listing_cache.put(key, items, ordered)
+        return ordered
+
+    def stat(self, path: str):
+        ttl = self.inner.cache_ttl
+        if ttl is None:                          # local stat is a syscall
+            return self.inner.stat(path)
+        rel = _norm(path)
+        key = (self.volume, "st", rel)
+        ent = listing_cache.get(key)
+        if ent is not None and time.time() - ent[0] < ttl:
+            listing_cache.count(True)
+            return ent[1]
+        st = self.inner.stat(rel)
+        listing_cache.put(key, time.time(), st)
+        listing_cache.count(False)
+        return st
+
+    def readfile(self, path: str, out_buf: io.BytesIO) -> None:
+        self.inner.readfile(path, out_buf)
+
+    def local_path(self, path: str):
+        return self.inner.local_path(path)
+
+    def open_stream(self, path: str):
+        return self.inner.open_stream(path)
+
+    def has_subdirs(self, path: str) -> bool:
+        return self.inner.has_subdirs(path)
+
+    def tree(self, path: str):
+        rel = _norm(path)
+        ttl = self.inner.cache_ttl
+        if ttl is None:                          # local: cached listing + scandir probes
+            return [(entry, self.inner.has_subdirs(os.path.join(rel, entry[0])))
+                    for entry in self.listdir(rel) if entry[2]]
+
+        key = (self.volume, "tree", rel)
+        ent = listing_cache.get(key)
+        if ent is not None and time.time() - ent[0] < ttl:
+            listing_cache.count(True)
+            return ent[1]
+        nodes = []
+        for entry, has_sub in self.inner.tree(rel):
+            if has_sub is None:
+                # probe through the cache: expanding that folder next is free
+                has_sub = any(e[2] for e in self.listdir(os.path.join(rel, entry[0])))
+            nodes.append((entry, has_sub))
+        listing_cache.put(key, time.time(), nodes)
+        listing_cache.count(False)
+        return nodes
+
+    # ---------------------------------------------------------------- writes
+    def _touched(self, path: str, subtree: bool = False) -> None:
+        rel    = _norm(path)
+        parent = _norm(os.path.dirname(rel))
+        listing_cache.invalidate(self.volume, rel, subtree)
+        listing_cache.invalidate(self.volume, parent)
+        if parent:                               # its has_subdirs flag may change
+            listing_cache.invalidate(self.volume, _norm(os.path.dirname(parent)))
+
+    def mkdir(self, path: str) -> None:
+        try:
+            self.inner.mkdir(path)
+        finally:
+            self._touched(path)
+
+    def upload(self, fileobj, dest_path: str) -> None:
+        try:
+            self.inner.upload(fileobj, dest_path)
+        finally:
+            self._touched(dest_path)
+
+    def remove(self, path: str) -> None:
+        try:
+            self.inner.remove(path)
+        finally:
+            self._touched(path, subtree=True)
+
+    def rename(self, src: str, dst: str, copy: bool = False) -> None:
         try:
-            self.sftp.close()
+            self.inner.rename(src, dst, copy)
         finally:
-            self.ssh.close()
+            self._touched(dst, subtree=True)
+            if not copy:
+                self._touched(src, subtree=True)
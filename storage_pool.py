@@ -0,0 +1,310 @@
+"""
+Keep-alive FTP / SFTP sessions shared by the StorageManager and the
+elFinder drivers.
+
+Sessions are pooled per storage device (plus the credentials they were
+opened with) and handed out one caller at a time:
+
+    with get_pool().lease_ftp(dev.id, params) as sess:
+        sess.ftp.storbinary(...)
+
+* a session idle for longer than `STORAGE_POOL_HEALTH_SEC` is probed
+  (NOOP / stat) before reuse; a dead one is closed and replaced, so
+  callers never see a connection the server dropped in the meantime
+* at most `STORAGE_POOL_MAX_PER_HOST` sessions are open per host:port;
+  further callers wait up to `STORAGE_POOL_WAIT` seconds
+* idle sessions are closed after `STORAGE_POOL_IDLE_SEC`
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import ftplib
+import threading
+from contextlib import contextmanager
+
+try:
+    import paramiko          # SFTP support
+except ImportError:
+    paramiko = None
+
+
+POOL_MAX_PER_HOST = int(os.getenv("STORAGE_POOL_MAX_PER_HOST", 4))
+POOL_IDLE_SEC     = float(os.getenv("STORAGE_POOL_IDLE_SEC",   120))
+POOL_HEALTH_SEC   = float(os.getenv("STORAGE_POOL_HEALTH_SEC", 15))
+POOL_WAIT         = float(os.getenv("STORAGE_POOL_WAIT",       30))
+
+
+class LoggingFTP(ftplib.FTP):
+    """ftplib that logs via the given logger instead of print()."""
+    def __init__(self, logger, *a, **kw):
+        self._logger = logger
+        super().__init__(*a, **kw)
+
+    # python 3.12 removed the internal prints; we still override for safety
+    def _print_debug(self, *msgs):
+        self._logger.debug("[FTP dbg] %s", " ".join(str(m) for m in msgs))
+
+
+# ───────────────────────────── sessions ───────────────────────────────
+class _Session:
+    def __init__(self, key: tuple, host: str):
+        self.key       = key
+        self.host      = host
+        self.last_used = time.time()
+        self.meta: dict = {}                 # per-connection caches of the callers
+
+    def probe(self) -> bool:
+        """One round trip; False when the connection is gone."""
+        raise NotImplementedError
+
+    def reset(self) -> bool:
+        """Undo per-caller state before the session goes back to the pool."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+
+class FTPSession(_Session):
+    def __init__(self, key: tuple, params: dict, logger):
+        host = params["host"]
+        port = int(params.get("port", 21))
+        super().__init__(key, f"{host}:{port}")
+
+        ftp = LoggingFTP(logger)
+        ftp.set_debuglevel(2)
+        logger.debug("[FTP] connect %s:%s user=%s", host, port, params.get("username"))
+        ftp.connect(host, port, timeout=30)
+        ftp.login(params.get("username"), params.get("password"))
+        ftp.set_pasv(params.get("passive_mode", True))
+        self.ftp   = ftp
+        self.home  = ftp.pwd()
+        self.moved = False                   # set by callers that cwd()
+        logger.debug("[FTP] Logged in. PWD=%s", self.home)
+
+    def probe(self) -> bool:
+        try:
+            self.ftp.voidcmd("NOOP")
+            return True
+        except (*ftplib.all_errors, EOFError):
+            return False
+
+    def reset(self) -> bool:
+        if not self.moved:
+            return self.ftp.sock is not None
+        try:
+            self.ftp.cwd(self.home)
+            self.moved = False
+            return True
+        except (*ftplib.all_errors, EOFError):
+            return False
+
+    def close(self) -> None:
+        try:
+            self.ftp.quit()
+        except (*ftplib.all_errors, EOFError):
+            self.ftp.close()
+
+
+class SFTPSession(_Session):
+    def __init__(self, key: tuple, params: dict, logger):
+        if not paramiko:
+            raise RuntimeError("paramiko missing → install for SFTP")
+        host = params["host"]
+        port = int(params.get("port", 22))
+        super().__init__(key, f"{host}:{port}")
+
+        logger.debug("[SFTP] connect %s@%s:%s", params.get("username"), host, port)
+        self.ssh = paramiko.SSHClient()
+        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.ssh.connect(
+            hostname=host,
+            port=port,
+            username=params.get("username"),
+            password=params.get("password"),
+            allow_agent=False,
+            look_for_keys=False,
+            timeout=10,
+        )
+        self.ssh.get_transport().set_keepalive(30)
+        self.sftp = self.ssh.open_sftp()
+
+    def probe(self) -> bool:
+        try:
+            self.sftp.stat(".")
+            return True
+        except (OSError, EOFError, paramiko.SSHException):
+            return False
+
+    def reset(self) -> bool:
+        transport = self.ssh.get_transport()
+        if not transport or not transport.is_active():
+            return False
+        self.sftp.chdir(None)                # client-side only, no round trip
+        return True
+
+    def close(self) -> None:
+        try:
+            self.sftp.close()
+        finally:
+            self.ssh.close()
+
+
+def session_key(dev_id, proto: str, params: dict) -> tuple:
+    return (
+        dev_id, proto, params.get("host"), int(params.get("port") or 0),
+        params.get("username"), params.get("password"),
+    )
+
+
+# ─────────────────────────────── pool ─────────────────────────────────
+class ConnectionPool:
+    def __init__(self, logger):
+        self.log = logger
+        self._cond = threading.Condition()
+        self._idle: dict[tuple, list] = {}       # key → [session] (LIFO)
+        self._open: dict[str, int]    = {}       # host:port → open sessions
+
+        threading.Thread(
+            target=self._evict_loop, name="StoragePool-Evictor", daemon=True
+        ).start()
+
+    # ------------------------------------------------------------------
+    # public API
+    # ------------------------------------------------------------------
+    @contextmanager
+    def lease_ftp(self, dev_id, params: dict):
+        key = session_key(dev_id, "ftp", params)
+        host = f"{params['host']}:{int(params.get('port', 21))}"
+        sess = self.acquire(key, host, lambda: FTPSession(key, params, self.log))
+        try:
+            yield sess
+        finally:
+            self.release(sess)
+
+    @contextmanager
+    def lease_sftp(self, dev_id, params: dict):
+        key = session_key(dev_id, "sftp", params)
+        host = f"{params['host']}:{int(params.get('port', 22))}"
+        sess = self.acquire(key, host, lambda: SFTPSession(key, params, self.log))
+        try:
+            yield sess
+        finally:
+            self.release(sess)
+
+    def acquire(self, key: tuple, host: str, factory) -> _Session:
+        deadline = time.time() + POOL_WAIT
+        while True:
+            victim = None
+            with self._cond:
+                while True:
+                    idle = self._idle.get(key)
+                    if idle:
+                        sess = idle.pop()
+                        break
+                    if self._open.get(host, 0) < POOL_MAX_PER_HOST:
+                        self._open[host] = self._open.get(host, 0) + 1
+                        sess = None
+                        break
+                    # host is full – sacrifice an idle session of another key
+                    victim = self._pop_idle_for_host(host)
+                    if victim:
+                        self._open[host] += 1   # slot handed over below
+                        sess = None
+                        break
+                    left = deadline - time.time()
+                    if left <= 0:
+                        raise TimeoutError(f"no free storage connection to {host}")
+                    self._cond.wait(left)
+
+            if victim:
+                self._discard(victim)
+            if sess is None:
+                try:
+                    return factory()
+                except BaseException:
+                    self._forget(host)
+                    raise
+
+            if time.time() - sess.last_used < POOL_HEALTH_SEC or sess.probe():
+                return sess
+            self.log.info("🔌 stale storage session to %s replaced", sess.host)
+            self._discard(sess)
+
+    def release(self, sess: _Session) -> None:
+        """Return *sess*; a session that cannot be reset is closed instead."""
+        try:
+            ok = sess.reset()
+        except Exception:
+            ok = False
+        if not ok:
+            self._discard(sess)
+            return
+        sess.last_used = time.time()
+        with self._cond:
+            self._idle.setdefault(sess.key, []).append(sess)
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            idle = sum(len(v) for v in self._idle.values())
+            return {
+                "open":   dict(self._open),
+                "idle":   idle,
+                "leased": sum(self._open.values()) - idle,
+            }
+
+    # ------------------------------------------------------------------
+    # internals
+    # ------------------------------------------------------------------
+    def _pop_idle_for_host(self, host: str):
+        for key, idle in self._idle.items():
+            if idle and idle[0].host == host:
+                return idle.pop(0)
+        return None
+
+    def _discard(self, sess: _Session) -> None:
+        try:
+            sess.close()
+        except Exception:
+            pass
+        self._forget(sess.host)
+
+    def _forget(self, host: str) -> None:
+        with self._cond:
+            self._open[host] = self._open.get(host, 1) - 1
+            if self._open[host] <= 0:
+                del self._open[host]
+            self._cond.notify()
+
+    def _evict_loop(self):
+        while True:
+            time.sleep(min(POOL_IDLE_SEC, 30))
+            cutoff = time.time() - POOL_IDLE_SEC
+            expired = []
+            with self._cond:
+                for key, idle in self._idle.items():
+                    keep = [s for s in idle if s.last_used >= cutoff]
+                    expired += [s for s in idle if s.last_used < cutoff]
+                    idle[:] = keep
+            for sess in expired:
+                self.log.debug("🔌 closing idle storage session to %s", sess.host)
+                self._discard(sess)
+
+
+# ───────────────────────── singleton helpers ──────────────────────────
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(logger=None) -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if logger is None:
+                from flask import current_app
+                logger = current_app.logger
+            _pool = ConnectionPool(logger)
+    return _pool
@@ -0,0 +1,87 @@
+"""
+Minimal five-field cron expressions (minute hour day-of-month month
+day-of-week) for Action schedule triggers.
+
+Supported per field: ``*``, ``n``, ``a-b``, ``*/s``, ``a-b/s`` and comma
+lists of those; day-of-week 0-7 (0 and 7 = Sunday).  The usual
+``@hourly``, ``@daily``/``@midnight``, ``@weekly``, ``@monthly`` and
+``@yearly``/``@annually`` aliases are accepted.  As in Vixie cron, when
+both day fields are restricted a day matches if *either* does.
+"""
+
+from datetime import datetime, timedelta
+
+_ALIASES = {
+    "@yearly":   "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly":  "0 0 1 * *",
+    "@weekly":   "0 0 * * 0",
+    "@daily":    "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly":   "0 * * * *",
+}
+
+_BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(text: str, lo: int, hi: int) -> set:
+    values = set()
+    for part in text.split(","):
+        rng, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"bad step in {part!r}")
+        if rng == "*":
+            a, b = lo, hi
+        elif "-" in rng:
+            a, b = (int(x) for x in rng.split("-", 1))
+        else:
+            a = b = int(rng)
+        if not (lo <= a <= hi and lo <= b <= hi and a <= b):
+            raise ValueError(f"{part!r} out of range {lo}-{hi}")
+        values.update(range(a, b + 1, step))
+    return values
+
+
+class CronExpr:
+    def __init__(self, expr: str):
+        self.expr = expr.strip()
+        fields = _ALIASES.get(self.expr.lower(), self.expr).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron needs 5 fields, got {len(fields)}: {expr!r}")
+
+        parsed = [_parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _BOUNDS)]
+        self.minutes, self.hours, self.days, self.months, dows = parsed
+        self.dows = {d % 7 for d in dows}               # 7 → Sunday
+        self._dom_any = fields[2] == "*"
+        self._dow_any = fields[4] == "*"
+
+    def __repr__(self):
+        return f"<CronExpr {self.expr!r}>"
+
+    def _day_ok(self, dt: datetime) -> bool:
+        dom = dt.day in self.days
+        dow = (dt.weekday() + 1) % 7 in self.dows       # Monday=1 … Sunday=0
+        if self._dom_any or self._dow_any:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, dt: datetime) -> datetime:
+        """First matching minute strictly after *dt*."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_ok(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            if t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+                continue
+            return t
+        raise ValueError(f"cron {self.expr!r} never fires")